@@ -5,11 +5,12 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
+from core.routers import ReplicaAdminMixin
 from .models import User, UserSession
 
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(ReplicaAdminMixin, BaseUserAdmin):
     """
     Custom admin for User model
     """
@@ -91,7 +92,7 @@ class UserAdmin(BaseUserAdmin):
 
 
 @admin.register(UserSession)
-class UserSessionAdmin(admin.ModelAdmin):
+class UserSessionAdmin(ReplicaAdminMixin, admin.ModelAdmin):
     """
     Admin for UserSession model
     """
@@ -0,0 +1,158 @@
+import hashlib
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from core.cache import is_shared
+from . import metrics
+
+GENERATION_KEY = 'accounts:token-blacklist:generation'
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings (no false negatives)
+    """
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class BlacklistFilter:
+    """
+    In-memory snapshot of live blacklisted refresh-token JTIs.
+
+    Lookups that miss the Bloom filter are answered without touching the
+    database; only possible hits are confirmed with an exact query. The
+    snapshot is rebuilt every BLACKLIST_FILTER_REBUILD_INTERVAL seconds
+    (dropping expired tokens) and topped up incrementally whenever another
+    process bumps the shared generation stamp after blacklisting a token.
+
+    That stamp is the only way other workers learn about a revocation, so
+    the filter is only used with a shared cache (REDIS_URL). With the
+    per-process default cache every check goes to the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._generation = None
+        self._built_at = 0.0
+        # (time, highest row id read by then), oldest first
+        self._checkpoints = deque()
+
+    def _add_rows(self, rows):
+        watermark = 0
+        for row_id, jti in rows.values_list('id', 'token__jti'):
+            self._bloom.add(jti)
+            watermark = max(watermark, row_id)
+        return watermark
+
+    def _rebuild(self, generation):
+        now = timezone.now()
+        live = BlacklistedToken.objects.filter(token__expires_at__gt=now)
+        count = live.count()
+
+        self._bloom = BloomFilter(
+            capacity=max(count * 2, settings.BLACKLIST_FILTER_MIN_CAPACITY),
+            error_rate=settings.BLACKLIST_FILTER_ERROR_RATE
+        )
+        watermark = self._add_rows(live)
+        # Rows inserted in the last overlap window may still be committing
+        # with ids below the watermark; start the first catch-up before them
+        settled = now - timedelta(seconds=settings.BLACKLIST_FILTER_CATCH_UP_OVERLAP)
+        settled_watermark = BlacklistedToken.objects.filter(blacklisted_at__lt=settled).aggregate(
+            watermark=Max('id')
+        )['watermark'] or 0
+        self._checkpoints = deque([(settled, settled_watermark), (now, watermark)])
+        self._generation = generation
+        self._built_at = time.monotonic()
+
+    def _catch_up(self, generation):
+        """
+        Add rows blacklisted since the last sync. Ids are allocated at
+        insert, so a row can commit after a higher id was already read:
+        re-read from the watermark of a sync at least
+        BLACKLIST_FILTER_CATCH_UP_OVERLAP seconds before the previous one.
+        """
+        now = timezone.now()
+        horizon = self._checkpoints[-1][0] - timedelta(seconds=settings.BLACKLIST_FILTER_CATCH_UP_OVERLAP)
+        while len(self._checkpoints) > 1 and self._checkpoints[1][0] <= horizon:
+            self._checkpoints.popleft()
+        start = self._checkpoints[0][1]
+
+        watermark = self._add_rows(BlacklistedToken.objects.filter(id__gt=start))
+        self._checkpoints.append((now, max(watermark, self._checkpoints[-1][1])))
+        self._generation = generation
+
+    def _refresh(self):
+        generation = cache.get(GENERATION_KEY)
+        stale = (
+            self._bloom is None
+            or time.monotonic() - self._built_at > settings.BLACKLIST_FILTER_REBUILD_INTERVAL
+        )
+        if not stale and generation == self._generation:
+            return
+
+        with self._lock:
+            if self._bloom is None or time.monotonic() - self._built_at > settings.BLACKLIST_FILTER_REBUILD_INTERVAL:
+                self._rebuild(generation)
+            elif generation != self._generation:
+                self._catch_up(generation)
+
+    def is_blacklisted(self, jti):
+        if not is_shared():
+            metrics.blacklist_filter_lookups.labels('unfiltered').inc()
+            return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+        self._refresh()
+
+        if jti not in self._bloom:
+            metrics.blacklist_filter_lookups.labels('negative').inc()
+            return False
+
+        if BlacklistedToken.objects.filter(token__jti=jti).exists():
+            metrics.blacklist_filter_lookups.labels('blacklisted').inc()
+            return True
+
+        metrics.blacklist_filter_lookups.labels('false_positive').inc()
+        return False
+
+    def add(self, jti):
+        """Record a token this process just blacklisted and notify the others"""
+        if not is_shared():
+            return
+        self._refresh()
+        with self._lock:
+            self._bloom.add(jti)
+        # Only once the row is visible, or a worker could catch up before it
+        transaction.on_commit(lambda: cache.set(GENERATION_KEY, uuid.uuid4().hex, None))
+
+
+blacklist_filter = BlacklistFilter()
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from core.exceptions import ServiceBusy
+from core.profiling import phase
+from . import metrics
+
+
+class PasswordHashExecutor:
+    """
+    Run password hashing on a small dedicated thread pool.
+
+    PBKDF2 and bcrypt release the GIL, so capping the pool caps how many
+    cores a login or registration burst can take from the rest of the
+    worker. Callers beyond PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_SIZE
+    are rejected immediately with a 503 instead of queueing without bound.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._executor = None
+        self._slots = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Thread pools don't survive fork(), so build one per process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            workers = settings.PASSWORD_HASH_WORKERS
+            self._executor = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix='password-hash',
+                initializer=self._mark_worker
+            )
+            self._slots = threading.BoundedSemaphore(workers + settings.PASSWORD_HASH_QUEUE_SIZE)
+            self._pid = os.getpid()
+
+    def _mark_worker(self):
+        self._local.is_worker = True
+
+    def run(self, func, *args, **kwargs):
+        # Nested calls from inside the pool run inline to avoid deadlock
+        if getattr(self._local, 'is_worker', False):
+            return func(*args, **kwargs)
+
+        self._ensure_started()
+        if not self._slots.acquire(blocking=False):
+            metrics.password_hash_rejected.inc()
+            raise ServiceBusy(wait=settings.PASSWORD_HASH_RETRY_AFTER)
+
+        metrics.password_hash_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            with phase('crypto'):
+                return self._executor.submit(func, *args, **kwargs).result()
+        finally:
+            metrics.password_hash_seconds.observe(time.perf_counter() - started)
+            metrics.password_hash_in_flight.dec()
+            self._slots.release()
+
+
+hash_executor = PasswordHashExecutor()
+
+
+class BoundedHasherMixin:
+    """
+    Route ``encode`` (which ``verify`` and ``harden_runtime`` also use)
+    through the bounded password hashing executor
+    """
+
+    def encode(self, password, salt, *args, **kwargs):
+        return hash_executor.run(super().encode, password, salt, *args, **kwargs)
+
+
+class BoundedPBKDF2PasswordHasher(BoundedHasherMixin, hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with iterations taken from PASSWORD_HASH_ITERATIONS,
+    never fewer than Django's default
+    """
+
+    @property
+    def iterations(self):
+        return max(settings.PASSWORD_HASH_ITERATIONS or 0, hashers.PBKDF2PasswordHasher.iterations)
+
+
+class BoundedBCryptSHA256PasswordHasher(BoundedHasherMixin, hashers.BCryptSHA256PasswordHasher):
+    """bcrypt-SHA256 with the work factor taken from BCRYPT_ROUNDS"""
+
+    @property
+    def rounds(self):
+        return settings.BCRYPT_ROUNDS or hashers.BCryptSHA256PasswordHasher.rounds
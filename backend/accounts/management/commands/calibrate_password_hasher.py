@@ -0,0 +1,101 @@
+import hashlib
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Calibrate password hasher cost to a latency target on this machine'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target-ms',
+            type=float,
+            default=250,
+            help='Target latency of one password hash in milliseconds'
+        )
+        parser.add_argument(
+            '--algorithm',
+            choices=['pbkdf2', 'bcrypt'],
+            default='pbkdf2',
+            help='Hasher to calibrate'
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=5,
+            help='Hashes per measurement'
+        )
+
+    def handle(self, *args, **options):
+        target = options['target_ms'] / 1000
+        samples = options['samples']
+
+        if options['algorithm'] == 'pbkdf2':
+            setting, cost, hash_once = self.calibrate_pbkdf2(target, samples)
+        else:
+            setting, cost, hash_once = self.calibrate_bcrypt(target, samples)
+
+        single = self.measure(hash_once, samples)
+        self.stdout.write(f'Single hash at {setting}={cost}: {single * 1000:.1f} ms')
+
+        # Throughput of the bounded executor at the configured pool size
+        workers = settings.PASSWORD_HASH_WORKERS
+        jobs = workers * samples
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            started = time.perf_counter()
+            list(pool.map(lambda _: hash_once(), range(jobs)))
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{workers} worker(s): {jobs / elapsed:.1f} hashes/s '
+            f'({os.cpu_count()} CPUs available)'
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'Recommended: {setting}={cost}'))
+
+    def measure(self, func, samples):
+        func()  # warm up
+        started = time.perf_counter()
+        for _ in range(samples):
+            func()
+        return (time.perf_counter() - started) / samples
+
+    def calibrate_pbkdf2(self, target, samples):
+        password = secrets.token_bytes(16)
+        salt = secrets.token_bytes(16)
+
+        def make(iterations):
+            return lambda: hashlib.pbkdf2_hmac('sha256', password, salt, iterations)
+
+        # PBKDF2 cost is linear in iterations: measure once and scale
+        probe = 100_000
+        per_iteration = self.measure(make(probe), samples) / probe
+        # Never recommend fewer iterations than Django's own default
+        iterations = max(PBKDF2PasswordHasher.iterations, int(target / per_iteration) // 1000 * 1000)
+        return 'PASSWORD_HASH_ITERATIONS', iterations, make(iterations)
+
+    def calibrate_bcrypt(self, target, samples):
+        try:
+            import bcrypt
+        except ImportError:
+            raise CommandError('bcrypt is not installed')
+
+        password = secrets.token_bytes(32)
+
+        def make(rounds):
+            salt = bcrypt.gensalt(rounds)
+            return lambda: bcrypt.hashpw(password, salt)
+
+        # Each extra round doubles the cost: step up while it gets closer
+        # to the target (10 rounds is the floor we accept)
+        rounds = 10
+        estimate = self.measure(make(rounds), samples)
+        while rounds < 31 and abs(estimate * 2 - target) < abs(estimate - target):
+            rounds += 1
+            estimate *= 2
+        return 'BCRYPT_ROUNDS', rounds, make(rounds)
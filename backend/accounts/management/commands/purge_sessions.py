@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import UserSession
+
+
+class Command(BaseCommand):
+    help = 'Delete user sessions with no activity within the retention period, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.SESSION_RETENTION_DAYS,
+            help='Delete sessions inactive for longer than this many days'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Sessions deleted per statement'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+        total = 0
+
+        # Walks the last_activity index, oldest first
+        while True:
+            ids = list(
+                UserSession.objects.filter(last_activity__lt=cutoff)
+                .order_by('last_activity')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            UserSession.objects.filter(id__in=ids).delete()
+            total += len(ids)
+
+        self.stdout.write(self.style.SUCCESS(f'Purged {total} inactive sessions'))
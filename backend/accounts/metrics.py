@@ -0,0 +1,32 @@
+"""
+Prometheus instruments for the accounts app.
+"""
+from prometheus_client import Counter, Gauge, Histogram
+
+user_cache_requests = Counter(
+    'secureshare_user_cache_requests',
+    'Authenticated user lookups served from the snapshot cache',
+    ['result'],
+)
+
+password_hash_seconds = Histogram(
+    'secureshare_password_hash_seconds',
+    'Wall time of password hashing including executor queueing',
+)
+
+password_hash_in_flight = Gauge(
+    'secureshare_password_hash_in_flight',
+    'Password hashing jobs running or queued on the executor',
+    multiprocess_mode='livesum',
+)
+
+password_hash_rejected = Counter(
+    'secureshare_password_hash_rejected',
+    'Password hashing jobs rejected because the executor queue was full',
+)
+
+blacklist_filter_lookups = Counter(
+    'secureshare_blacklist_filter_lookups',
+    'Refresh token blacklist checks by outcome',
+    ['result'],
+)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_user_theme_preference_user_is_verified_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usersession',
+            index=models.Index(fields=['last_activity'], name='user_sessio_last_ac_7cb421_idx'),
+        ),
+    ]
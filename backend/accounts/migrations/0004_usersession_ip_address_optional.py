@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_usersession_last_activity_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usersession',
+            name='ip_address',
+            field=models.GenericIPAddressField(blank=True, null=True),
+        ),
+    ]
@@ -63,7 +63,7 @@ class UserSession(models.Model):
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sessions')
     session_key = models.CharField(max_length=40, unique=True)
-    ip_address = models.GenericIPAddressField()
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
     last_activity = models.DateTimeField(default=timezone.now)
@@ -72,6 +72,9 @@ class UserSession(models.Model):
     class Meta:
         db_table = 'user_sessions'
         ordering = ['-last_activity']
+        indexes = [
+            models.Index(fields=['last_activity']),
+        ]
         
     def __str__(self):
         return f"{self.user.email} - {self.ip_address}"
\ No newline at end of file
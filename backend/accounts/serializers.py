@@ -1,8 +1,41 @@
+import re
+
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Length
 from .models import User
+from .tokens import RefreshToken
+
+
+def allocate_username(base_username):
+    """
+    Return ``base_username`` or its next free numbered variant
+    (john, john1, john2, ...) using a single query, no matter how many
+    variants already exist
+    """
+    pattern = r'^{}([1-9][0-9]*)?$'.format(re.escape(base_username))
+    
+    # Without leading zeros the longest match carries the highest suffix
+    taken = User.objects.filter(
+        username__startswith=base_username,
+        username__regex=pattern
+    ).annotate(
+        username_length=Length('username')
+    ).order_by(
+        '-username_length', '-username'
+    ).values_list('username', flat=True).first()
+    
+    if taken is None:
+        return base_username
+    
+    suffix = taken[len(base_username):]
+    return f"{base_username}{int(suffix) + 1 if suffix else 1}"
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -25,20 +58,22 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             'email', 'username', 'first_name', 'last_name', 
             'password', 'password_confirm'
         )
+        # Uniqueness of email and username is checked with one query in validate()
         extra_kwargs = {
-            'username': {'required': False, 'allow_blank': True}
+            'email': {'validators': []},
+            'username': {
+                'required': False,
+                'allow_blank': True,
+                'validators': [UnicodeUsernameValidator()]
+            }
         }
         
     def validate_email(self, value):
-        """Validate email uniqueness"""
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("A user with this email already exists.")
+        """Normalize email"""
         return value.lower()
     
     def validate_username(self, value):
-        """Validate username uniqueness"""
-        if User.objects.filter(username=value).exists():
-            raise serializers.ValidationError("A user with this username already exists.")
+        """Normalize username"""
         return value.lower()
     
     def validate_password(self, value):
@@ -50,7 +85,23 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return value
     
     def validate(self, attrs):
-        """Validate password confirmation"""
+        """Validate email/username uniqueness and password confirmation"""
+        email = attrs['email']
+        username = attrs.get('username')
+        
+        lookup = Q(email=email)
+        if username:
+            lookup |= Q(username=username)
+        
+        errors = {}
+        for taken_email, taken_username in User.objects.filter(lookup).values_list('email', 'username')[:2]:
+            if taken_email == email:
+                errors['email'] = "A user with this email already exists."
+            if username and taken_username == username:
+                errors['username'] = "A user with this username already exists."
+        if errors:
+            raise serializers.ValidationError(errors)
+        
         if attrs['password'] != attrs['password_confirm']:
             raise serializers.ValidationError({
                 'password_confirm': 'Password confirmation does not match.'
@@ -62,25 +113,26 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         validated_data.pop('password_confirm')
         password = validated_data.pop('password')
         
-        # Generate username from email if not provided
-        if 'username' not in validated_data or not validated_data['username']:
-            email = validated_data['email']
-            base_username = email.split('@')[0].lower()
-            username = base_username
-            counter = 1
-            
-            # Ensure username is unique
-            while User.objects.filter(username=username).exists():
-                username = f"{base_username}{counter}"
-                counter += 1
-            
-            validated_data['username'] = username
-        
         user = User(**validated_data)
         user.set_password(password)
-        user.save()
         
-        return user
+        # Username provided: uniqueness was already checked in validate()
+        if user.username:
+            user.save()
+            return user
+        
+        # Generate username from email; retry if a concurrent
+        # registration claims the same one first
+        base_username = user.email.split('@')[0].lower()
+        for attempt in range(3):
+            user.username = allocate_username(base_username)
+            try:
+                with transaction.atomic():
+                    user.save()
+                return user
+            except IntegrityError:
+                if attempt == 2:
+                    raise
 
 
 class UserLoginSerializer(serializers.Serializer):
@@ -145,6 +197,14 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'is_verified', 'date_joined', 'last_login'
         )
 
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # request.user may be a cached snapshot: write only what changed so
+        # older values of the other columns aren't written back
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
 
 class ChangePasswordSerializer(serializers.Serializer):
     """
@@ -185,4 +245,11 @@ class ChangePasswordSerializer(serializers.Serializer):
             raise serializers.ValidationError({
                 'new_password_confirm': 'Password confirmation does not match.'
             })
-        return attrs
\ No newline at end of file
+        return attrs
+
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Token refresh serializer using the filter-backed blacklist check
+    """
+    token_class = RefreshToken
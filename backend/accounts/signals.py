@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import usercache
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_user_on_save(sender, instance, **kwargs):
+    """Drop the cached snapshot on password change, deactivation or profile update"""
+    usercache.invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_cached_user_on_delete(sender, instance, **kwargs):
+    """Drop the cached snapshot of a deleted user"""
+    usercache.invalidate_user(instance.pk)
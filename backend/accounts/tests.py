@@ -1,3 +1,539 @@
-from django.test import TestCase
+import itertools
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.testing import QueryBudgetMixin
+from . import serializers, tracking, usercache
+from .blacklist import BlacklistFilter
+from .hashers import BoundedPBKDF2PasswordHasher, hash_executor
+from .management.commands.calibrate_password_hasher import Command as CalibrateCommand
+from .models import User, UserSession
+from .tokens import RefreshToken
+
+
+@override_settings(WRITE_BEHIND_ENABLED=False)
+class AccountEndpointQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Per-endpoint query budgets that must hold at every table size"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='budget@secureshare.dev',
+            username='budget',
+            password='budget-pass-123'
+        )
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def create_sessions(self, count):
+        UserSession.objects.bulk_create([
+            UserSession(
+                user=self.user,
+                session_key=uuid.uuid4().hex,
+                ip_address='127.0.0.1',
+                user_agent='Mozilla/5.0 ' * 20,
+            )
+            for _ in range(count)
+        ])
+
+    def test_auth_status(self):
+        self.assertBudgetAtEveryScale(0, self.create_sessions, self.client.get, '/api/auth/auth-status/')
+
+    def test_profile(self):
+        self.assertBudgetAtEveryScale(0, self.create_sessions, self.client.get, '/api/auth/profile/')
+
+    def test_sessions(self):
+        self.assertBudgetAtEveryScale(1, self.create_sessions, self.client.get, '/api/auth/sessions/')
+
+    def test_token_authentication(self):
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+        # Cold user cache loads the snapshot once, warm requests don't query
+        self.assertQueryBudget(1, client.get, '/api/auth/auth-status/')
+        self.assertBudgetAtEveryScale(0, self.create_sessions, client.get, '/api/auth/auth-status/')
+
+    def test_login(self):
+        client = APIClient(SERVER_NAME='localhost')
+        # Includes the write-behind login batch, which runs inline here
+        self.assertBudgetAtEveryScale(
+            6, self.create_sessions, client.post, '/api/auth/login/',
+            {'email': 'budget@secureshare.dev', 'password': 'budget-pass-123'}, format='json'
+        )
+
+    def test_register(self):
+        emails = (f'register-{i}@secureshare.dev' for i in itertools.count())
+
+        def register():
+            return APIClient(SERVER_NAME='localhost').post('/api/auth/register/', {
+                'email': next(emails),
+                'first_name': 'Budget',
+                'last_name': 'User',
+                'password': 'Register-pass-123',
+                'password_confirm': 'Register-pass-123',
+            }, format='json')
+
+        self.assertBudgetAtEveryScale(6, self.create_sessions, register)
+
+    def test_logout(self):
+        # Each logout blacklists its own refresh token
+        tokens = iter([str(RefreshToken.for_user(self.user)) for _ in self.ROW_COUNTS])
+
+        def logout():
+            return self.client.post('/api/auth/logout/', {'refresh_token': next(tokens)}, format='json')
+
+        self.assertBudgetAtEveryScale(8, self.create_sessions, logout)
+
+    def test_token_refresh(self):
+        tokens = iter([str(RefreshToken.for_user(self.user)) for _ in self.ROW_COUNTS])
+
+        # Rotation blacklists the old token and records the new one
+        def refresh():
+            return APIClient(SERVER_NAME='localhost').post(
+                '/api/auth/token/refresh/', {'refresh': next(tokens)}, format='json'
+            )
+
+        self.assertBudgetAtEveryScale(13, self.create_sessions, refresh)
+
+    def test_change_password(self):
+        passwords = (f'Changed-pass-{i}' for i in itertools.count())
+        current = ['budget-pass-123']
+
+        def change_password():
+            new_password = next(passwords)
+            response = self.client.post('/api/auth/change-password/', {
+                'current_password': current[0],
+                'new_password': new_password,
+                'new_password_confirm': new_password,
+            }, format='json')
+            current[0] = new_password
+            return response
+
+        self.assertBudgetAtEveryScale(1, self.create_sessions, change_password)
+
+
+class AccountAdminQueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email='admin@secureshare.dev',
+            username='admin',
+            password='admin-pass-123',
+            first_name='Admin',
+            last_name='User'
+        )
+        self.client.force_login(self.admin)
+
+    def create_users(self, count):
+        users = User.objects.bulk_create([
+            User(email=f'{key}@secureshare.dev', username=key)
+            for key in (uuid.uuid4().hex[:12] for _ in range(count))
+        ])
+        UserSession.objects.bulk_create([
+            UserSession(
+                user=user,
+                session_key=uuid.uuid4().hex,
+                ip_address='127.0.0.1',
+                user_agent='Mozilla/5.0',
+            )
+            for user in users
+        ])
+
+    def test_user_changelist(self):
+        self.assertBudgetAtEveryScale(
+            5, self.create_users, self.client.get, '/admin/accounts/user/', SERVER_NAME='localhost'
+        )
+
+    def test_session_changelist(self):
+        self.assertBudgetAtEveryScale(
+            5, self.create_users, self.client.get, '/admin/accounts/usersession/', SERVER_NAME='localhost'
+        )
+
+
+class UserCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='cached@secureshare.dev',
+            username='cached',
+            password='cached-pass-123'
+        )
+        usercache.get_user(self.user.pk)
+
+    def test_warm_snapshot_skips_the_database(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(usercache.get_user(self.user.pk).email, 'cached@secureshare.dev')
+
+    def test_save_invalidates(self):
+        self.user.is_active = False
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertFalse(usercache.get_user(self.user.pk).is_active)
+
+    def test_password_change_invalidates(self):
+        self.user.set_password('new-pass-456')
+        self.user.save(update_fields=['password'])
+        self.assertTrue(usercache.get_user(self.user.pk).check_password('new-pass-456'))
+
+    def test_login_write_invalidates(self):
+        record = tracking.LoginRecord(self.user.pk, uuid.uuid4().hex, '10.0.0.1', 'agent', timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            tracking._write_logins([record])
+        self.assertEqual(usercache.get_user(self.user.pk).last_login_ip, '10.0.0.1')
+
+    def stale_client(self):
+        """Client whose cached user predates a login recorded since"""
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.last_login = timezone.now()
+        User.objects.filter(pk=self.user.pk).update(last_login=self.last_login, last_login_ip='10.0.0.9')
+        return client
+
+    def assertLoginKept(self):
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, self.last_login)
+        self.assertEqual(self.user.last_login_ip, '10.0.0.9')
+
+    def test_profile_update_keeps_newer_login(self):
+        response = self.stale_client().patch('/api/auth/profile/', {'first_name': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertLoginKept()
+        self.assertEqual(self.user.first_name, 'Renamed')
+
+    def test_password_change_keeps_newer_login(self):
+        response = self.stale_client().post('/api/auth/change-password/', {
+            'current_password': 'cached-pass-123',
+            'new_password': 'Changed-pass-456',
+            'new_password_confirm': 'Changed-pass-456',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertLoginKept()
+        self.assertTrue(self.user.check_password('Changed-pass-456'))
+
+    def test_delete_invalidates(self):
+        user_id = self.user.pk
+        self.user.delete()
+        with self.assertRaises(User.DoesNotExist):
+            usercache.get_user(user_id)
+
+    @override_settings(USER_CACHE_TIMEOUT=300, USER_CACHE_LOCAL_TIMEOUT=5)
+    def test_local_cache_bounds_staleness(self):
+        self.assertEqual(usercache.snapshot_timeout(), 5)
+        with mock.patch.object(usercache, 'is_shared', return_value=True):
+            self.assertEqual(usercache.snapshot_timeout(), 300)
+
+
+class LoginTrackingTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='tracked@secureshare.dev',
+            username='tracked',
+            password='tracked-pass-123'
+        )
+        self.client = APIClient(SERVER_NAME='localhost')
+
+    def login(self, **extra):
+        return self.client.post(
+            '/api/auth/login/',
+            {'email': 'tracked@secureshare.dev', 'password': 'tracked-pass-123'},
+            format='json',
+            **extra
+        )
+
+    @override_settings(WRITE_BEHIND_ENABLED=True)
+    def test_last_login_is_written_on_flush(self):
+        # Keep the batch queued instead of handing it to the background thread
+        with mock.patch.object(tracking.login_queue, '_ensure_started'):
+            self.assertEqual(self.login(REMOTE_ADDR='10.0.0.7').status_code, 200)
+            self.user.refresh_from_db()
+            self.assertIsNone(self.user.last_login)
+
+            tracking.login_queue.flush()
+
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEqual(self.user.last_login_ip, '10.0.0.7')
+        self.assertEqual(UserSession.objects.get(user=self.user).ip_address, '10.0.0.7')
+
+    @override_settings(WRITE_BEHIND_ENABLED=False)
+    def test_login_without_client_ip_keeps_session(self):
+        self.assertEqual(self.login(REMOTE_ADDR='').status_code, 200)
+        session = UserSession.objects.get(user=self.user)
+        self.assertIsNone(session.ip_address)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+
+class PasswordHashExecutorTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='hash@secureshare.dev',
+            username='hash',
+            password='hash-pass-123'
+        )
+
+    def test_saturated_executor_answers_503(self):
+        hash_executor._ensure_started()
+        held = 0
+        while hash_executor._slots.acquire(blocking=False):
+            held += 1
+        for _ in range(held):
+            self.addCleanup(hash_executor._slots.release)
+
+        response = APIClient(SERVER_NAME='localhost').post(
+            '/api/auth/login/', {'email': 'hash@secureshare.dev', 'password': 'hash-pass-123'}, format='json'
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(settings.PASSWORD_HASH_RETRY_AFTER))
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_iterations_never_below_django_default(self):
+        self.assertEqual(BoundedPBKDF2PasswordHasher().iterations, PBKDF2PasswordHasher.iterations)
+
+    def test_calibration_never_recommends_below_django_default(self):
+        setting, iterations, _ = CalibrateCommand().calibrate_pbkdf2(target=0.001, samples=1)
+        self.assertEqual(setting, 'PASSWORD_HASH_ITERATIONS')
+        self.assertEqual(iterations, PBKDF2PasswordHasher.iterations)
+
+
+class UsernameAllocationTests(TestCase):
+
+    def create_users(self, *usernames):
+        User.objects.bulk_create([User(email=f'{name}@secureshare.dev', username=name) for name in usernames])
+
+    def register(self, email, **extra):
+        data = {
+            'email': email,
+            'first_name': 'New',
+            'last_name': 'User',
+            'password': 'Register-pass-123',
+            'password_confirm': 'Register-pass-123',
+            **extra,
+        }
+        serializer = serializers.UserRegistrationSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_free_base_is_used(self):
+        self.assertEqual(serializers.allocate_username('alice'), 'alice')
+
+    def test_numbered_suffixes(self):
+        self.create_users('alice')
+        self.assertEqual(serializers.allocate_username('alice'), 'alice1')
+        # Numeric, not lexicographic: alice10 beats alice9
+        self.create_users('alice1', 'alice9', 'alice10')
+        self.assertEqual(serializers.allocate_username('alice'), 'alice11')
+
+    def test_other_names_sharing_the_prefix_are_ignored(self):
+        self.create_users('alice', 'alicebob', 'alice01', 'alice2x')
+        self.assertEqual(serializers.allocate_username('alice'), 'alice1')
+
+    def test_regex_characters_are_literal(self):
+        self.create_users('j.doe', 'jxdoe5')
+        self.assertEqual(serializers.allocate_username('j.doe'), 'j.doe1')
+
+    def test_registration_derives_username_from_email(self):
+        self.create_users('bob')
+        self.assertEqual(self.register('Bob@example.com').username, 'bob1')
+
+    def test_taken_email_and_username_reported_together(self):
+        self.create_users('carol')
+        serializer = serializers.UserRegistrationSerializer(data={
+            'email': 'carol@secureshare.dev',
+            'username': 'Carol',
+            'first_name': 'Carol',
+            'last_name': 'User',
+            'password': 'Register-pass-123',
+            'password_confirm': 'Register-pass-123',
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['email'], ['A user with this email already exists.'])
+        self.assertEqual(serializer.errors['username'], ['A user with this username already exists.'])
+
+    def test_lost_race_retries_with_next_username(self):
+        self.create_users('dave')
+        # A concurrent registration took 'dave' between allocation and insert
+        with mock.patch.object(serializers, 'allocate_username', side_effect=['dave', 'dave1']):
+            self.assertEqual(self.register('dave@example.com').username, 'dave1')
+
+    def test_gives_up_after_three_collisions(self):
+        self.create_users('erin')
+        with mock.patch.object(serializers, 'allocate_username', return_value='erin') as allocate:
+            with self.assertRaises(IntegrityError):
+                self.register('erin@example.com')
+        self.assertEqual(allocate.call_count, 3)
+
+
+class BlacklistFilterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        shared = mock.patch('accounts.blacklist.is_shared', return_value=True)
+        shared.start()
+        self.addCleanup(shared.stop)
+        self.user = User.objects.create_user(
+            email='revoked@secureshare.dev',
+            username='revoked',
+            password='revoked-pass-123'
+        )
+
+    def revoke(self, token, blacklist_filter, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']), **fields)
+            blacklist_filter.add(token['jti'])
+
+    def test_revocation_reaches_other_instances(self):
+        token = RefreshToken.for_user(self.user)
+        this_worker, other_worker = BlacklistFilter(), BlacklistFilter()
+        self.assertFalse(other_worker.is_blacklisted(token['jti']))
+
+        self.revoke(token, this_worker)
+        self.assertTrue(other_worker.is_blacklisted(token['jti']))
+
+    def test_logout_then_refresh_on_another_worker(self):
+        token = RefreshToken.for_user(self.user)
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(self.user)
+        this_worker, other_worker = BlacklistFilter(), BlacklistFilter()
+        self.assertFalse(other_worker.is_blacklisted(token['jti']))
+
+        with mock.patch('accounts.tokens.blacklist_filter', this_worker), self.captureOnCommitCallbacks(execute=True):
+            client.post('/api/auth/logout/', {'refresh_token': str(token)}, format='json')
+        with mock.patch('accounts.tokens.blacklist_filter', other_worker):
+            response = client.post('/api/auth/token/refresh/', {'refresh': str(token)}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_late_commit_with_lower_id_is_caught_up(self):
+        first, second = RefreshToken.for_user(self.user), RefreshToken.for_user(self.user)
+        blacklist_filter = BlacklistFilter()
+        blacklist_filter.is_blacklisted(first['jti'])
+
+        self.revoke(second, BlacklistFilter(), id=100)
+        self.assertTrue(blacklist_filter.is_blacklisted(second['jti']))
+        # Allocated before id 100 but committed after it was read
+        self.revoke(first, BlacklistFilter(), id=50)
+        self.assertTrue(blacklist_filter.is_blacklisted(first['jti']))
+
+    def test_false_positive_is_confirmed_in_the_database(self):
+        token = RefreshToken.for_user(self.user)
+        blacklist_filter = BlacklistFilter()
+        blacklist_filter.is_blacklisted(token['jti'])
+        blacklist_filter._bloom.bits[:] = b'\xff' * len(blacklist_filter._bloom.bits)
+
+        with self.assertNumQueries(1):
+            self.assertFalse(blacklist_filter.is_blacklisted(token['jti']))
+
+    def test_negative_lookup_skips_the_database(self):
+        token = RefreshToken.for_user(self.user)
+        blacklist_filter = BlacklistFilter()
+        blacklist_filter.is_blacklisted('warm-up')
+        with self.assertNumQueries(0):
+            self.assertFalse(blacklist_filter.is_blacklisted(token['jti']))
+
+    def test_without_shared_cache_every_check_hits_the_database(self):
+        token = RefreshToken.for_user(self.user)
+        blacklist_filter = BlacklistFilter()
+        with mock.patch('accounts.blacklist.is_shared', return_value=False):
+            self.assertFalse(blacklist_filter.is_blacklisted(token['jti']))
+            # Revoked by another worker, which can't notify this one
+            BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+            with self.assertNumQueries(1):
+                self.assertTrue(blacklist_filter.is_blacklisted(token['jti']))
+
+
+@override_settings(WRITE_BEHIND_ENABLED=False, SESSION_ACTIVITY_INTERVAL=60)
+class SessionActivityTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='active@secureshare.dev',
+            username='active',
+            password='active-pass-123'
+        )
+        self.client = APIClient(SERVER_NAME='localhost')
+
+    def session_updates(self, context):
+        return [
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE') and UserSession._meta.db_table in query['sql']
+        ]
+
+    def test_login_ties_tokens_to_session(self):
+        response = self.client.post(
+            '/api/auth/login/', {'email': 'active@secureshare.dev', 'password': 'active-pass-123'}, format='json'
+        )
+        session_key = AccessToken(response.data['access'])[tracking.SESSION_CLAIM]
+        self.assertTrue(UserSession.objects.filter(user=self.user, session_key=session_key).exists())
+
+        refreshed = self.client.post('/api/auth/token/refresh/', {'refresh': response.data['refresh']}, format='json')
+        self.assertEqual(AccessToken(refreshed.data['access'])[tracking.SESSION_CLAIM], session_key)
+
+    def test_touches_within_interval_coalesce(self):
+        session = UserSession.objects.create(user=self.user, session_key=uuid.uuid4().hex, ip_address='127.0.0.1')
+        tracker = tracking.ActivityTracker()
+        with CaptureQueriesContext(connection) as context:
+            for _ in range(5):
+                tracker.touch(session.session_key)
+        self.assertEqual(len(self.session_updates(context)), 1)
+
+        later = tracking.time.monotonic() + 61
+        with mock.patch.object(tracking.time, 'monotonic', return_value=later):
+            with CaptureQueriesContext(connection) as context:
+                tracker.touch(session.session_key)
+        self.assertEqual(len(self.session_updates(context)), 1)
+
+    def test_authenticated_requests_update_session_once(self):
+        session = UserSession.objects.create(user=self.user, session_key=uuid.uuid4().hex, ip_address='127.0.0.1')
+        session.last_activity = timezone.now() - timedelta(hours=1)
+        session.save()
+        token = RefreshToken.for_user(self.user)
+        token[tracking.SESSION_CLAIM] = session.session_key
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+
+        with CaptureQueriesContext(connection) as context:
+            for _ in range(3):
+                self.client.get('/api/auth/auth-status/')
+        self.assertEqual(len(self.session_updates(context)), 1)
+        session.refresh_from_db()
+        self.assertGreater(session.last_activity, timezone.now() - timedelta(minutes=1))
+
+
+class PurgeSessionsTests(TestCase):
+
+    def test_purges_only_sessions_past_the_cutoff(self):
+        user = User.objects.create_user(email='purge@secureshare.dev', username='purge', password=None)
+        now = timezone.now()
+        for days in (0, 29, 31, 45, 90):
+            UserSession.objects.create(
+                user=user,
+                session_key=f'session-{days}',
+                ip_address='127.0.0.1',
+                last_activity=now - timedelta(days=days),
+            )
+
+        out = StringIO()
+        call_command('purge_sessions', days=30, batch_size=2, stdout=out)
+        self.assertIn('Purged 3 inactive sessions', out.getvalue())
+        self.assertQuerysetEqual(
+            UserSession.objects.order_by('last_activity').values_list('session_key', flat=True),
+            ['session-29', 'session-0']
+        )
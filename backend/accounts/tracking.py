@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.writebehind import WriteBehindQueue
+from . import usercache
+from .models import User, UserSession
+
+# JWT claim carrying the UserSession.session_key of the login that issued it
+SESSION_CLAIM = 'sid'
+
+LoginRecord = namedtuple(
+    'LoginRecord',
+    ['user_id', 'session_key', 'ip_address', 'user_agent', 'logged_in_at']
+)
+
+
+def get_client_ip(request):
+    """Get client IP address"""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0]
+    return request.META.get('REMOTE_ADDR')
+
+
+def _write_logins(records):
+    """Apply queued logins with one bulk UPDATE and one bulk INSERT"""
+    latest = {}
+    for record in records:
+        latest[record.user_id] = record
+
+    users = [
+        User(pk=user_id, last_login=record.logged_in_at, last_login_ip=record.ip_address)
+        for user_id, record in latest.items()
+    ]
+    sessions = [
+        UserSession(
+            user_id=record.user_id,
+            session_key=record.session_key,
+            ip_address=record.ip_address,
+            user_agent=record.user_agent,
+            created_at=record.logged_in_at,
+            last_activity=record.logged_in_at,
+        )
+        for record in records
+    ]
+
+    with transaction.atomic():
+        User.objects.bulk_update(users, ['last_login', 'last_login_ip'])
+        UserSession.objects.bulk_create(sessions, ignore_conflicts=True)
+        # bulk_update sends no post_save; the profile shows last_login, so
+        # drop the cached snapshots once the new values are visible
+        transaction.on_commit(lambda: [usercache.invalidate_user(user_id) for user_id in latest])
+
+
+login_queue = WriteBehindQueue('logins', _write_logins)
+
+
+def record_login(user, session_key, request):
+    """
+    Queue the last_login / last_login_ip update and the UserSession row for
+    a successful login; they are written in batches off the request path.
+    """
+    login_queue.put(LoginRecord(
+        user_id=user.pk,
+        session_key=session_key,
+        ip_address=get_client_ip(request) or None,
+        user_agent=request.META.get('HTTP_USER_AGENT', '')[:500],
+        logged_in_at=timezone.now(),
+    ))
+
+
+def _write_activity(session_keys):
+    """Bump last_activity for every touched session with one UPDATE"""
+    UserSession.objects.filter(
+        session_key__in=set(session_keys),
+        is_active=True
+    ).update(last_activity=timezone.now())
+
+
+activity_queue = WriteBehindQueue('session-activity', _write_activity)
+
+
+class ActivityTracker:
+    """
+    Coalesce per-request session activity in memory so each session is
+    written at most once every SESSION_ACTIVITY_INTERVAL seconds
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_queued = {}
+
+    def touch(self, session_key):
+        now = time.monotonic()
+        interval = settings.SESSION_ACTIVITY_INTERVAL
+        
+        last = self._last_queued.get(session_key)
+        if last is not None and now - last < interval:
+            return
+        
+        with self._lock:
+            last = self._last_queued.get(session_key)
+            if last is not None and now - last < interval:
+                return
+            self._last_queued[session_key] = now
+            
+            # Forget sessions that went quiet so the map stays bounded
+            if len(self._last_queued) > settings.SESSION_ACTIVITY_MAX_TRACKED:
+                self._last_queued = {
+                    key: queued_at for key, queued_at in self._last_queued.items()
+                    if now - queued_at < interval
+                }
+        
+        activity_queue.put(session_key)
+
+
+activity_tracker = ActivityTracker()
+
+
+def record_activity(validated_token):
+    """Note activity for the session a validated access token belongs to"""
+    session_key = validated_token.get(SESSION_CLAIM)
+    if session_key:
+        activity_tracker.touch(session_key)
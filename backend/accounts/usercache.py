@@ -0,0 +1,80 @@
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from core.cache import is_shared
+from . import metrics
+
+CACHE_PREFIX = 'accounts:user'
+
+
+def _version_key(user_id):
+    return f'{CACHE_PREFIX}:{user_id}:version'
+
+
+def _snapshot_key(user_id, version):
+    return f'{CACHE_PREFIX}:{user_id}:{version}'
+
+
+def _field_names(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def get_user_version(user_id):
+    """
+    Return the current version stamp for a user, creating one if needed
+    """
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_user(user_id):
+    """
+    Move the user to a new version stamp. Snapshots stored under the old
+    stamp (including ones written by requests racing with this update)
+    are never read again and simply expire.
+    """
+    cache.set(_version_key(user_id), uuid.uuid4().hex, None)
+
+
+def snapshot_timeout():
+    """
+    Seconds a snapshot may be served. Invalidations only reach other
+    workers through a shared cache; with a per-process cache each worker
+    keeps its snapshots briefly, bounding how long a deactivated user or an
+    old password keeps authenticating elsewhere.
+    """
+    if is_shared():
+        return settings.USER_CACHE_TIMEOUT
+    return min(settings.USER_CACHE_TIMEOUT, settings.USER_CACHE_LOCAL_TIMEOUT)
+
+
+def get_user(user_id):
+    """
+    Return the user with the given id, served from a cached snapshot when
+    possible. Raises ``DoesNotExist`` like ``User.objects.get``.
+    """
+    model = get_user_model()
+
+    # Read the version before the database so a concurrent invalidation
+    # can never leave a stale snapshot under the current stamp.
+    version = get_user_version(user_id)
+    key = _snapshot_key(user_id, version)
+    snapshot = cache.get(key)
+
+    if snapshot is not None:
+        metrics.user_cache_requests.labels('hit').inc()
+        return model.from_db(DEFAULT_DB_ALIAS, _field_names(model), snapshot)
+
+    metrics.user_cache_requests.labels('miss').inc()
+    user = model.objects.get(pk=user_id)
+    snapshot = [getattr(user, name) for name in _field_names(model)]
+    cache.set(key, snapshot, snapshot_timeout())
+    return user
@@ -2,12 +2,13 @@ from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import get_user_model
-from django.utils import timezone
 from .models import User, UserSession
+from .tokens import RefreshToken
+from .tracking import SESSION_CLAIM, record_login
 from .serializers import (
     UserRegistrationSerializer,
     UserLoginSerializer, 
@@ -24,6 +25,14 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     Custom JWT token serializer to include user data
     """
     username_field = 'email'
+    token_class = RefreshToken
+
+    def get_token(self, user):
+        """Tie the token pair to a new UserSession for activity tracking"""
+        token = super().get_token(user)
+        self.session_key = uuid.uuid4().hex
+        token[SESSION_CLAIM] = self.session_key
+        return token
 
     def validate(self, attrs):
         data = super().validate(attrs)
@@ -52,42 +61,18 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
     
     def post(self, request, *args, **kwargs):
-        response = super().post(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
         
-        if response.status_code == 200:
-            # Get user from email
-            email = request.data.get('email', '').lower()
-            user = User.objects.filter(email=email).first()
-            
-            if user:
-                # Update last login info
-                user.last_login = timezone.now()
-                user.last_login_ip = self.get_client_ip(request)
-                user.save(update_fields=['last_login', 'last_login_ip'])
-                
-                # Create session tracking
-                self.create_user_session(user, request)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
         
-        return response
-    
-    def get_client_ip(self, request):
-        """Get client IP address"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-    
-    def create_user_session(self, user, request):
-        """Create user session record"""
-        session_key = str(uuid.uuid4())
-        UserSession.objects.create(
-            user=user,
-            session_key=session_key,
-            ip_address=self.get_client_ip(request),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')[:500]
-        )
+        # Reuse the authenticated user; last_login and the session row
+        # are written in batches off the request path
+        record_login(serializer.user, serializer.session_key, request)
+        
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
 
 
 class UserRegistrationView(APIView):
@@ -157,7 +142,8 @@ class ChangePasswordView(APIView):
         if serializer.is_valid():
             user = request.user
             user.set_password(serializer.validated_data['new_password'])
-            user.save()
+            # request.user may be a cached snapshot; don't write its other fields back
+            user.save(update_fields=['password', 'updated_at'])
             
             return Response({
                 'success': True,
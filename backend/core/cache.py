@@ -0,0 +1,15 @@
+"""
+Cache helpers.
+
+Without REDIS_URL the default cache is a LocMemCache, private to each
+worker process. Features that rely on the cache to tell other workers
+about a change (invalidations, revocations, pins) check ``is_shared()``
+and fall back to something safe when it is not.
+"""
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared(alias=DEFAULT_CACHE_ALIAS):
+    """Whether entries written by one worker process are seen by the others"""
+    return not isinstance(caches[alias], LocMemCache)
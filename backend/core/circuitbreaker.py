@@ -0,0 +1,132 @@
+"""
+Circuit breaker for calls to external services.
+
+After ``failure_threshold`` consecutive failures the circuit opens and calls
+fail fast with a 503 (ServiceBusy, with Retry-After) instead of tying up a
+request thread until the dependency times out. Once ``reset_timeout``
+seconds have passed the circuit is half-open: a single probe call goes
+through, and its outcome closes the circuit or opens it again.
+
+State is per process and shared by all of its threads. ``max_concurrent``
+additionally caps the calls in flight, so a slow dependency can hold at
+most that many threads no matter how many requests want it.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from . import metrics
+from .exceptions import ServiceBusy
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(ServiceBusy):
+    """Raised instead of calling a dependency whose circuit is open"""
+    default_detail = 'A required service is temporarily unavailable, please retry shortly.'
+    default_code = 'service_unavailable'
+
+
+class CircuitBreaker:
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30, max_concurrent=None, is_failure=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        # Decides which exceptions count against the dependency; by default all do
+        self.is_failure = is_failure or (lambda exc: True)
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        metrics.circuit_breaker_state.labels(name).set(0)
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and self._retry_after() == 0:
+                return HALF_OPEN
+            return self._state
+
+    def _retry_after(self):
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def _transition(self, state):
+        # Caller holds the lock
+        if state == self._state:
+            return
+        self._state = state
+        metrics.circuit_breaker_state.labels(self.name).set(_STATE_VALUES[state])
+        metrics.circuit_breaker_transitions.labels(self.name, state).inc()
+
+    def _reject(self, reason, wait):
+        metrics.circuit_breaker_rejected.labels(self.name, reason).inc()
+        raise CircuitOpen(wait=max(1, math.ceil(wait)))
+
+    def _before_call(self):
+        """Admit the call or raise CircuitOpen; returns whether it is the half-open probe"""
+        with self._lock:
+            if self._state == OPEN:
+                wait = self._retry_after()
+                if wait > 0:
+                    self._reject('open', wait)
+                self._transition(HALF_OPEN)
+            if self._state == HALF_OPEN:
+                if self._probing:
+                    self._reject('open', 1)
+                self._probing = True
+                return True
+            return False
+
+    def _after_call(self, probe, failed):
+        """Record the outcome; ``failed`` is None when the call was interrupted"""
+        with self._lock:
+            if probe:
+                self._probing = False
+            if failed is None:
+                return
+            if failed:
+                self._failures += 1
+                if probe or self._failures >= self.failure_threshold:
+                    self._opened_at = time.monotonic()
+                    self._transition(OPEN)
+            else:
+                self._failures = 0
+                self._transition(CLOSED)
+
+    def check(self):
+        """Raise CircuitOpen now if a call would be rejected, without making one"""
+        with self._lock:
+            if self._state == OPEN and self._retry_after() > 0:
+                self._reject('open', self._retry_after())
+
+    @contextmanager
+    def guard(self):
+        """Run the block as one call through the breaker"""
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            self._reject('busy', 1)
+        try:
+            probe = self._before_call()
+            try:
+                yield
+            except Exception as exc:
+                self._after_call(probe, self.is_failure(exc))
+                raise
+            except BaseException:
+                self._after_call(probe, None)
+                raise
+            self._after_call(probe, False)
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    def call(self, func, *args, **kwargs):
+        with self.guard():
+            return func(*args, **kwargs)
@@ -0,0 +1,131 @@
+import functools
+import hashlib
+
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import metrics
+
+
+class Validators:
+    """
+    Cheap ETag / Last-Modified pair describing the state of a resource
+    """
+
+    def __init__(self, etag, last_modified=None):
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def last_modified_timestamp(self):
+        if self.last_modified is None:
+            return None
+        return int(self.last_modified.timestamp())
+
+
+def make_validators(request, prefix, last_modified, *parts):
+    """
+    Build validators from a resource prefix, its last modification time and
+    any extra parts that identify the current state (counts, ids, ...)
+    """
+    user = getattr(request, 'user', None)
+    components = [
+        prefix,
+        str(getattr(user, 'pk', '') or ''),
+        getattr(request, 'accepted_media_type', '') or '',
+        last_modified.isoformat() if last_modified else '',
+        *(str(part) for part in parts),
+    ]
+    digest = hashlib.md5('|'.join(components).encode(), usedforsecurity=False).hexdigest()
+    return Validators(quote_etag(digest), last_modified)
+
+
+def queryset_validators(request, queryset, prefix, field='updated_at', expires_field=None):
+    """
+    Compute validators for a queryset with a single aggregate query:
+    max(<field>) catches edits, the row count catches deletions. With
+    ``expires_field`` the earliest expiry still ahead is included too, so
+    representations that depend on the clock (``is_expired``) change their
+    ETag when a row expires, without any write.
+    """
+    aggregates = {'last_modified': Max(field), 'count': Count('pk')}
+    if expires_field:
+        aggregates['next_expiry'] = Min(expires_field, filter=Q(**{f'{expires_field}__gt': timezone.now()}))
+    state = queryset.order_by().aggregate(**aggregates)
+    parts = [state['count']]
+    if expires_field:
+        next_expiry = state['next_expiry']
+        parts.append(next_expiry.isoformat() if next_expiry else '')
+    return make_validators(request, prefix, state['last_modified'], *parts)
+
+
+def not_modified_response(request, validators):
+    """
+    Return a 304 response when the client's cached copy is still current
+    """
+    if validators is None or request.method not in ('GET', 'HEAD'):
+        return None
+    response = get_conditional_response(
+        request,
+        etag=validators.etag,
+        last_modified=validators.last_modified_timestamp,
+    )
+    if response is not None:
+        set_validator_headers(response, validators)
+        metrics.conditional_requests.labels('not_modified').inc()
+    else:
+        metrics.conditional_requests.labels('full').inc()
+    return response
+
+
+def set_validator_headers(response, validators):
+    """
+    Attach ETag / Last-Modified headers to a successful response
+    """
+    if validators is None or response.status_code not in (200, 304):
+        return response
+    response['ETag'] = validators.etag
+    if validators.last_modified is not None:
+        response['Last-Modified'] = http_date(validators.last_modified_timestamp)
+    patch_vary_headers(response, ('Accept', 'Authorization'))
+    return response
+
+
+def conditional(validators_func):
+    """
+    Decorator for function based API views. Must be placed below
+    ``@api_view`` so ``validators_func(request, *args, **kwargs)`` runs
+    after authentication but before the view queries and serializes.
+    """
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            validators = validators_func(request, *args, **kwargs)
+            response = not_modified_response(request, validators)
+            if response is not None:
+                return response
+            return set_validator_headers(view_func(request, *args, **kwargs), validators)
+        return wrapper
+    return decorator
+
+
+class ConditionalListMixin:
+    """
+    Short-circuit ``list()`` with a 304 when the queryset has not changed
+    """
+    validators_prefix = None
+    validators_expires_field = None
+
+    def get_validators(self):
+        return queryset_validators(
+            self.request, self.get_queryset(), self.validators_prefix, expires_field=self.validators_expires_field
+        )
+
+    def list(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        response = not_modified_response(request, validators)
+        if response is not None:
+            return response
+        return set_validator_headers(super().list(request, *args, **kwargs), validators)
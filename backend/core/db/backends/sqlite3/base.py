@@ -0,0 +1,34 @@
+"""
+SQLite backend tuned for concurrent web workers.
+
+Accepts two extra OPTIONS on top of Django's SQLite backend:
+
+- ``pragmas``: dict of PRAGMAs run on every new connection
+  (e.g. journal_mode=WAL, synchronous=NORMAL, busy_timeout=5000)
+- ``transaction_mode``: 'DEFERRED' (default), 'IMMEDIATE' or 'EXCLUSIVE'.
+  IMMEDIATE takes the write lock at BEGIN, so a writer waits out the busy
+  timeout instead of failing with "database is locked" when a read
+  transaction tries to upgrade.
+"""
+from django.db.backends.sqlite3 import base
+
+PRAGMA_OPTIONS = ('pragmas', 'transaction_mode')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        for option in PRAGMA_OPTIONS:
+            kwargs.pop(option, None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
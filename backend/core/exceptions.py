@@ -1,10 +1,53 @@
+from django.conf import settings
 from rest_framework.views import exception_handler
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import APIException
 import logging
+import random
+
+from . import metrics
+from .logs import LogRateLimiter
 
 logger = logging.getLogger(__name__)
 
+exception_log_limiter = LogRateLimiter(
+    limit=settings.EXCEPTION_LOG_RATE_LIMIT,
+    window=settings.EXCEPTION_LOG_RATE_WINDOW
+)
+
+
+def log_api_exception(exc, context, response):
+    """
+    Count every handled exception; log server errors with a traceback and
+    only a sample of client errors, without one. Repeats of the same error
+    from the same view are rate limited.
+    """
+    status_code = response.status_code
+    exc_name = type(exc).__name__
+    metrics.api_exceptions.labels(status_code, exc_name).inc()
+
+    expected = status_code < 500 or isinstance(exc, ServiceBusy)
+    if expected and random.random() >= settings.EXCEPTION_LOG_SAMPLE_RATE:
+        return
+
+    request = context.get('request')
+    match = getattr(request, 'resolver_match', None)
+    view_name = match.view_name if match is not None else 'unresolved'
+
+    allowed, suppressed = exception_log_limiter.hit((view_name, status_code, exc_name))
+    if not allowed:
+        return
+
+    message = f"API exception in {view_name}: {status_code} {exc_name}: {exc}"
+    if suppressed:
+        message += f" ({suppressed} similar suppressed)"
+
+    if expected:
+        logger.info(message)
+    else:
+        logger.error(message, exc_info=True)
+
 
 def custom_exception_handler(exc, context):
     """
@@ -14,8 +57,7 @@ def custom_exception_handler(exc, context):
     response = exception_handler(exc, context)
 
     if response is not None:
-        # Log the exception
-        logger.error(f"API Exception: {exc}", exc_info=True)
+        log_api_exception(exc, context, response)
         
         # Create custom response format
         custom_response_data = {
@@ -97,4 +139,15 @@ class FileError(SecureShareException):
 class PaymentError(SecureShareException):
     """Payment error exception"""
     default_message = "Payment processing failed"
-    default_code = "payment_error"
\ No newline at end of file
+    default_code = "payment_error"
+
+
+class ServiceBusy(APIException):
+    """Fast 503 with a Retry-After header when a bounded resource is saturated"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Service is busy, please retry shortly.'
+    default_code = 'service_busy'
+
+    def __init__(self, detail=None, code=None, wait=1):
+        super().__init__(detail, code)
+        self.wait = wait
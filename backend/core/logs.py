@@ -0,0 +1,170 @@
+"""
+Non-blocking logging: request threads only enqueue records; a listener
+thread formats them and does the file and console I/O.
+
+Wire it up in LOGGING through a ``'()'`` factory whose ``targets`` reference
+already configured handlers (dictConfig builds handlers in name order, so
+the queue handler's name must sort after its targets)::
+
+    'queue': {
+        '()': 'core.logs.BoundedQueueHandler',
+        'targets': ['cfg://handlers.console', 'cfg://handlers.file'],
+        'maxsize': 10000,
+    }
+
+Not ``'class'`` with ``handlers``: since Python 3.12 dictConfig consumes
+those keys itself for QueueHandler subclasses and builds its own listener.
+"""
+import atexit
+import datetime
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
+
+from . import metrics
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra`` fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that creates the log directory when the file is first opened"""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class _Listener(QueueListener):
+
+    def enqueue_sentinel(self):
+        # The queue may be full at shutdown; wait for room instead of raising
+        self.queue.put(self._sentinel)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Hand records to a background QueueListener through a bounded queue.
+
+    When the queue is full, records below ERROR are dropped immediately and
+    ERROR and above wait up to ``block_timeout`` seconds before being
+    dropped; drops are counted in secureshare_log_records_dropped.
+    """
+
+    def __init__(self, targets, maxsize=10000, block_timeout=0.05):
+        # Indexing resolves dictConfig's cfg:// references
+        targets = [targets[i] for i in range(len(targets))]
+        for target in targets:
+            if not isinstance(target, logging.Handler):
+                raise ValueError(f'Queue target {target!r} is not configured yet')
+
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.targets = targets
+        self.maxsize = maxsize
+        self.block_timeout = block_timeout
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def _ensure_started(self):
+        # Threads don't survive fork(), so (re)start lazily in each process
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                self.queue = queue.Queue(maxsize=self.maxsize)
+            self._listener = _Listener(self.queue, *self.targets, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Same process, so the record needn't be pickled: merge the message
+        # args now and leave traceback formatting to the listener thread
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_started()
+        try:
+            if record.levelno >= logging.ERROR:
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.log_records_dropped.labels(record.levelname).inc()
+
+    def stop(self):
+        """Flush queued records and stop the listener"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+
+class LogRateLimiter:
+    """
+    Allow at most ``limit`` log lines per key in each ``window`` seconds and
+    count what was suppressed, so repeated identical errors cost a dict
+    lookup instead of a formatted log line
+    """
+
+    def __init__(self, limit, window, max_keys=1000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Return ``(allowed, suppressed)``; ``suppressed`` counts lines dropped for ``key`` since the last allowed one"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                if state is None and len(self._windows) >= self.max_keys:
+                    self._windows.clear()
+                suppressed = state[2] if state is not None else 0
+                self._windows[key] = [now, 1, 0]
+                return True, suppressed
+            if state[1] < self.limit:
+                state[1] += 1
+                suppressed, state[2] = state[2], 0
+                return True, suppressed
+            state[2] += 1
+            return False, 0
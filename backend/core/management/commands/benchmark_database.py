@@ -0,0 +1,145 @@
+import statistics
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection, connections
+from django.utils import timezone
+
+from accounts.models import User, UserSession
+from core.writebehind import db_writer
+from files.models import FileUpload
+from files.tracking import download_queue, record_download
+
+
+class Command(BaseCommand):
+    help = (
+        'Run a concurrent write mix (upload creates, download counters, '
+        'session inserts) against the configured database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Concurrent worker threads, each with its own connection'
+        )
+        parser.add_argument(
+            '--operations',
+            type=int,
+            default=200,
+            help='Operations per thread'
+        )
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        operations = options['operations']
+
+        tag = uuid.uuid4().hex[:8]
+        user = User.objects.create_user(
+            email=f'bench-{tag}@secureshare.dev',
+            username=f'bench-{tag}',
+            password=None
+        )
+        seed = FileUpload.objects.create(
+            user=user,
+            original_filename='seed.bin',
+            file_size=1024,
+            mime_type='application/octet-stream',
+            download_password='bench123',
+            pricing_tier='free',
+            status='completed',
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+
+        settings_dict = connection.settings_dict
+        self.stdout.write(
+            f'{settings_dict["ENGINE"]} '
+            f'{settings_dict["OPTIONS"].get("pragmas", {})}\n'
+            f'write-behind={settings.WRITE_BEHIND_ENABLED} '
+            f'single-writer={settings.DB_SINGLE_WRITER} '
+            f'download-count-write-behind={settings.DOWNLOAD_COUNT_WRITE_BEHIND}\n'
+            f'{threads} threads x {operations} operations\n'
+        )
+
+        results = {'latencies': [], 'locked': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(worker_id):
+            latencies, locked, errors = [], 0, 0
+            try:
+                for i in range(operations):
+                    started = time.perf_counter()
+                    try:
+                        self.run_operation(i % 3, user, seed, f'{tag}-{worker_id}-{i}')
+                    except OperationalError as e:
+                        if 'locked' in str(e):
+                            locked += 1
+                        else:
+                            errors += 1
+                        continue
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+            with lock:
+                results['latencies'].extend(latencies)
+                results['locked'] += locked
+                results['errors'] += errors
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        # Let in-flight background batches land before reading the counter
+        time.sleep(settings.WRITE_BEHIND_FLUSH_INTERVAL + settings.DB_SINGLE_WRITER_INTERVAL)
+        download_queue.flush()
+        db_writer.flush()
+
+        close_old_connections()
+        seed.refresh_from_db()
+        user.delete()
+
+        latencies = sorted(results['latencies'])
+        total = threads * operations
+        self.stdout.write(f'completed      {len(latencies)}/{total}')
+        self.stdout.write(f'throughput     {len(latencies) / elapsed:8.1f} ops/s')
+        if latencies:
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(f'latency p50    {statistics.median(latencies) * 1000:8.2f} ms')
+            self.stdout.write(f'latency p95    {p95 * 1000:8.2f} ms')
+        self.stdout.write(f'download count {seed.download_count}/{threads * ((operations + 1) // 3)}')
+
+        style = self.style.SUCCESS if not results['locked'] else self.style.ERROR
+        self.stdout.write(style(
+            f'database is locked: {results["locked"]}  other errors: {results["errors"]}'
+        ))
+
+    def run_operation(self, kind, user, seed, key):
+        if kind == 0:
+            FileUpload.objects.create(
+                user=user,
+                original_filename=f'{key}.bin',
+                file_size=1024,
+                mime_type='application/octet-stream',
+                download_password='bench123',
+                pricing_tier='free',
+                expires_at=timezone.now() + timedelta(days=1)
+            )
+        elif kind == 1:
+            # Same path the download view takes
+            record_download(seed)
+        else:
+            UserSession.objects.create(
+                user=user,
+                session_key=key,
+                ip_address='127.0.0.1',
+                user_agent='benchmark_database'
+            )
@@ -0,0 +1,189 @@
+import gc
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _memory_kb():
+    """Rss, Pss and Private_Dirty of this process in kB"""
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line and not line[0].isspace())
+        return {name: int(fields[name].split()[0]) for name in ('Rss', 'Pss', 'Private_Dirty')}
+    except (OSError, KeyError, ValueError):
+        # No smaps (not Linux): peak RSS is the best available
+        return {'Rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def _request(application, path, authorization=None):
+    """Serve one GET through the WSGI application; return (milliseconds, status code)"""
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'SERVER_NAME': 'localhost', 'wsgi.input': io.BytesIO()}
+    if authorization:
+        environ['HTTP_AUTHORIZATION'] = authorization
+    setup_testing_defaults(environ)
+    statuses = []
+    started = time.perf_counter()
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return (time.perf_counter() - started) * 1000, int(statuses[0].split()[0])
+
+
+def _authorization(email=None):
+    """Bearer header for ``email`` (or the first active user), minted without touching the DB"""
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from accounts.models import User
+
+    users = User.objects.filter(is_active=True)
+    user = users.filter(email=email).first() if email else users.order_by('date_joined').first()
+    if user is None:
+        raise CommandError(
+            'No active user to authenticate as: create one, pass --user, or pass a public --path with --anonymous'
+        )
+    return f'Bearer {AccessToken.for_user(user)}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Fork workers the way gunicorn does, with and without the pre-fork '
+        'warm-up and gc.freeze(), and compare per-worker memory and '
+        'first-request latency'
+    )
+    # The URL checks would import every view into the cold master
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Workers forked per mode'
+        )
+        parser.add_argument(
+            '--path',
+            default='/api/files/',
+            help='Path requested by each worker'
+        )
+        parser.add_argument(
+            '--user',
+            help='Email of the user the requests authenticate as (default: the first active user)'
+        )
+        parser.add_argument(
+            '--anonymous',
+            action='store_true',
+            help='Send the requests without credentials (for public paths)'
+        )
+        parser.add_argument(
+            '--mode',
+            choices=['cold', 'warm'],
+            help='Run a single master in this mode (used internally)'
+        )
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            return self.run_master(
+                options['mode'], options['workers'], options['path'], os.environ.get('BENCHMARK_AUTHORIZATION')
+            )
+
+        # Minted here so neither master imports the token machinery early
+        env = dict(os.environ)
+        env.pop('BENCHMARK_AUTHORIZATION', None)
+        if not options['anonymous']:
+            env['BENCHMARK_AUTHORIZATION'] = _authorization(options['user'])
+
+        results = {}
+        for mode in ('cold', 'warm'):
+            # A fresh interpreter per mode so neither inherits the other's caches
+            proc = subprocess.run(
+                [
+                    sys.executable, sys.argv[0], 'benchmark_preload',
+                    '--mode', mode, '--workers', str(options['workers']), '--path', options['path'],
+                ],
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            if proc.returncode != 0:
+                raise CommandError(f'{mode} run failed:\n{proc.stderr[-2000:]}')
+            results[mode] = [json.loads(line) for line in proc.stdout.splitlines() if line.startswith('{')]
+            failed = sorted({str(w['status']) for w in results[mode] if w['status'] >= 400})
+            if failed:
+                # Timing an error page says nothing about the real view
+                raise CommandError(f"{options['path']} answered {', '.join(failed)} in the {mode} run")
+
+        self.stdout.write(
+            f"{'mode':<6} {'load ms':>8} {'1st req ms':>10} {'2nd req ms':>10} {'Pss kB':>9} "
+            f"{'dirty kB':>9} {'dirty after gc':>14}"
+        )
+        for mode, workers in results.items():
+            if not workers:
+                raise CommandError(f'{mode} run reported no workers')
+
+            def median(key, phase):
+                values = [w[phase][key] for w in workers if key in w[phase]]
+                return statistics.median(values) if values else float('nan')
+
+            self.stdout.write(
+                f"{mode:<6} {statistics.median(w['load_ms'] for w in workers):8.1f} "
+                f"{statistics.median(w['first_ms'] for w in workers):10.1f} "
+                f"{statistics.median(w['second_ms'] for w in workers):10.1f} "
+                f"{median('Pss', 'served'):9.0f} {median('Private_Dirty', 'served'):9.0f} "
+                f"{median('Private_Dirty', 'collected'):14.0f}"
+            )
+        self.stdout.write(
+            'cold: each worker loads the app after fork; '
+            'warm: core.warmup.warm_up() and gc.freeze() in the master before fork'
+        )
+
+    def run_master(self, mode, workers, path, authorization=None):
+        application = None
+        if mode == 'warm':
+            from core import warmup
+            from core.wsgi import application
+
+            gc.disable()
+            warmup.warm_up()
+            warmup.freeze()
+
+        sys.stdout.flush()
+        children = []
+        for _ in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                code = 0
+                try:
+                    gc.enable()
+                    started = time.perf_counter()
+                    if application is None:
+                        from core.wsgi import application
+                    report = {'load_ms': (time.perf_counter() - started) * 1000}
+                    report['first_ms'], report['status'] = _request(application, path, authorization)
+                    report['second_ms'], _ = _request(application, path, authorization)
+                    report['served'] = _memory_kb()
+                    # A full collection is what un-shares unfrozen pages over a worker's life
+                    gc.collect()
+                    report['collected'] = _memory_kb()
+                    os.write(1, (json.dumps(report) + '\n').encode())
+                except BaseException:
+                    code = 1
+                    import traceback
+
+                    traceback.print_exc()
+                finally:
+                    os._exit(code)
+            children.append(pid)
+            # One at a time, as a preforked server spawns then serves
+            os.waitpid(pid, 0)
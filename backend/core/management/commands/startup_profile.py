@@ -0,0 +1,115 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# What a worker does before it can serve: set up apps, build the URL
+# resolver (which imports every view module) and load the WSGI application
+BOOT_SCRIPT = (
+    'import django; django.setup(); '
+    'from django.urls import get_resolver; get_resolver().url_patterns; '
+    'from core.wsgi import application'
+)
+
+# import time: <self us> | <cumulative us> | <indent><module>
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)\s*$')
+
+
+class Command(BaseCommand):
+    help = (
+        'Boot the project in a fresh interpreter with -X importtime and '
+        'report the slowest module imports'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=25,
+            help='Number of modules to list'
+        )
+        parser.add_argument(
+            '--sort',
+            choices=['self', 'cumulative'],
+            default='cumulative',
+            help='Rank by time spent in the module itself or including its imports'
+        )
+        parser.add_argument(
+            '--packages',
+            action='store_true',
+            help='Aggregate self time by top-level package instead of listing modules'
+        )
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=3,
+            help='Boot this many times and keep the fastest run'
+        )
+
+    def handle(self, *args, **options):
+        best = None
+        for _ in range(max(options['runs'], 1)):
+            run = self.profile_boot()
+            if best is None or run['wall'] < best['wall']:
+                best = run
+
+        imports = best['imports']
+        total_self = sum(entry['self'] for entry in imports)
+        self.stdout.write(
+            f"Boot: {best['wall'] * 1000:.0f} ms wall, {total_self / 1000:.0f} ms importing "
+            f"{len(imports)} modules (fastest of {max(options['runs'], 1)})"
+        )
+
+        if options['packages']:
+            self.write_packages(imports, options['top'])
+        else:
+            self.write_modules(imports, options['top'], options['sort'])
+
+    def profile_boot(self):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        wall = time.perf_counter() - started
+        if result.returncode != 0:
+            raise CommandError(f'Boot failed:\n{result.stderr[-2000:]}')
+
+        imports = []
+        for line in result.stderr.splitlines():
+            match = IMPORT_LINE.match(line)
+            if match:
+                imports.append({
+                    'self': int(match.group(1)),
+                    'cumulative': int(match.group(2)),
+                    'depth': len(match.group(3)) // 2,
+                    'module': match.group(4),
+                })
+        return {'wall': wall, 'imports': imports}
+
+    def write_modules(self, imports, top, sort):
+        self.stdout.write(f"{'self ms':>9} {'cumul ms':>9}  module")
+        for entry in sorted(imports, key=lambda e: e[sort], reverse=True)[:top]:
+            self.stdout.write(
+                f"{entry['self'] / 1000:9.1f} {entry['cumulative'] / 1000:9.1f}  "
+                f"{'  ' * entry['depth']}{entry['module']}"
+            )
+
+    def write_packages(self, imports, top):
+        totals = defaultdict(lambda: [0, 0])
+        for entry in imports:
+            package = totals[entry['module'].split('.')[0]]
+            package[0] += entry['self']
+            package[1] += 1
+
+        self.stdout.write(f"{'self ms':>9} {'modules':>8}  package")
+        for name, (self_us, count) in sorted(totals.items(), key=lambda item: item[1][0], reverse=True)[:top]:
+            self.stdout.write(f"{self_us / 1000:9.1f} {count:8d}  {name}")
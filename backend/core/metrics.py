@@ -0,0 +1,110 @@
+"""
+Prometheus instruments shared across the project.
+
+Served by ``core.views.metrics_view``. Under gunicorn, set
+PROMETHEUS_MULTIPROC_DIR so every worker writes to a shared directory;
+gauges then declare how per-process values are combined.
+"""
+from prometheus_client import Counter, Gauge, Histogram
+
+RATIO_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+
+# ============================================================================
+# REQUESTS
+# ============================================================================
+
+request_latency = Histogram(
+    'secureshare_request_latency_seconds',
+    'Request latency by resolved view',
+    ['view', 'method', 'status'],
+)
+
+api_exceptions = Counter(
+    'secureshare_api_exceptions',
+    'Exceptions turned into API error responses',
+    ['status', 'exception'],
+)
+
+conditional_requests = Counter(
+    'secureshare_conditional_requests',
+    'GET requests to ETag-validated views, by whether a 304 was served',
+    ['result'],
+)
+
+
+# ============================================================================
+# RESPONSE COMPRESSION
+# ============================================================================
+
+compression_seconds = Histogram(
+    'secureshare_response_compression_seconds',
+    'Time spent compressing response bodies',
+    ['encoding'],
+)
+
+compression_ratio = Histogram(
+    'secureshare_response_compression_ratio',
+    'Compressed size divided by original size',
+    ['encoding'],
+    buckets=RATIO_BUCKETS,
+)
+
+compression_bytes = Counter(
+    'secureshare_response_compression_bytes',
+    'Response bytes before and after compression',
+    ['encoding', 'stage'],
+)
+
+
+# ============================================================================
+# WRITE-BEHIND QUEUES
+# ============================================================================
+
+write_behind_queue_depth = Gauge(
+    'secureshare_write_behind_queue_depth',
+    'Items waiting in a write-behind queue',
+    ['queue'],
+    multiprocess_mode='livesum',
+)
+
+write_behind_flushed = Counter(
+    'secureshare_write_behind_flushed',
+    'Items written by write-behind queue flushes',
+    ['queue'],
+)
+
+
+# ============================================================================
+# LOGGING
+# ============================================================================
+
+log_records_dropped = Counter(
+    'secureshare_log_records_dropped',
+    'Log records dropped because the logging queue was full',
+    ['level'],
+)
+
+
+# ============================================================================
+# CIRCUIT BREAKERS
+# ============================================================================
+
+circuit_breaker_state = Gauge(
+    'secureshare_circuit_breaker_state',
+    'Circuit breaker state: 0 closed, 1 half-open, 2 open (worst worker wins)',
+    ['breaker'],
+    multiprocess_mode='livemax',
+)
+
+circuit_breaker_transitions = Counter(
+    'secureshare_circuit_breaker_transitions',
+    'Circuit breaker state changes, by the state entered',
+    ['breaker', 'state'],
+)
+
+circuit_breaker_rejected = Counter(
+    'secureshare_circuit_breaker_rejected',
+    'Calls failed fast without reaching the dependency',
+    ['breaker', 'reason'],
+)
@@ -0,0 +1,174 @@
+import time
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+from . import metrics
+from .profiling import phase
+from .routers import pin_to_primary, replica_enabled, tracking_writes
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+
+def _gzip_compress(data):
+    # Randomized filename padding, as in Django's GZipMiddleware (BREACH)
+    return compress_string(data, max_random_bytes=settings.COMPRESSION_GZIP_MAX_RANDOM_BYTES)
+
+
+def _brotli_compress(data):
+    return brotli.compress(data, quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+
+def _zstd_compress(data):
+    return zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compress(data)
+
+
+COMPRESSORS = {'gzip': _gzip_compress}
+if brotli is not None:
+    COMPRESSORS['br'] = _brotli_compress
+if zstandard is not None:
+    COMPRESSORS['zstd'] = _zstd_compress
+
+
+def parse_accept_encoding(header):
+    """
+    Return the set of content codings the client accepts (q > 0)
+    """
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def has_credentials(request):
+    """Whether the response may carry secrets tied to the client's credentials"""
+    return 'HTTP_AUTHORIZATION' in request.META or settings.SESSION_COOKIE_NAME in request.COOKIES
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress large API responses with brotli, zstd or gzip.
+
+    Only buffered responses above COMPRESSION_MIN_SIZE with a content type
+    in COMPRESSION_CONTENT_TYPES are compressed; streaming responses such
+    as file downloads are passed through untouched.
+
+    BREACH: responses to requests with credentials (tokens, download URLs,
+    passwords in the body) are only gzipped, with the same randomized
+    padding Django's GZipMiddleware adds; brotli and zstd have no
+    equivalent, so they are reserved for anonymous responses.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in settings.COMPRESSION_CONTENT_TYPES:
+            return response
+
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        accepted = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        encoding = next(
+            (name for name in settings.COMPRESSION_ENCODINGS
+             if name in accepted and name in COMPRESSORS
+             and (name == 'gzip' or not has_credentials(request))),
+            None
+        )
+        if encoding is None:
+            return response
+
+        original_size = len(response.content)
+        started = time.perf_counter()
+        with phase('compress'):
+            compressed = COMPRESSORS[encoding](response.content)
+        metrics.compression_seconds.labels(encoding).observe(time.perf_counter() - started)
+
+        # Return the original if compression didn't help
+        if len(compressed) >= original_size:
+            return response
+
+        metrics.compression_ratio.labels(encoding).observe(len(compressed) / original_size)
+        metrics.compression_bytes.labels(encoding, 'in').inc(original_size)
+        metrics.compression_bytes.labels(encoding, 'out').inc(len(compressed))
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+
+        # The body is no longer byte-for-byte identical to the strong ETag
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Record request latency per resolved view
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        metrics.request_latency.labels(view, request.method, response.status_code).observe(
+            time.perf_counter() - started
+        )
+        return response
+
+
+class ReplicaPinMiddleware:
+    """
+    Pin a user to the primary database after a request that wrote on
+    their behalf, so follow-up reads don't hit a lagging replica
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_enabled():
+            return self.get_response(request)
+
+        with tracking_writes() as state:
+            response = self.get_response(request)
+
+        # DRF copies the token-authenticated user onto the Django request
+        user = getattr(request, 'user', None)
+        if state['wrote'] and user is not None and user.is_authenticated:
+            pin_to_primary(response, user)
+        return response
@@ -0,0 +1,53 @@
+import orjson
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+from .profiling import phase
+from .renderers import MessagePackRenderer, ORJSONRenderer
+
+
+class ORJSONParser(parsers.JSONParser):
+    """
+    Drop-in replacement for DRF's JSONParser backed by orjson
+    """
+    renderer_class = ORJSONRenderer
+
+    @phase('parse')
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MessagePackParser(parsers.BaseParser):
+    """
+    Parses ``application/msgpack`` request bodies
+    """
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+
+    @phase('parse')
+    def parse(self, stream, media_type=None, parser_context=None):
+        import msgpack
+
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, timestamp=3)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
+
+
+class MultiPartParser(parsers.MultiPartParser):
+    """DRF's MultiPartParser with its parse time reported to the profiler"""
+
+    @phase('parse')
+    def parse(self, stream, media_type=None, parser_context=None):
+        return super().parse(stream, media_type, parser_context)
+
+
+class FileUploadParser(parsers.FileUploadParser):
+    """DRF's FileUploadParser with its parse time reported to the profiler"""
+
+    @phase('parse')
+    def parse(self, stream, media_type=None, parser_context=None):
+        return super().parse(stream, media_type, parser_context)
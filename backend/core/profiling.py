@@ -0,0 +1,122 @@
+"""
+Per-request phase timing, reported as Server-Timing headers and a log line.
+
+ProfilingMiddleware samples PROFILING_SAMPLE_RATE of requests. Code marks
+the work it does with ``phase(name)`` (context manager or decorator); on
+unsampled requests that is a single context-variable lookup.
+
+Phases are exclusive: time spent in a nested phase (including ``db``, the
+queries run inside an ``auth`` or ``storage`` phase) is reported only under
+the nested phase, so the phases never add up to more than the total.
+"""
+import contextvars
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.queries = 0
+        # Time spent in nested phases, one entry per open phase
+        self._nested = []
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def timing(self, name):
+        started = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.add(name, elapsed - self._nested.pop())
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def record_query(self, execute, sql, params, many, context):
+        try:
+            with self.timing('db'):
+                return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+
+    def server_timing(self, total):
+        entries = []
+        for name, seconds in self.phases.items():
+            entry = f'{name};dur={seconds * 1000:.1f}'
+            if name == 'db':
+                entry += f';desc="{self.queries} queries"'
+            entries.append(entry)
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block, less nested phases, to the current request's ``name`` phase"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+
+    with profile.timing(name):
+        yield
+
+
+class ProfilingMiddleware:
+    """
+    Time sampled requests end to end, including DB time and query count
+    for every connection the request touches
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.record_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total = time.perf_counter() - profile.started
+        response['Server-Timing'] = profile.server_timing(total)
+
+        logger.info(
+            f'{request.method} {request.path} {response.status_code} '
+            f'total={total * 1000:.1f}ms queries={profile.queries} '
+            + ' '.join(f'{name}={seconds * 1000:.1f}ms' for name, seconds in profile.phases.items()),
+            extra={
+                'profile': {
+                    'method': request.method,
+                    'path': request.path,
+                    'status': response.status_code,
+                    'total_ms': round(total * 1000, 1),
+                    'queries': profile.queries,
+                    **{f'{name}_ms': round(seconds * 1000, 1) for name, seconds in profile.phases.items()},
+                }
+            }
+        )
+        return response
@@ -0,0 +1,62 @@
+import orjson
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+from .profiling import phase
+
+_fallback_encoder = JSONEncoder()
+
+# UUIDs, datetimes, dates and dict/list subclasses (ReturnDict, ReturnList)
+# are serialized natively by orjson; UTC datetimes are rendered with a 'Z'
+# suffix to match DRF's own JSON output.
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def encode_default(obj):
+    """
+    Fallback for types orjson does not handle natively (Decimal, lazy
+    translation strings, querysets, ...). Delegates to DRF's encoder.
+    """
+    return _fallback_encoder.default(obj)
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """
+    Drop-in replacement for DRF's JSONRenderer backed by orjson
+    """
+
+    @phase('render')
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        options = ORJSON_OPTIONS
+        if self.get_indent(accepted_media_type, renderer_context):
+            options |= orjson.OPT_INDENT_2
+
+        ret = orjson.dumps(data, default=encode_default, option=options)
+
+        # Keep the output a strict javascript subset like DRF does
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    Renders ``application/msgpack`` for internal clients.
+    Datetimes are encoded with the MessagePack timestamp extension.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    @phase('render')
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        import msgpack
+
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True, datetime=True)
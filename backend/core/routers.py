@@ -0,0 +1,171 @@
+"""
+Read-replica routing.
+
+Reads stay on ``default`` unless a view opts in with ``replica_reads`` /
+``ReplicaReadMixin`` (or an admin with ``ReplicaAdminMixin``) and the
+``replica`` alias is configured. A user who has just written is pinned to
+the primary for REPLICA_STICKY_SECONDS so they always read their own writes;
+ReplicaPinMiddleware sets the pin when a request routed a write. The pin is a
+signed cookie so any worker honours it, and is mirrored into the cache when
+the cache is shared (for clients that drop cookies).
+
+Locally, point DATABASE_REPLICA_NAME at a copy of the SQLite file (or a
+second Postgres database) to exercise the routing.
+"""
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .cache import is_shared
+
+REPLICA_DB_ALIAS = 'replica'
+PIN_COOKIE_SALT = 'core.routers.pin'
+
+# Alias reads are routed to in the current context (None: Django's default)
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+# Per-request mutable flag, set once the router hands out a write connection
+_request_writes = contextvars.ContextVar('request_writes', default=None)
+
+
+def _pin_key(user_id):
+    return f'core:replica:pin:{user_id}'
+
+
+def replica_enabled():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def pin_to_primary(response, user):
+    """Route ``user``'s reads to the primary for REPLICA_STICKY_SECONDS"""
+    response.set_signed_cookie(
+        settings.REPLICA_PIN_COOKIE_NAME,
+        str(user.pk),
+        salt=PIN_COOKIE_SALT,
+        max_age=settings.REPLICA_STICKY_SECONDS,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite='Lax',
+    )
+    # A per-process cache would only pin the worker that took the write
+    if is_shared():
+        cache.set(_pin_key(user.pk), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(request, user):
+    """Whether ``user`` wrote within the last REPLICA_STICKY_SECONDS"""
+    pinned_id = request.get_signed_cookie(
+        settings.REPLICA_PIN_COOKIE_NAME,
+        default=None,
+        salt=PIN_COOKIE_SALT,
+        max_age=settings.REPLICA_STICKY_SECONDS,
+    )
+    if pinned_id == str(user.pk):
+        return True
+    return is_shared() and bool(cache.get(_pin_key(user.pk)))
+
+
+def read_alias_for(request):
+    """Database alias a replica-eligible read for ``request`` should use"""
+    if not replica_enabled():
+        return DEFAULT_DB_ALIAS
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and is_pinned(request, user):
+        return DEFAULT_DB_ALIAS
+    return REPLICA_DB_ALIAS
+
+
+@contextmanager
+def reads_from(alias):
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def tracking_writes():
+    """Record whether any write was routed inside the block"""
+    state = {'wrote': False}
+    token = _request_writes.set(state)
+    try:
+        yield state
+    finally:
+        _request_writes.reset(token)
+
+
+def replica_reads(view_func):
+    """
+    Serve a function view's reads from the replica. Place below
+    @permission_classes so the user is authenticated when it runs.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with reads_from(read_alias_for(request)):
+            return view_func(request, *args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaReadMixin:
+    """Serve a DRF class-based view's reads from the replica"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._read_alias_token = _read_alias.set(read_alias_for(request))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_read_alias_token', None)
+        if token is not None:
+            _read_alias.reset(token)
+            self._read_alias_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaAdminMixin:
+    """Serve ModelAdmin changelist pages from the replica"""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method not in ('GET', 'HEAD'):
+            return super().changelist_view(request, extra_context)
+
+        with reads_from(read_alias_for(request)):
+            response = super().changelist_view(request, extra_context)
+            # Result querysets are lazy; evaluate them while still routed
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+
+
+class ReplicaRouter:
+    """
+    Send opted-in reads to the replica alias and every write to the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        state = _request_writes.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives schema changes through replication
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
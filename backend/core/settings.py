@@ -1,4 +1,5 @@
 import os
+import importlib.util
 from pathlib import Path
 from datetime import timedelta
 
@@ -27,10 +28,8 @@ FILE_UPLOAD_HANDLERS = [
     'django.core.files.uploadhandler.TemporaryFileUploadHandler',
 ]
 
-# Create media directory if it doesn't exist
-MEDIA_ROOT_PATH = os.path.join(BASE_DIR, 'media')
-os.makedirs(MEDIA_ROOT_PATH, exist_ok=True)
-os.makedirs(os.path.join(MEDIA_ROOT_PATH, 'uploads'), exist_ok=True)
+# No directories are created here: FileSystemStorage creates MEDIA_ROOT and
+# upload subdirectories on first save
 
 # Stripe Configuration
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', '')
@@ -38,6 +37,42 @@ STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY', '')
 STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET', '')
 STRIPE_CURRENCY = 'usd'
 
+# A repeated checkout for the same upload and price returns the pending
+# payment's open session instead of creating another, unless it expires
+# within this many seconds
+STRIPE_CHECKOUT_REUSE_MARGIN = 600
+
+# Webhooks are acknowledged once stored and applied in batches in the
+# background (see payments.webhooks)
+STRIPE_WEBHOOK_TOLERANCE = 300  # seconds of clock skew accepted on signatures
+STRIPE_WEBHOOK_BATCH_SIZE = int(os.environ.get('STRIPE_WEBHOOK_BATCH_SIZE', 100))
+
+# Webhook event retention (python manage.py compact_webhook_events): processed
+# events are trimmed to the fields we use after WEBHOOK_COMPACT_AFTER_DAYS,
+# with the full payloads appended to gzipped JSONL files in
+# WEBHOOK_ARCHIVE_DIR, and deleted after WEBHOOK_DELETE_AFTER_DAYS (0 keeps them)
+WEBHOOK_COMPACT_AFTER_DAYS = int(os.environ.get('WEBHOOK_COMPACT_AFTER_DAYS', 30))
+WEBHOOK_DELETE_AFTER_DAYS = int(os.environ.get('WEBHOOK_DELETE_AFTER_DAYS', 365))
+WEBHOOK_ARCHIVE_DIR = os.environ.get('WEBHOOK_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive', 'webhooks'))
+
+# Stripe HTTP client (see payments.provider). Point STRIPE_API_BASE at
+# `python manage.py stripe_stub` to run the checkout flow offline.
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE', 'https://api.stripe.com')
+STRIPE_CONNECT_TIMEOUT = float(os.environ.get('STRIPE_CONNECT_TIMEOUT', 2))  # seconds
+STRIPE_READ_TIMEOUT = float(os.environ.get('STRIPE_READ_TIMEOUT', 8))  # seconds
+STRIPE_MAX_NETWORK_RETRIES = int(os.environ.get('STRIPE_MAX_NETWORK_RETRIES', 1))
+STRIPE_RETRY_BASE_DELAY = 0.25  # seconds; retry n sleeps up to base * 2**n (full jitter)
+STRIPE_RETRY_MAX_DELAY = 2.0  # seconds
+STRIPE_POOL_SIZE = int(os.environ.get('STRIPE_POOL_SIZE', 10))  # kept-alive connections per process
+
+# Stripe circuit breaker: open after this many consecutive outage errors,
+# fail fast with 503 + Retry-After, then let one probe through after the
+# reset period. Calls in flight are capped per process so a slow Stripe
+# cannot occupy every request thread.
+STRIPE_BREAKER_FAILURES = int(os.environ.get('STRIPE_BREAKER_FAILURES', 5))
+STRIPE_BREAKER_RESET_SECONDS = int(os.environ.get('STRIPE_BREAKER_RESET_SECONDS', 30))
+STRIPE_MAX_CONCURRENT = int(os.environ.get('STRIPE_MAX_CONCURRENT', 4))
+
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:5173')
 
 PAYMENT_PRICING = {
@@ -60,10 +95,12 @@ DJANGO_APPS = [
 THIRD_PARTY_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
 ]
 
 LOCAL_APPS = [
+    'core',
     'accounts',
     'files',
     'payments',
@@ -72,15 +109,45 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
+]
+
+# Metrics endpoint (/metrics). Scrapers must send
+# 'Authorization: Bearer <METRICS_TOKEN>'; without a token the endpoint is
+# disabled (403). Multi-process workers also need
+# PROMETHEUS_MULTIPROC_DIR pointing at a shared, initially empty directory.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Request profiling (see core.profiling): fraction of requests timed and
+# reported through Server-Timing headers and the core.profiling logger
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.01))
+
+# Response compression (see core.middleware.CompressionMiddleware)
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # bytes
+COMPRESSION_CONTENT_TYPES = [
+    'application/json',
+    'application/msgpack',
+    'text/html',
+    'text/plain',
+    'text/css',
+    'text/javascript',
+    'application/javascript',
 ]
+COMPRESSION_ENCODINGS = ['br', 'zstd', 'gzip']  # preference order; br/zstd need brotli/zstandard
+COMPRESSION_BROTLI_QUALITY = 4
+COMPRESSION_ZSTD_LEVEL = 3
+COMPRESSION_GZIP_MAX_RANDOM_BYTES = 100  # BREACH padding, Django's GZipMiddleware default
 
 ROOT_URLCONF = 'core.urls'
 
@@ -103,16 +170,117 @@ TEMPLATES = [
 WSGI_APPLICATION = 'core.wsgi.application'
 
 # Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DATABASE_ENGINE selects the profile: 'sqlite' (single node, default) or
+# 'postgresql'. Compare profiles with `manage.py benchmark_database`.
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DATABASE_NAME', 'secureshare'),
+            'USER': os.environ.get('DATABASE_USER', 'secureshare'),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', 'localhost'),
+            'PORT': os.environ.get('DATABASE_PORT', '5432'),
+            # Persistent connections reused across requests, checked before reuse
+            'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': 5,
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.db.backends.sqlite3',
+            'NAME': os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'timeout': 20,  # seconds to wait for the write lock
+                'transaction_mode': 'IMMEDIATE',
+                'pragmas': {
+                    'journal_mode': 'WAL',
+                    'synchronous': 'NORMAL',
+                    'busy_timeout': 20000,
+                    'cache_size': -20000,  # KiB
+                    'temp_store': 'MEMORY',
+                },
+            },
+        }
+    }
+
+# Read replica (see core.routers): set DATABASE_REPLICA_NAME (SQLite file or
+# Postgres database) and/or DATABASE_REPLICA_HOST to route reporting reads
+if os.environ.get('DATABASE_REPLICA_NAME') or os.environ.get('DATABASE_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DATABASE_REPLICA_NAME', DATABASES['default']['NAME']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    if DATABASE_ENGINE == 'postgresql':
+        DATABASES['replica']['HOST'] = os.environ.get('DATABASE_REPLICA_HOST', DATABASES['default']['HOST'])
+        DATABASES['replica']['PORT'] = os.environ.get('DATABASE_REPLICA_PORT', DATABASES['default']['PORT'])
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))  # read-your-writes window
+REPLICA_PIN_COOKIE_NAME = 'replica_pin'
+
+# Cache
+# Set REDIS_URL to share cached data (e.g. user snapshots) between worker processes
+REDIS_URL = os.environ.get('REDIS_URL', '')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
     }
-}
 
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Seconds an authenticated user snapshot may be served from cache
+# (see accounts.authentication.CachedJWTAuthentication)
+USER_CACHE_TIMEOUT = int(os.environ.get('USER_CACHE_TIMEOUT', 300))
+# Upper bound without REDIS_URL: other workers never see an invalidation
+USER_CACHE_LOCAL_TIMEOUT = int(os.environ.get('USER_CACHE_LOCAL_TIMEOUT', 5))
+
+# Password hashing
+# Hashing runs on a bounded executor (see accounts.hashers); set
+# PASSWORD_HASHER=bcrypt to hash new passwords with bcrypt-SHA256.
+# Existing hashes of either algorithm keep verifying.
+PASSWORD_HASHERS = [
+    'accounts.hashers.BoundedPBKDF2PasswordHasher',
+    'accounts.hashers.BoundedBCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+if os.environ.get('PASSWORD_HASHER', 'pbkdf2') == 'bcrypt':
+    PASSWORD_HASHERS[0], PASSWORD_HASHERS[1] = PASSWORD_HASHERS[1], PASSWORD_HASHERS[0]
+
+# Per gunicorn process (one per core), so hashing takes at most every core
+# at once; see gunicorn.conf.py
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 1))
+PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 4))
+PASSWORD_HASH_RETRY_AFTER = 1  # seconds, sent as Retry-After when the queue is full
+
+# Hasher cost; None keeps Django's default, which is also the PBKDF2 floor.
+# Use `manage.py calibrate_password_hasher`
+PASSWORD_HASH_ITERATIONS = int(os.environ['PASSWORD_HASH_ITERATIONS']) if os.environ.get('PASSWORD_HASH_ITERATIONS') else None
+BCRYPT_ROUNDS = int(os.environ['BCRYPT_ROUNDS']) if os.environ.get('BCRYPT_ROUNDS') else None
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -149,22 +317,30 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# application/msgpack is offered to internal clients when msgpack is installed
+MSGPACK_ENABLED = (
+    os.environ.get('API_MSGPACK_ENABLED', 'True').lower() == 'true'
+    and importlib.util.find_spec('msgpack') is not None
+)
+
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'core.renderers.ORJSONRenderer',
+        *(['core.renderers.MessagePackRenderer'] if MSGPACK_ENABLED else []),
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
-        'rest_framework.parsers.MultiPartParser',
-        'rest_framework.parsers.FileUploadParser',
+        'core.parsers.ORJSONParser',
+        *(['core.parsers.MessagePackParser'] if MSGPACK_ENABLED else []),
+        'core.parsers.MultiPartParser',
+        'core.parsers.FileUploadParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
@@ -177,7 +353,7 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    'UPDATE_LAST_LOGIN': False,  # recorded by accounts.tracking.record_login
     
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
@@ -204,8 +380,16 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
     
     'TOKEN_OBTAIN_SERIALIZER': 'accounts.serializers.CustomTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.CustomTokenRefreshSerializer',
 }
 
+# Refresh token blacklist filter (see accounts.blacklist); only used when
+# REDIS_URL shares revocations between workers
+BLACKLIST_FILTER_REBUILD_INTERVAL = int(os.environ.get('BLACKLIST_FILTER_REBUILD_INTERVAL', 300))  # seconds
+BLACKLIST_FILTER_ERROR_RATE = 0.001
+BLACKLIST_FILTER_MIN_CAPACITY = 10000
+BLACKLIST_FILTER_CATCH_UP_OVERLAP = 60  # seconds re-read on catch-up, covers late commits
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -248,14 +432,41 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100MB
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 1000
 
+# Write-behind queues for non-critical writes (see core.writebehind)
+WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'True').lower() == 'true'
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL', 1.0))  # seconds
+WRITE_BEHIND_MAX_BATCH = 500
+WRITE_BEHIND_MAX_SIZE = 10000
+
+# Funnel deferred writes through one writer thread per process, committed in
+# grouped transactions (for SQLite installs, where writers share one lock)
+DB_SINGLE_WRITER = os.environ.get('DB_SINGLE_WRITER', 'False').lower() == 'true'
+DB_SINGLE_WRITER_INTERVAL = float(os.environ.get('DB_SINGLE_WRITER_INTERVAL', 0.05))  # seconds
+# Queue download counter increments off the request path (see files.tracking)
+DOWNLOAD_COUNT_WRITE_BEHIND = os.environ.get('DOWNLOAD_COUNT_WRITE_BEHIND', 'False').lower() == 'true'
+
+# Session activity tracking (see accounts.tracking)
+SESSION_ACTIVITY_INTERVAL = int(os.environ.get('SESSION_ACTIVITY_INTERVAL', 60))  # seconds between writes per session
+SESSION_ACTIVITY_MAX_TRACKED = 50000
+SESSION_RETENTION_DAYS = int(os.environ.get('SESSION_RETENTION_DAYS', 30))
+
+# API exception logging (see core.exceptions.log_api_exception): fraction of
+# client errors (4xx, 503 busy) logged, and per view/status/exception cap
+EXCEPTION_LOG_SAMPLE_RATE = float(os.environ.get('EXCEPTION_LOG_SAMPLE_RATE', 0.01))
+EXCEPTION_LOG_RATE_LIMIT = 10  # lines per window
+EXCEPTION_LOG_RATE_WINDOW = 60  # seconds
+
 # Logging Configuration
+# Loggers hand records to a bounded queue; a listener thread writes
+# JSON lines to a rotating file and plain text to the console (see core.logs)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
-            'style': '{',
+        'json': {
+            '()': 'core.logs.JSONFormatter',
         },
         'simple': {
             'format': '{levelname} {message}',
@@ -265,40 +476,64 @@ LOGGING = {
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            # Creates logs/ on first write rather than at import
+            'class': 'core.logs.RotatingFileHandler',
             'filename': BASE_DIR / 'logs' / 'django.log',
-            'formatter': 'verbose',
+            'maxBytes': int(os.environ.get('LOG_FILE_MAX_BYTES', 50 * 1024 * 1024)),
+            'backupCount': int(os.environ.get('LOG_FILE_BACKUP_COUNT', 5)),
+            'delay': True,
+            'formatter': 'json',
         },
         'console': {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        # Configured after 'console' and 'file' (name order), which it feeds
+        'queue': {
+            '()': 'core.logs.BoundedQueueHandler',
+            'targets': ['cfg://handlers.console', 'cfg://handlers.file'],
+            'maxsize': int(os.environ.get('LOG_QUEUE_SIZE', 10000)),
+        },
     },
     'root': {
-        'handlers': ['console'],
+        'handlers': ['queue'],
         'level': 'INFO',
     },
     'loggers': {
         'django': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
+        # 4xx responses are counted (secureshare_request_latency_seconds,
+        # secureshare_api_exceptions) rather than logged one line each
+        'django.request': {
+            'handlers': ['queue'],
+            'level': 'ERROR',
+            'propagate': False,
+        },
         'accounts': {
-            'handlers': ['file', 'console'],
-            'level': 'DEBUG',
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
             'propagate': False,
         },
         'files': {
-            'handlers': ['file', 'console'],
-            'level': 'DEBUG',
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
             'propagate': False,
         },
         'payments': {
-            'handlers': ['file', 'console'],
-            'level': 'DEBUG',
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        # The SDK logs two INFO lines per API call; latency is in
+        # secureshare_stripe_request_seconds instead
+        'stripe': {
+            'handlers': ['queue'],
+            'level': 'WARNING',
             'propagate': False,
         },
     },
-}
\ No newline at end of file
+}
@@ -0,0 +1,101 @@
+"""
+Test helpers shared by the app test suites.
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryPlanAssertionsMixin:
+    """
+    Assertions over ``QuerySet.explain()`` output, so a hot query that stops
+    using its index (or starts sorting in a temporary structure) fails a test
+    instead of silently getting slower as tables grow.
+    """
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would always be seq-scanned; ask whether an
+            # index path exists at all
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def explain_call(self, func):
+        """
+        Plan of the single query ``func`` runs. For queries that execute
+        eagerly (``aggregate()``, ``count()``) and so can't be explained
+        through a queryset.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        self.assertEqual(len(queries), 1, [query['sql'] for query in queries.captured_queries])
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {queries.captured_queries[0]['sql']}")
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queryset, index_name=None):
+        return self.assertPlanUsesIndex(self.explain(queryset), queryset.model, index_name)
+
+    def assertCallUsesIndex(self, func, model, index_name=None):
+        return self.assertPlanUsesIndex(self.explain_call(func), model, index_name)
+
+    def assertPlanUsesIndex(self, plan, model, index_name=None):
+        table = model._meta.db_table
+
+        if connection.vendor == 'sqlite':
+            scans = [
+                line for line in plan.splitlines()
+                if f'SCAN {table}' in line and 'INDEX' not in line
+            ]
+            self.assertFalse(scans, f'Full table scan on {table}:\n{plan}')
+        elif connection.vendor == 'postgresql':
+            self.assertNotIn(f'Seq Scan on {table}', plan, f'Full table scan on {table}:\n{plan}')
+
+        if index_name is not None:
+            self.assertIn(index_name, plan, f'{index_name} not used:\n{plan}')
+        return plan
+
+    def assertNoSort(self, queryset):
+        plan = self.explain(queryset)
+        if connection.vendor == 'sqlite':
+            self.assertNotIn('TEMP B-TREE', plan, f'Sort outside the index:\n{plan}')
+        elif connection.vendor == 'postgresql':
+            self.assertNotIn('Sort Key', plan, f'Sort outside the index:\n{plan}')
+        return plan
+
+
+class QueryBudgetMixin:
+    """
+    Assert an upper bound on the queries a request issues, measured at
+    several table sizes so an N+1 shows up as a budget overrun.
+    """
+
+    ROW_COUNTS = (1, 100, 1000)
+
+    def assertQueryBudget(self, budget, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = func(*args, **kwargs)
+
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(
+                f'{i}. {query["sql"]}' for i, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(f'{executed} queries executed, budget is {budget}:\n{queries}')
+        return response
+
+    def assertBudgetAtEveryScale(self, budget, create_rows, func, *args, **kwargs):
+        """
+        Grow the table through ROW_COUNTS with ``create_rows(count)`` and
+        check ``func`` stays within ``budget`` at each size
+        """
+        created = 0
+        for rows in self.ROW_COUNTS:
+            create_rows(rows - created)
+            created = rows
+            with self.subTest(rows=rows):
+                response = self.assertQueryBudget(budget, func, *args, **kwargs)
+                self.assertLess(response.status_code, 400, getattr(response, 'data', response))
@@ -0,0 +1,747 @@
+import copy
+import datetime
+import decimal
+import gc
+import gzip
+import json
+import logging
+import logging.config
+import os
+import runpy
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import DatabaseError, connection, connections, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from prometheus_client import REGISTRY
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from . import exceptions, middleware, profiling, routers, warmup
+from .db.backends.sqlite3.base import DatabaseWrapper
+from .logs import BoundedQueueHandler, JSONFormatter, LogRateLimiter, RotatingFileHandler
+from .parsers import MessagePackParser, ORJSONParser
+from .renderers import MessagePackRenderer, ORJSONRenderer
+from .writebehind import _apply_writes
+
+
+class _Stream:
+    """Minimal request stream for calling parsers directly"""
+
+    def __init__(self, body):
+        self.body = body
+
+    def read(self):
+        return self.body
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """orjson output must match what DRF's JSONRenderer produced"""
+
+    def assertSameJSON(self, data):
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parity_with_drf_encoder(self):
+        self.assertSameJSON({
+            'id': uuid.UUID('6a12263d-a95b-4c1a-9e07-e10c96ebcdb8'),
+            'amount': decimal.Decimal('3.10'),
+            'aware': datetime.datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=datetime.timezone.utc),
+            'naive': datetime.datetime(2024, 1, 2, 3, 4, 5),
+            'day': datetime.date(2024, 1, 2),
+            'time': datetime.time(1, 2, 3, 456789),
+            'duration': datetime.timedelta(seconds=90),
+            'nested': [{'unicode': 'naïve ✓'}],
+        })
+
+    def test_utc_datetimes_use_z_suffix(self):
+        rendered = ORJSONRenderer().render({'at': datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc)})
+        self.assertEqual(rendered, b'{"at":"2024-01-02T00:00:00Z"}')
+
+    def test_non_string_keys(self):
+        self.assertSameJSON({1: 'int', None: 'none', 2.5: 'float', False: 'bool'})
+
+    def test_line_separators_are_escaped(self):
+        self.assertSameJSON({'text': 'a\u2028b\u2029c'})
+
+    def test_none_renders_empty_body(self):
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_parser_round_trip(self):
+        data = {'files': [{'filename': 'a.txt', 'file_size': 10}]}
+        stream = _Stream(ORJSONRenderer().render(data))
+        self.assertEqual(ORJSONParser().parse(stream), data)
+
+
+@skipUnless(settings.MSGPACK_ENABLED, 'msgpack is not installed')
+class MessagePackTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='msgpack@secureshare.dev',
+            username='msgpack',
+            password=None
+        )
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def test_round_trip(self):
+        data = {
+            'id': str(uuid.uuid4()),
+            'size': 1024,
+            'at': timezone.now(),
+            'tags': ['a', 'b'],
+            'blob': b'\x00\x01',
+        }
+        parsed = MessagePackParser().parse(_Stream(MessagePackRenderer().render(data)))
+        self.assertEqual(parsed, data)
+
+    def test_invalid_body_is_a_parse_error(self):
+        response = self.client.post('/api/files/create/', b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, 400)
+
+    def test_negotiation(self):
+        import msgpack
+
+        response = self.client.get('/api/files/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content)['count'], 0)
+
+        response = self.client.get('/api/files/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(response.content)['count'], 0)
+
+    def test_msgpack_request_body(self):
+        import msgpack
+
+        response = self.client.post(
+            '/api/files/create/',
+            msgpack.packb({'filename': 'report.pdf', 'file_size': 2048}),
+            content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(msgpack.unpackb(response.content)['original_filename'], 'report.pdf')
+
+
+@override_settings(COMPRESSION_MIN_SIZE=1024, COMPRESSION_ENCODINGS=['br', 'zstd', 'gzip'])
+class CompressionMiddlewareTests(SimpleTestCase):
+
+    body = b'{"files": [%s]}' % b','.join(b'{"name": "file_%d.txt"}' % i for i in range(200))
+
+    def setUp(self):
+        # Stand-ins so negotiation is testable without the optional packages
+        compressors = mock.patch.dict(middleware.COMPRESSORS, {
+            'br': lambda data: b'br:' + gzip.compress(data),
+            'zstd': lambda data: b'zstd:' + gzip.compress(data),
+        })
+        compressors.start()
+        self.addCleanup(compressors.stop)
+
+    def compress(self, body=None, content_type='application/json', accept_encoding='gzip, br', **headers):
+        request = RequestFactory().get('/api/files/', HTTP_ACCEPT_ENCODING=accept_encoding, **headers)
+        response = HttpResponse(self.body if body is None else body, content_type=content_type)
+        response['ETag'] = '"abc"'
+        return middleware.CompressionMiddleware(lambda request: response).process_response(request, response)
+
+    def test_prefers_configured_order(self):
+        response = self.compress(accept_encoding='gzip, zstd, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+
+    def test_respects_quality_values(self):
+        self.assertEqual(self.compress(accept_encoding='br;q=0, gzip;q=0.5')['Content-Encoding'], 'gzip')
+        self.assertFalse(self.compress(accept_encoding='gzip;q=0').has_header('Content-Encoding'))
+        self.assertFalse(self.compress(accept_encoding='identity').has_header('Content-Encoding'))
+
+    def test_below_threshold_is_untouched(self):
+        response = self.compress(body=b'{"ok": true}')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['ETag'], '"abc"')
+
+    def test_unlisted_content_type_and_streaming_are_untouched(self):
+        self.assertFalse(self.compress(content_type='application/zip').has_header('Content-Encoding'))
+
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        streaming = StreamingHttpResponse(iter([self.body]), content_type='application/json')
+        response = middleware.CompressionMiddleware(lambda request: streaming).process_response(request, streaming)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_vary_and_weak_etag(self):
+        response = self.compress()
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(response['ETag'], 'W/"abc"')
+
+        # Clients that can't decode still share the cache key
+        self.assertIn('Accept-Encoding', self.compress(accept_encoding='')['Vary'])
+
+    def test_credentialed_responses_are_padded_gzip(self):
+        lengths = set()
+        for _ in range(10):
+            response = self.compress(HTTP_AUTHORIZATION='Bearer token')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.content), self.body)
+            lengths.add(len(response.content))
+        # Random filename padding makes the compressed size unpredictable
+        self.assertGreater(len(lengths), 1)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite profile only')
+class SQLiteBackendTests(SimpleTestCase):
+    """The tuned backend against a real file (the test database is in memory)"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+
+    def connect(self, **options):
+        alias = f'sqlite-{uuid.uuid4().hex[:8]}'
+        settings_dict = dict(
+            connection.settings_dict,
+            NAME=self.path,
+            OPTIONS={**settings.DATABASES['default']['OPTIONS'], **options},
+        )
+        connections[alias] = DatabaseWrapper(settings_dict, alias)
+        self.addCleanup(connections.__delitem__, alias)
+        self.addCleanup(connections[alias].close)
+        return alias
+
+    def pragma(self, alias, name):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_apply_to_new_connections(self):
+        alias = self.connect()
+        self.assertEqual(self.pragma(alias, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(alias, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(alias, 'busy_timeout'), 20000)
+
+    def other_writer_can_begin(self):
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        try:
+            other.execute('BEGIN IMMEDIATE')
+            other.execute('ROLLBACK')
+            return True
+        except sqlite3.OperationalError:
+            return False
+        finally:
+            other.close()
+
+    def test_atomic_takes_write_lock_up_front(self):
+        alias = self.connect()
+        self.pragma(alias, 'journal_mode')
+        with transaction.atomic(using=alias):
+            # Nothing written yet, but the reserved lock is already held
+            self.assertFalse(self.other_writer_can_begin())
+        self.assertTrue(self.other_writer_can_begin())
+
+    def test_deferred_mode_takes_no_lock_at_begin(self):
+        alias = self.connect(transaction_mode=None)
+        self.pragma(alias, 'journal_mode')
+        with transaction.atomic(using=alias):
+            self.assertTrue(self.other_writer_can_begin())
+
+
+class SingleWriterTests(TestCase):
+
+    def test_failing_operation_does_not_discard_the_batch(self):
+        def create(name):
+            User.objects.create_user(email=f'{name}@secureshare.dev', username=name, password=None)
+
+        def create_then_fail(name):
+            create(name)
+            raise RuntimeError('boom')
+
+        with self.assertLogs('core.writebehind', 'ERROR'):
+            _apply_writes([(create, ('first',)), (create_then_fail, ('broken',)), (create, ('last',))])
+
+        self.assertEqual(
+            sorted(User.objects.values_list('username', flat=True)), ['first', 'last']
+        )
+
+
+class ReplicaRouterTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='replica@secureshare.dev', username='replica', password=None)
+        self.router = routers.ReplicaRouter()
+        enabled = mock.patch.object(routers, 'replica_enabled', return_value=True)
+        enabled.start()
+        self.addCleanup(enabled.stop)
+
+    def request(self, user=None, cookies=None):
+        request = RequestFactory().get('/')
+        request.user = user or AnonymousUser()
+        request.COOKIES.update(cookies or {})
+        return request
+
+    def pin_cookie(self, user):
+        response = HttpResponse()
+        routers.pin_to_primary(response, user)
+        return {settings.REPLICA_PIN_COOKIE_NAME: response.cookies[settings.REPLICA_PIN_COOKIE_NAME].value}
+
+    def test_reads_stay_on_default_unless_opted_in(self):
+        self.assertIsNone(self.router.db_for_read(User))
+        with routers.reads_from(routers.REPLICA_DB_ALIAS):
+            self.assertEqual(self.router.db_for_read(User), routers.REPLICA_DB_ALIAS)
+            # Related lookups follow the instance they started from
+            self.assertEqual(self.router.db_for_read(User, instance=self.user), 'default')
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_writes_go_to_primary_and_are_tracked(self):
+        with routers.tracking_writes() as state, routers.reads_from(routers.REPLICA_DB_ALIAS):
+            self.assertFalse(state['wrote'])
+            self.assertEqual(self.router.db_for_write(User), 'default')
+            self.assertTrue(state['wrote'])
+
+    def test_replica_is_never_migrated(self):
+        self.assertFalse(self.router.allow_migrate(routers.REPLICA_DB_ALIAS, 'files'))
+        self.assertIsNone(self.router.allow_migrate('default', 'files'))
+
+    def test_read_alias(self):
+        self.assertEqual(routers.read_alias_for(self.request()), routers.REPLICA_DB_ALIAS)
+        self.assertEqual(routers.read_alias_for(self.request(self.user)), routers.REPLICA_DB_ALIAS)
+
+        with mock.patch.object(routers, 'replica_enabled', return_value=False):
+            self.assertEqual(routers.read_alias_for(self.request()), 'default')
+
+    def test_pin_routes_reads_to_primary_on_any_worker(self):
+        cookies = self.pin_cookie(self.user)
+        # Nothing in the (per-process) cache: the cookie alone carries the pin
+        self.assertFalse(routers.cache.get(routers._pin_key(self.user.pk)))
+        self.assertEqual(routers.read_alias_for(self.request(self.user, cookies)), 'default')
+
+        other = User.objects.create_user(email='other@secureshare.dev', username='other', password=None)
+        self.assertEqual(routers.read_alias_for(self.request(other, cookies)), routers.REPLICA_DB_ALIAS)
+
+        forged = {settings.REPLICA_PIN_COOKIE_NAME: str(self.user.pk)}
+        self.assertEqual(routers.read_alias_for(self.request(self.user, forged)), routers.REPLICA_DB_ALIAS)
+
+    def test_pin_expires(self):
+        cookies = self.pin_cookie(self.user)
+        later = timezone.now().timestamp() + settings.REPLICA_STICKY_SECONDS + 1
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            self.assertEqual(routers.read_alias_for(self.request(self.user, cookies)), routers.REPLICA_DB_ALIAS)
+
+    def test_middleware_pins_after_a_write(self):
+        def view(request, write):
+            request.user = self.user
+            if write:
+                self.router.db_for_write(User)
+            return HttpResponse()
+
+        with mock.patch.object(middleware, 'replica_enabled', return_value=True):
+            response = middleware.ReplicaPinMiddleware(lambda request: view(request, True))(self.request())
+            self.assertIn(settings.REPLICA_PIN_COOKIE_NAME, response.cookies)
+
+            response = middleware.ReplicaPinMiddleware(lambda request: view(request, False))(self.request())
+            self.assertNotIn(settings.REPLICA_PIN_COOKIE_NAME, response.cookies)
+
+    def test_replica_reads_decorator(self):
+        @routers.replica_reads
+        def view(request):
+            return self.router.db_for_read(User)
+
+        self.assertEqual(view(self.request(self.user)), routers.REPLICA_DB_ALIAS)
+        self.assertEqual(view(self.request(self.user, self.pin_cookie(self.user))), 'default')
+        self.assertIsNone(self.router.db_for_read(User))
+
+
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        self.clock = 0.0
+        clock = mock.patch.object(profiling.time, 'perf_counter', lambda: self.clock)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def spend(self, seconds):
+        self.clock += seconds
+
+    def test_phases_are_exclusive(self):
+        profile = profiling.RequestProfile()
+        token = profiling._current.set(profile)
+        self.addCleanup(profiling._current.reset, token)
+
+        def query(sql, params, many, context):
+            self.spend(2)
+
+        with profiling.phase('storage'):
+            self.spend(1)
+            profile.record_query(query, 'SELECT 1', (), False, {})
+            with profiling.phase('zip'):
+                self.spend(4)
+                profile.record_query(query, 'SELECT 1', (), False, {})
+        self.spend(8)
+
+        self.assertEqual(profile.phases, {'storage': 1, 'db': 4, 'zip': 4})
+        self.assertEqual(profile.queries, 2)
+        self.assertEqual(sum(profile.phases.values()), self.clock - 8)
+
+    def test_rendering_is_its_own_phase(self):
+        profile = profiling.RequestProfile()
+        token = profiling._current.set(profile)
+        self.addCleanup(profiling._current.reset, token)
+
+        ORJSONRenderer().render({'id': 1})
+        MessagePackRenderer().render({'id': 1})
+        self.assertEqual(list(profile.phases), ['render'])
+
+    def test_unsampled_requests_are_not_timed(self):
+        with profiling.phase('storage'):
+            self.spend(1)
+        self.assertIsNone(profiling._current.get())
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_server_timing_adds_up(self):
+        user = User.objects.create_user(email='timing@secureshare.dev', username='timing', password=None)
+        request = RequestFactory().get('/api/auth/sessions/')
+
+        def slow_query(execute, sql, params, many, context):
+            self.spend(0.002)
+            return execute(sql, params, many, context)
+
+        def view(request):
+            with profiling.phase('auth'), connection.execute_wrapper(slow_query):
+                self.spend(0.003)
+                list(User.objects.filter(pk=user.pk))
+            self.spend(0.001)
+            return HttpResponse()
+
+        with self.assertLogs('core.profiling', 'INFO'):
+            response = profiling.ProfilingMiddleware(view)(request)
+        timings = dict(
+            (entry.split(';')[0], float(entry.split(';')[1].split('=')[1]))
+            for entry in response['Server-Timing'].split(', ')
+        )
+        self.assertEqual(timings, {'db': 2.0, 'auth': 3.0, 'total': 6.0})
+
+
+class MetricsViewTests(SimpleTestCase):
+
+    @override_settings(METRICS_TOKEN='')
+    def test_disabled_without_token(self):
+        self.assertEqual(self.client.get('/metrics', SERVER_NAME='localhost').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_requires_token(self):
+        self.assertEqual(self.client.get('/metrics', SERVER_NAME='localhost').status_code, 403)
+        response = self.client.get(
+            '/metrics', SERVER_NAME='localhost', HTTP_AUTHORIZATION='Bearer wrong-token'
+        )
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(
+            '/metrics', SERVER_NAME='localhost', HTTP_AUTHORIZATION='Bearer scrape-token'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'secureshare_transfer_bytes', response.content)
+
+
+class _Collector(logging.Handler):
+    """Target handler that keeps what it is given"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def _record(level=logging.INFO, msg='message %s', args=('arg',), **extra):
+    record = logging.LogRecord('secureshare.test', level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class BoundedQueueHandlerTests(SimpleTestCase):
+
+    def make_handler(self, **kwargs):
+        self.target = _Collector()
+        handler = BoundedQueueHandler([self.target], **kwargs)
+        self.addCleanup(handler.stop)
+        return handler
+
+    def dropped(self, level):
+        return REGISTRY.get_sample_value('secureshare_log_records_dropped_total', {'level': level}) or 0
+
+    def test_records_reach_targets_with_args_merged(self):
+        handler = self.make_handler()
+        handler.handle(_record())
+        handler.stop()
+
+        [record] = self.target.records
+        self.assertEqual(record.msg, 'message arg')
+        self.assertIsNone(record.args)
+
+    def test_full_queue_drops_and_counts(self):
+        handler = self.make_handler(maxsize=1, block_timeout=0.05)
+        # No listener, so nothing drains the queue
+        with mock.patch.object(handler, '_ensure_started'):
+            info_before, error_before = self.dropped('INFO'), self.dropped('ERROR')
+
+            handler.handle(_record())
+            started = time.perf_counter()
+            handler.handle(_record())
+            self.assertLess(time.perf_counter() - started, 0.05)
+
+            started = time.perf_counter()
+            handler.handle(_record(logging.ERROR))
+            self.assertGreaterEqual(time.perf_counter() - started, 0.05)
+
+        self.assertEqual(self.dropped('INFO') - info_before, 1)
+        self.assertEqual(self.dropped('ERROR') - error_before, 1)
+        self.assertEqual(handler.queue.qsize(), 1)
+
+    def test_unconfigured_target_is_rejected(self):
+        with self.assertRaises(ValueError):
+            BoundedQueueHandler(['cfg://handlers.file'])
+
+    def test_project_logging_config(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        config = copy.deepcopy(settings.LOGGING)
+        config['handlers']['file']['filename'] = os.path.join(directory.name, 'django.log')
+
+        # Put the configuration the test run started with back afterwards
+        self.addCleanup(logging.config.dictConfig, settings.LOGGING)
+        logging.config.dictConfig(config)
+
+        [handler] = logging.getLogger().handlers
+        self.addCleanup(handler.stop)
+        self.assertIsInstance(handler, BoundedQueueHandler)
+        self.assertEqual(
+            [type(target) for target in handler.targets], [logging.StreamHandler, RotatingFileHandler]
+        )
+        self.assertIsInstance(handler.targets[1].formatter, JSONFormatter)
+
+
+class JSONFormatterTests(SimpleTestCase):
+
+    def format(self, record):
+        return json.loads(JSONFormatter().format(record))
+
+    def test_standard_and_extra_fields(self):
+        entry = self.format(_record(profile={'total_ms': 1.5}, request_id=uuid.UUID(int=1)))
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['logger'], 'secureshare.test')
+        self.assertEqual(entry['message'], 'message arg')
+        self.assertEqual(entry['profile'], {'total_ms': 1.5})
+        self.assertEqual(entry['request_id'], str(uuid.UUID(int=1)))
+        self.assertEqual(datetime.datetime.fromisoformat(entry['time']).tzinfo, datetime.timezone.utc)
+        for field in ('module', 'process', 'thread'):
+            self.assertIn(field, entry)
+        self.assertNotIn('args', entry)
+        self.assertNotIn('exception', entry)
+
+    def test_exception(self):
+        try:
+            raise ValueError('broken')
+        except ValueError:
+            record = logging.LogRecord('secureshare.test', logging.ERROR, __file__, 1, 'failed', (), sys.exc_info())
+        entry = self.format(record)
+        self.assertIn('ValueError: broken', entry['exception'])
+        self.assertIn('Traceback', entry['exception'])
+
+
+class LogRateLimiterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.patch('core.logs.time.monotonic', lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_limits_per_key_and_reports_suppressed(self):
+        limiter = LogRateLimiter(limit=2, window=60)
+        self.assertEqual(limiter.hit('a'), (True, 0))
+        self.assertEqual(limiter.hit('a'), (True, 0))
+        self.assertEqual(limiter.hit('a'), (False, 0))
+        self.assertEqual(limiter.hit('a'), (False, 0))
+        # Other keys have their own allowance
+        self.assertEqual(limiter.hit('b'), (True, 0))
+
+        self.now += 60
+        self.assertEqual(limiter.hit('a'), (True, 2))
+        self.assertEqual(limiter.hit('a'), (True, 0))
+
+    def test_key_table_is_bounded(self):
+        limiter = LogRateLimiter(limit=1, window=60, max_keys=2)
+        limiter.hit('a')
+        limiter.hit('b')
+        limiter.hit('c')
+        self.assertLessEqual(len(limiter._windows), 2)
+        # Forgetting keys only ever allows more lines, never fewer
+        self.assertEqual(limiter.hit('a'), (True, 0))
+
+
+@override_settings(EXCEPTION_LOG_SAMPLE_RATE=0)
+class APIExceptionLoggingTests(SimpleTestCase):
+
+    def setUp(self):
+        limiter = mock.patch.object(exceptions, 'exception_log_limiter', LogRateLimiter(limit=2, window=60))
+        limiter.start()
+        self.addCleanup(limiter.stop)
+
+    def handle(self, exc):
+        request = RequestFactory().get('/api/files/')
+        request.resolver_match = mock.Mock(view_name='upload_list')
+        return exceptions.custom_exception_handler(exc, {'request': request})
+
+    def exception_count(self, status, name):
+        return REGISTRY.get_sample_value(
+            'secureshare_api_exceptions_total', {'status': str(status), 'exception': name}
+        ) or 0
+
+    def test_client_errors_are_counted_not_logged(self):
+        before = self.exception_count(404, 'NotFound')
+        with self.assertNoLogs('core.exceptions'):
+            response = self.handle(NotFound())
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.exception_count(404, 'NotFound') - before, 1)
+
+    @override_settings(EXCEPTION_LOG_SAMPLE_RATE=1)
+    def test_sampled_client_errors_log_without_traceback(self):
+        with self.assertLogs('core.exceptions', 'INFO') as logs:
+            self.handle(NotFound())
+        [record] = logs.records
+        self.assertEqual(record.levelno, logging.INFO)
+        self.assertIsNone(record.exc_info)
+        self.assertIn('upload_list: 404 NotFound', record.getMessage())
+
+    def test_service_busy_is_expected(self):
+        with self.assertNoLogs('core.exceptions'):
+            self.assertEqual(self.handle(exceptions.ServiceBusy()).status_code, 503)
+
+    def test_server_errors_always_log_with_traceback(self):
+        try:
+            raise APIException('down')
+        except APIException as exc:
+            with self.assertLogs('core.exceptions', 'ERROR') as logs:
+                self.handle(exc)
+        self.assertIsNotNone(logs.records[0].exc_info)
+
+    def test_repeats_are_rate_limited(self):
+        with self.assertLogs('core.exceptions', 'ERROR') as logs:
+            for _ in range(5):
+                self.handle(APIException('down'))
+        self.assertEqual(len(logs.records), 2)
+
+        exceptions.exception_log_limiter._windows[('upload_list', 500, 'APIException')][0] -= 60
+        with self.assertLogs('core.exceptions', 'ERROR') as logs:
+            self.handle(APIException('down'))
+        self.assertIn('(3 similar suppressed)', logs.records[0].getMessage())
+
+
+class RotatingFileHandlerTests(SimpleTestCase):
+
+    def test_log_directory_is_created_on_first_write(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'logs', 'django.log')
+
+        handler = RotatingFileHandler(path, maxBytes=1024, backupCount=1, delay=True)
+        self.addCleanup(handler.close)
+        # Configuring logging (at import) touches nothing on disk
+        self.assertFalse(os.path.exists(os.path.dirname(path)))
+
+        handler.emit(_record())
+        with open(path) as log:
+            self.assertEqual(log.read(), 'message arg\n')
+
+
+class GunicornConfigTests(SimpleTestCase):
+
+    def load(self, **env):
+        """Evaluate gunicorn.conf.py as gunicorn would, restoring the collector afterwards"""
+        self.addCleanup(gc.enable)
+        with mock.patch.dict(os.environ, env):
+            return runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+
+    def test_preload_defers_collection_to_workers(self):
+        config = self.load(GUNICORN_PRELOAD='True')
+        self.assertTrue(config['preload_app'])
+        self.assertFalse(gc.isenabled())
+
+        server = mock.Mock()
+        with mock.patch('core.warmup.warm_up', return_value={'models': 1}) as warm_up, \
+                mock.patch('core.warmup.freeze', return_value=10) as freeze:
+            config['when_ready'](server)
+        warm_up.assert_called_once_with()
+        freeze.assert_called_once_with()
+        server.log.info.assert_called_once()
+
+        with mock.patch.object(gc, 'freeze') as gc_freeze:
+            config['pre_fork'](server, mock.Mock())
+        gc_freeze.assert_called_once_with()
+
+        config['post_fork'](server, mock.Mock())
+        self.assertTrue(gc.isenabled())
+
+    def test_without_preload_nothing_is_warmed(self):
+        config = self.load(GUNICORN_PRELOAD='False')
+        self.assertTrue(gc.isenabled())
+
+        with mock.patch('core.warmup.warm_up') as warm_up, mock.patch.object(gc, 'freeze') as gc_freeze:
+            config['when_ready'](mock.Mock())
+            config['pre_fork'](mock.Mock(), mock.Mock())
+        warm_up.assert_not_called()
+        gc_freeze.assert_not_called()
+
+    def test_threads_outnumber_password_hash_slots(self):
+        # Admission control only ever rejects when a process has more
+        # request threads than hashing slots
+        config = self.load()
+        self.assertEqual(config['worker_class'], 'gthread')
+        self.assertGreater(config['threads'], settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE)
+
+    def test_dead_workers_are_dropped_from_metrics(self):
+        config = self.load()
+        worker = mock.Mock(pid=4321)
+        with mock.patch('prometheus_client.multiprocess.mark_process_dead') as mark_process_dead:
+            with mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': '/tmp/metrics'}):
+                config['child_exit'](mock.Mock(), worker)
+            mark_process_dead.assert_called_once_with(4321)
+
+            mark_process_dead.reset_mock()
+            with mock.patch.dict(os.environ):
+                os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+                config['child_exit'](mock.Mock(), worker)
+            mark_process_dead.assert_not_called()
+
+
+class WarmupTests(TestCase):
+
+    def test_warm_up(self):
+        with mock.patch.object(warmup.connections, 'close_all') as close_all, \
+                self.assertLogs('core.warmup', 'INFO'):
+            counts = warmup.warm_up()
+        # Connections must not be inherited across fork()
+        close_all.assert_called_once_with()
+        self.assertGreater(counts['url_names'], 0)
+        self.assertGreater(counts['settings'], 0)
+        self.assertGreater(counts['serializers'], 0)
+        self.assertGreater(counts['models'], 0)
+
+    def test_unmigrated_database_is_skipped(self):
+        with mock.patch(
+            'django.contrib.contenttypes.models.ContentType.objects.get_for_models',
+            side_effect=DatabaseError('no such table: django_content_type'),
+        ), self.assertLogs('core.warmup', 'WARNING'):
+            self.assertGreater(warmup.warm_models(), 0)
+
+    def test_freeze(self):
+        self.addCleanup(gc.unfreeze)
+        self.assertGreater(warmup.freeze(), 0)
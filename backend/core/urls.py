@@ -5,6 +5,8 @@ from django.conf.urls.static import static
 from rest_framework import permissions
 from django.http import JsonResponse
 
+from .views import metrics_view
+
 def api_root(request):
     """API root endpoint"""
     return JsonResponse({
@@ -25,6 +27,9 @@ urlpatterns = [
     # API root
     path('api/', api_root, name='api_root'),
     
+    # Prometheus metrics
+    path('metrics', metrics_view, name='metrics'),
+    
     # Authentication endpoints
     path('api/auth/', include('accounts.urls')),
     
@@ -0,0 +1,31 @@
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+from prometheus_client import multiprocess
+
+
+def _registry():
+    """Aggregate every worker's samples when running multi-process"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus text exposition of the project's metrics"""
+    # Closed unless a token is configured; metrics reveal traffic and revenue
+    if not settings.METRICS_TOKEN:
+        return HttpResponseForbidden()
+
+    expected = f'Bearer {settings.METRICS_TOKEN}'
+    if not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), expected):
+        return HttpResponseForbidden()
+
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
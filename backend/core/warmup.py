@@ -0,0 +1,112 @@
+"""
+Pre-fork warm-up for preloading servers (see gunicorn.conf.py).
+
+Everything built here before fork() is shared copy-on-write by the
+workers instead of being rebuilt by each one on its first requests;
+``gc.freeze()`` afterwards keeps the collector from writing to those
+pages and un-sharing them.
+"""
+import gc
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+from django.utils import translation
+from django.utils.module_loading import import_string
+from rest_framework.serializers import BaseSerializer
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+logger = logging.getLogger(__name__)
+
+
+def _serializer_classes():
+    local_apps = {name.split('.')[0] for name in settings.LOCAL_APPS}
+    pending = [BaseSerializer]
+    while pending:
+        cls = pending.pop()
+        pending.extend(cls.__subclasses__())
+        if cls.__module__.split('.')[0] in local_apps:
+            yield cls
+
+
+def warm_resolvers():
+    """Import every view module and build the reverse lookup tables"""
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+    return len(resolver.reverse_dict)
+
+
+def warm_settings():
+    """Import the classes that settings name and requests load on first use"""
+    imported = 0
+    for settings_object in (api_settings, jwt_settings):
+        for name in settings_object.defaults:
+            getattr(settings_object, name)
+            imported += 1
+    for path in (settings.SESSION_ENGINE + '.SessionStore', settings.SESSION_SERIALIZER, settings.MESSAGE_STORAGE):
+        import_string(path)
+        imported += 1
+    return imported
+
+
+def warm_serializers():
+    """Build each serializer's fields, which fills model _meta caches"""
+    warmed = 0
+    for cls in _serializer_classes():
+        try:
+            cls().fields
+        except Exception:
+            # A serializer that needs constructor arguments just stays cold
+            logger.debug('Could not warm %s', cls.__qualname__, exc_info=True)
+            continue
+        warmed += 1
+    return warmed
+
+
+def warm_models():
+    """Populate model field caches and the ContentType cache"""
+    models = apps.get_models()
+    for model in models:
+        model._meta.get_fields()
+        model._meta._property_names
+    try:
+        from django.contrib.contenttypes.models import ContentType
+
+        ContentType.objects.get_for_models(*models)
+    except DatabaseError as e:
+        # Not migrated yet; workers fill the cache on demand
+        logger.warning('Skipped ContentType warm-up: %s', e)
+    return len(models)
+
+
+def warm_up():
+    """
+    Run every warm-up step and close the database connections they opened,
+    since a connection must not be shared across fork()
+    """
+    started = time.perf_counter()
+    translation.activate(settings.LANGUAGE_CODE)
+    try:
+        counts = {
+            'url_names': warm_resolvers(),
+            'settings': warm_settings(),
+            'serializers': warm_serializers(),
+            'models': warm_models(),
+        }
+    finally:
+        translation.deactivate()
+        connections.close_all()
+    counts['seconds'] = round(time.perf_counter() - started, 3)
+    logger.info('Warm-up complete', extra={'warmup': counts})
+    return counts
+
+
+def freeze():
+    """Move everything allocated so far out of the collector's reach"""
+    gc.freeze()
+    return gc.get_freeze_count()
@@ -0,0 +1,152 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    Buffer non-critical writes in memory and flush them in batches from a
+    background thread.
+
+    ``flush_func`` receives a list of queued items and is expected to write
+    them with bulk statements. When WRITE_BEHIND_ENABLED is off (tests,
+    one-off scripts) or the queue is full, items are flushed synchronously
+    so nothing is silently lost.
+
+    With DB_SINGLE_WRITER on, background flushes are handed to ``db_writer``
+    instead of being written from this queue's own thread.
+    """
+
+    def __init__(self, name, flush_func, max_batch=None, flush_interval=None, max_size=None,
+                 single_writer=True):
+        self.name = name
+        self.flush_func = flush_func
+        self.single_writer = single_writer
+        self.max_batch = max_batch or settings.WRITE_BEHIND_MAX_BATCH
+        self.flush_interval = flush_interval or settings.WRITE_BEHIND_FLUSH_INTERVAL
+        self.max_size = max_size or settings.WRITE_BEHIND_MAX_SIZE
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.flush)
+
+    def put(self, item):
+        if not settings.WRITE_BEHIND_ENABLED:
+            self._flush([item])
+            return
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            logger.warning(f"Write-behind queue '{self.name}' full, writing synchronously")
+            self._flush([item])
+        self._report_depth()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def _report_depth(self):
+        metrics.write_behind_queue_depth.labels(self.name).set(self._queue.qsize())
+
+    def flush(self):
+        """Synchronously write everything currently queued."""
+        items = self._drain(self.max_size)
+        if items:
+            self._flush(items)
+
+    def _ensure_started(self):
+        # Threads don't survive fork(), so (re)start lazily in each process
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_size)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run,
+                name=f'write-behind-{self.name}',
+                daemon=True
+            )
+            self._thread.start()
+
+    def _drain(self, limit):
+        items = []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=60)
+            except queue.Empty:
+                continue
+
+            # Give concurrent writers a moment to join the batch
+            deadline = time.monotonic() + self.flush_interval
+            items = [first]
+            while len(items) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._report_depth()
+
+            if self.single_writer and settings.DB_SINGLE_WRITER:
+                db_writer.put((self.flush_func, (items,)))
+                continue
+
+            close_old_connections()
+            self._flush(items)
+
+    def _flush(self, items):
+        try:
+            self.flush_func(items)
+            metrics.write_behind_flushed.labels(self.name).inc(len(items))
+        except Exception:
+            logger.exception(f"Write-behind queue '{self.name}' failed to flush {len(items)} items")
+
+
+def _apply_writes(operations):
+    """
+    Run queued write operations in one transaction; each gets a savepoint
+    so a failing operation doesn't discard the rest of the batch
+    """
+    with transaction.atomic():
+        for func, args in operations:
+            try:
+                with transaction.atomic():
+                    func(*args)
+            except Exception:
+                logger.exception(f"Single writer failed to apply {func.__module__}.{func.__qualname__}")
+
+
+# One thread per process owns all deferred writes, so on SQLite they queue
+# in memory instead of retrying against the database write lock
+db_writer = WriteBehindQueue(
+    'db-writer',
+    _apply_writes,
+    flush_interval=settings.DB_SINGLE_WRITER_INTERVAL,
+    single_writer=False
+)
+
@@ -2,11 +2,12 @@
 
 from django.contrib import admin
 from django.utils.html import format_html
+from core.routers import ReplicaAdminMixin
 from .models import FileUpload
 
 
 @admin.register(FileUpload)
-class FileUploadAdmin(admin.ModelAdmin):
+class FileUploadAdmin(ReplicaAdminMixin, admin.ModelAdmin):
     """Admin interface for file uploads."""
     
     list_display = [
@@ -0,0 +1,95 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import User
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+from files.models import FileUpload
+from files.serializers import FileUploadSerializer
+from files.views import build_transfer_history
+
+
+class Command(BaseCommand):
+    help = 'Benchmark API renderers on transfer history and upload list payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1000,
+            help='Number of uploads in each payload'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Render iterations per renderer and payload'
+        )
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        iterations = options['iterations']
+
+        uploads = self.build_uploads(rows)
+        payloads = {
+            'history': build_transfer_history(uploads),
+            'list': {
+                'count': rows,
+                'next': None,
+                'previous': None,
+                'results': FileUploadSerializer(uploads, many=True).data,
+            },
+        }
+
+        renderers = [('drf-json', JSONRenderer()), ('orjson', ORJSONRenderer())]
+        try:
+            import msgpack  # noqa: F401
+            renderers.append(('msgpack', MessagePackRenderer()))
+        except ImportError:
+            self.stdout.write(self.style.WARNING('msgpack not installed, skipping'))
+
+        self.stdout.write(f'Rendering {rows} rows x {iterations} iterations\n')
+        for payload_name, payload in payloads.items():
+            baseline = None
+            for renderer_name, renderer in renderers:
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    body = renderer.render(payload, renderer.media_type)
+                elapsed_ms = (time.perf_counter() - started) * 1000 / iterations
+                baseline = baseline or elapsed_ms
+                self.stdout.write(
+                    f'{payload_name:<8} {renderer_name:<9} '
+                    f'{elapsed_ms:8.2f} ms/render  {len(body) / 1024:8.1f} KB  '
+                    f'x{baseline / elapsed_ms:.1f}'
+                )
+
+    def build_uploads(self, rows):
+        """Build unsaved uploads shaped like real rows (no database needed)."""
+        user = User(id=1, email='bench@secureshare.dev', username='bench')
+        now = timezone.now()
+        uploads = []
+        for i in range(rows):
+            uploads.append(FileUpload(
+                id=uuid.uuid4(),
+                user=user,
+                batch_id=uuid.uuid4(),
+                upload_session_id=f'1_{int(now.timestamp()) - i}',
+                is_batch_upload=i % 3 == 0,
+                original_filename=f'document_{i}.pdf',
+                file_size=(i + 1) * 123457,
+                mime_type='application/pdf',
+                download_password='abcd1234',
+                download_token=uuid.uuid4(),
+                status='completed',
+                pricing_tier='free',
+                expires_at=now + timedelta(days=7),
+                download_count=i % 17,
+                last_downloaded=now if i % 2 else None,
+                created_at=now - timedelta(minutes=i),
+                updated_at=now - timedelta(minutes=i),
+            ))
+        return uploads
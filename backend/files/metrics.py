@@ -0,0 +1,23 @@
+"""
+Prometheus instruments for the files app.
+"""
+from prometheus_client import Counter, Gauge, Histogram
+
+transfer_bytes = Counter(
+    'secureshare_transfer_bytes',
+    'File bytes uploaded and downloaded by pricing tier',
+    ['direction', 'tier'],
+)
+
+active_transfers = Gauge(
+    'secureshare_active_transfers',
+    'Uploads being stored and downloads being streamed',
+    ['direction'],
+    multiprocess_mode='livesum',
+)
+
+encryption_seconds = Histogram(
+    'secureshare_encryption_seconds',
+    'Time spent encrypting and decrypting file content',
+    ['operation'],
+)
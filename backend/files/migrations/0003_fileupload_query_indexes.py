@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('files', '0002_alter_fileupload_options_fileupload_batch_id_and_more'),
+    ]
+
+    operations = [
+        # Build the new indexes before dropping the ones they replace
+        migrations.AddIndex(
+            model_name='fileupload',
+            index=models.Index(fields=['user', '-created_at', 'batch_position'], name='files_fileu_user_id_fc5a24_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fileupload',
+            index=models.Index(fields=['status', 'expires_at'], name='files_fileu_status_10b294_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fileupload',
+            index=models.Index(fields=['user', 'batch_id'], name='files_fileu_user_id_40aa1d_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='fileupload',
+            name='files_fileu_user_id_0a4249_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='fileupload',
+            name='files_fileu_downloa_37bf1d_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='fileupload',
+            name='files_fileu_expires_714808_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='fileupload',
+            name='files_fileu_batch_i_edbbea_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='fileupload',
+            name='files_fileu_upload__1a1a05_idx',
+        ),
+        migrations.AlterField(
+            model_name='fileupload',
+            name='batch_id',
+            field=models.UUIDField(default=uuid.uuid4),
+        ),
+        migrations.AlterField(
+            model_name='fileupload',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
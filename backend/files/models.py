@@ -18,7 +18,7 @@ def generate_secure_filename(filename):
 def upload_to_secure_path(instance, filename):
     """Generate secure upload path."""
     secure_filename = generate_secure_filename(filename)
-    return f"uploads/{instance.user.id}/{secure_filename}"
+    return f"uploads/{instance.user_id}/{secure_filename}"
 
 class FileUpload(models.Model):
     """Model for file uploads."""
@@ -39,10 +39,11 @@ class FileUpload(models.Model):
     
     # Basic file information
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploads')
+    # Indexed through the composite (user, ...) indexes below
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploads', db_index=False)
     
     # 🆕 NEW: Batch tracking for grouped uploads
-    batch_id = models.UUIDField(default=uuid.uuid4, db_index=True)
+    batch_id = models.UUIDField(default=uuid.uuid4)
     upload_session_id = models.CharField(max_length=64, blank=True, null=True, db_index=True)
     is_batch_upload = models.BooleanField(default=False)
     batch_position = models.IntegerField(default=0)  # Order within batch
@@ -76,12 +77,12 @@ class FileUpload(models.Model):
     
     class Meta:
         ordering = ['-created_at', 'batch_position']  # 🆕 UPDATED: Added batch_position
+        # Shaped after the hot queries (plans are checked in files/tests.py).
+        # download_token and upload_session_id are covered by their field indexes.
         indexes = [
-            models.Index(fields=['user', '-created_at']),
-            models.Index(fields=['download_token']),
-            models.Index(fields=['expires_at']),
-            models.Index(fields=['batch_id']),  # 🆕 NEW INDEX
-            models.Index(fields=['upload_session_id']),  # 🆕 NEW INDEX
+            models.Index(fields=['user', '-created_at', 'batch_position']),  # per-user listing in default order
+            models.Index(fields=['status', 'expires_at']),  # expiry sweeps
+            models.Index(fields=['user', 'batch_id']),  # batch grouping
         ]
     
     def __str__(self):
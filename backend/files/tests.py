@@ -1,3 +1,425 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import uuid
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient, APIRequestFactory
+
+from accounts.models import User
+from core.testing import QueryBudgetMixin, QueryPlanAssertionsMixin
+from . import tracking
+from .models import FileUpload
+from .views import _history_validators, download_file_view
+
+
+def index_name(model, fields):
+    """Name Django generated for the Meta.indexes entry over ``fields``"""
+    for index in model._meta.indexes:
+        if list(index.fields) == fields:
+            return index.name
+    raise LookupError(fields)
+
+
+class FileUploadQueryPlanTests(QueryPlanAssertionsMixin, TestCase):
+    """EXPLAIN the hot FileUpload queries and fail when a plan degrades"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='plans@secureshare.dev',
+            username='plans',
+            password=None
+        )
+        now = timezone.now()
+        FileUpload.objects.bulk_create([
+            FileUpload(
+                user=cls.user,
+                original_filename=f'file_{i}.txt',
+                file_size=1024,
+                mime_type='text/plain',
+                download_password='pass1234',
+                pricing_tier='free',
+                status='completed',
+                expires_at=now + timedelta(days=i % 7),
+                batch_position=i % 3,
+            )
+            for i in range(50)
+        ])
+
+    def test_user_listing_uses_index_order(self):
+        queryset = FileUpload.objects.filter(user=self.user)[:20]
+        self.assertUsesIndex(queryset, index_name(FileUpload, ['user', '-created_at', 'batch_position']))
+        self.assertNoSort(queryset)
+
+    def test_history_validators_use_user_index(self):
+        # The aggregate (max, count, next expiry) the conditional view runs
+        request = RequestFactory().get('/api/files/history/')
+        request.user = self.user
+        self.assertCallUsesIndex(lambda: _history_validators(request), FileUpload)
+
+    def test_download_lookup_uses_token_index(self):
+        queryset = FileUpload.objects.filter(download_token=uuid.uuid4(), status='completed')
+        self.assertUsesIndex(queryset)
+
+    def test_expiry_sweep_uses_status_index(self):
+        queryset = FileUpload.objects.filter(
+            status='completed',
+            expires_at__lte=timezone.now()
+        ).order_by().values_list('id', flat=True)
+        self.assertUsesIndex(queryset, index_name(FileUpload, ['status', 'expires_at']))
+
+    def test_batch_grouping_uses_batch_index(self):
+        queryset = FileUpload.objects.filter(user=self.user, batch_id=uuid.uuid4()).order_by('batch_position')
+        self.assertUsesIndex(queryset, index_name(FileUpload, ['user', 'batch_id']))
+
+
+@override_settings(WRITE_BEHIND_ENABLED=False)
+class FileEndpointQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Per-endpoint query budgets that must hold at every table size"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='budget@secureshare.dev',
+            username='budget',
+            password=None
+        )
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+        self.upload = self.create_uploads(1, status='completed')[0]
+
+    def create_uploads(self, count, **fields):
+        now = timezone.now()
+        return FileUpload.objects.bulk_create([
+            FileUpload(**{
+                'user': self.user,
+                'original_filename': f'file_{i}.txt',
+                'file_size': 1024,
+                'mime_type': 'text/plain',
+                'download_password': 'pass1234',
+                'pricing_tier': 'free',
+                'status': 'completed',
+                'expires_at': now + timedelta(days=7),
+                'batch_id': uuid.UUID(int=i % 10),
+                'batch_position': i,
+                **fields,
+            })
+            for i in range(count)
+        ])
+
+    def test_upload_list(self):
+        self.assertBudgetAtEveryScale(3, self.create_uploads, self.client.get, '/api/files/')
+
+    def test_transfer_history(self):
+        self.assertBudgetAtEveryScale(2, self.create_uploads, self.client.get, '/api/files/history/')
+
+    def test_upload_detail(self):
+        self.assertBudgetAtEveryScale(1, self.create_uploads, self.client.get, f'/api/files/{self.upload.id}/')
+
+    def test_share_link(self):
+        self.assertBudgetAtEveryScale(
+            1, self.create_uploads, self.client.get, f'/api/files/{self.upload.id}/share-link/'
+        )
+
+    def test_download_info(self):
+        client = APIClient(SERVER_NAME='localhost')
+        self.assertBudgetAtEveryScale(
+            2, self.create_uploads, client.get, f'/api/files/download/{self.upload.download_token}/'
+        )
+
+    def test_create_upload(self):
+        self.assertBudgetAtEveryScale(
+            1, self.create_uploads, self.client.post, '/api/files/create/',
+            {'filename': 'report.pdf', 'file_size': 2048}, format='json'
+        )
+
+    def test_bulk_create(self):
+        self.assertBudgetAtEveryScale(
+            1, self.create_uploads, self.client.post, '/api/files/bulk/create/',
+            {'files': [{'filename': 'a.txt', 'file_size': 10}, {'filename': 'b.txt', 'file_size': 20}]},
+            format='json'
+        )
+
+    def use_temporary_media(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def test_complete_upload(self):
+        self.assertBudgetAtEveryScale(
+            2, self.create_uploads, self.client.post, f'/api/files/{self.upload.id}/complete/'
+        )
+
+    def test_upload_content(self):
+        self.use_temporary_media()
+
+        def upload():
+            content = SimpleUploadedFile('report.txt', b'x' * self.upload.file_size)
+            return self.client.post(f'/api/files/{self.upload.id}/upload/', {'file': content})
+
+        self.assertBudgetAtEveryScale(2, self.create_uploads, upload)
+
+    def test_bulk_upload(self):
+        self.use_temporary_media()
+
+        def upload():
+            return self.client.post('/api/files/bulk/upload/', {
+                'upload_id': str(self.upload.id),
+                'file_0': SimpleUploadedFile('a.txt', b'a' * 10),
+                'file_1': SimpleUploadedFile('b.txt', b'b' * 20),
+            })
+
+        self.assertBudgetAtEveryScale(2, self.create_uploads, upload)
+
+    def test_download_file(self):
+        self.use_temporary_media()
+        self.upload.encrypted_file.save(f'{self.upload.id}.enc', ContentFile(b'x' * 1024))
+        client = APIClient(SERVER_NAME='localhost')
+
+        def download():
+            response = client.post(
+                f'/api/files/download/{self.upload.download_token}/file/', {'password': 'pass1234'}, format='json'
+            )
+            response.close()
+            return response
+
+        # The lookup and the counter UPDATE (in a savepoint inside the test transaction)
+        self.assertBudgetAtEveryScale(4, self.create_uploads, download)
+
+
+class ConditionalRequestTests(TestCase):
+    """ETag revalidation of the polled upload endpoints"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='etag@secureshare.dev',
+            username='etag',
+            password=None
+        )
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+        self.upload = FileUpload.objects.create(
+            user=self.user,
+            original_filename='report.txt',
+            file_size=1024,
+            mime_type='text/plain',
+            download_password='pass1234',
+            pricing_tier='free',
+            status='completed',
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+
+    def revalidate(self, path, etag, client=None, **headers):
+        return (client or self.client).get(path, HTTP_IF_NONE_MATCH=etag, **headers)
+
+    def test_unchanged_list_is_not_modified(self):
+        for path in ('/api/files/', '/api/files/history/'):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Accept', response['Vary'])
+
+                revalidated = self.revalidate(path, response['ETag'])
+                self.assertEqual(revalidated.status_code, 304)
+                self.assertEqual(revalidated['ETag'], response['ETag'])
+
+    def test_write_changes_etag(self):
+        etag = self.client.get('/api/files/')['ETag']
+        self.client.patch(f'/api/files/{self.upload.id}/', {'original_filename': 'renamed.txt'}, format='json')
+
+        response = self.revalidate('/api/files/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['results'][0]['original_filename'], 'renamed.txt')
+
+    def test_expiry_changes_etag_without_a_write(self):
+        for path in ('/api/files/', '/api/files/history/'):
+            with self.subTest(path=path):
+                etag = self.client.get(path)['ETag']
+                later = timezone.now() + timedelta(hours=2)
+                with mock.patch('django.utils.timezone.now', return_value=later):
+                    response = self.revalidate(path, etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_expired_download_info_is_not_revalidated(self):
+        path = f'/api/files/download/{self.upload.download_token}/'
+        client = APIClient(SERVER_NAME='localhost')
+        etag = client.get(path)['ETag']
+        later = timezone.now() + timedelta(hours=2)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(self.revalidate(path, etag, client).status_code, 404)
+
+    def test_etag_is_per_user(self):
+        etag = self.client.get('/api/files/')['ETag']
+        other = User.objects.create_user(email='other@secureshare.dev', username='other', password=None)
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(other)
+        self.assertEqual(self.revalidate('/api/files/', etag, client).status_code, 200)
+
+    @skipUnless(settings.MSGPACK_ENABLED, 'msgpack is not installed')
+    def test_etag_is_per_media_type(self):
+        json_etag = self.client.get('/api/files/')['ETag']
+        response = self.revalidate('/api/files/', json_etag, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertNotEqual(response['ETag'], json_etag)
+
+
+class FileAdminQueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email='admin@secureshare.dev',
+            username='admin',
+            password='admin-pass-123',
+            first_name='Admin',
+            last_name='User'
+        )
+        self.client.force_login(self.admin)
+
+    def create_uploads(self, count):
+        owner = User.objects.create_user(
+            email=f'owner{uuid.uuid4().hex[:8]}@secureshare.dev',
+            username=f'owner{uuid.uuid4().hex[:8]}',
+            password=None
+        )
+        FileUpload.objects.bulk_create([
+            FileUpload(
+                user=owner,
+                original_filename=f'file_{i}.txt',
+                file_size=1024,
+                mime_type='text/plain',
+                download_password='pass1234',
+                pricing_tier='free',
+                expires_at=timezone.now() + timedelta(days=7),
+            )
+            for i in range(count)
+        ])
+
+    def test_changelist(self):
+        self.assertBudgetAtEveryScale(
+            5, self.create_uploads, self.client.get, '/admin/files/fileupload/', SERVER_NAME='localhost'
+        )
+
+
+class DownloadCounterTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(email='counter@secureshare.dev', username='counter', password=None)
+        self.upload = FileUpload.objects.create(
+            user=user,
+            original_filename='counted.txt',
+            file_size=1024,
+            mime_type='text/plain',
+            download_password='pass1234',
+            pricing_tier='free',
+            status='completed',
+            expires_at=timezone.now() + timedelta(days=7),
+        )
+
+    @override_settings(DOWNLOAD_COUNT_WRITE_BEHIND=False)
+    def test_counts_immediately_by_default(self):
+        tracking.record_download(self.upload)
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.download_count, 1)
+        self.assertIsNotNone(self.upload.last_downloaded)
+
+    @override_settings(DOWNLOAD_COUNT_WRITE_BEHIND=True, WRITE_BEHIND_ENABLED=True)
+    def test_queued_downloads_flush_as_one_update(self):
+        # Keep the batch queued instead of handing it to the background thread
+        with mock.patch.object(tracking.download_queue, '_ensure_started'):
+            for _ in range(3):
+                tracking.record_download(self.upload)
+            self.upload.refresh_from_db()
+            self.assertEqual(self.upload.download_count, 0)
+
+            with CaptureQueriesContext(connection) as queries:
+                tracking.download_queue.flush()
+
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.download_count, 3)
+
+
+class _SendfileWrapper:
+    """
+    Stand-in for gunicorn's wsgi.file_wrapper: streams straight from the
+    file descriptor when the file exposes one, read() otherwise
+    """
+
+    def __init__(self, filelike, block_size=8192):
+        self.filelike = filelike
+        self.block_size = block_size
+        self.sendfile = False
+
+    def __iter__(self):
+        try:
+            fd = self.filelike.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            while chunk := self.filelike.read(self.block_size):
+                yield chunk
+        else:
+            self.sendfile = True
+            while chunk := os.read(fd, self.block_size):
+                yield chunk
+
+
+class DownloadStreamingTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        user = User.objects.create_user(email='stream@secureshare.dev', username='stream', password=None)
+        self.upload = FileUpload.objects.create(
+            user=user,
+            original_filename='streamed.bin',
+            file_size=20000,
+            mime_type='application/octet-stream',
+            download_password='pass1234',
+            pricing_tier='free',
+            status='completed',
+            expires_at=timezone.now() + timedelta(days=7),
+        )
+        self.upload.encrypted_file.save(f'{self.upload.id}.enc', ContentFile(b'x' * 20000))
+
+    def downloaded_bytes(self):
+        return REGISTRY.get_sample_value(
+            'secureshare_transfer_bytes_total', {'direction': 'download', 'tier': 'free'}
+        ) or 0
+
+    def test_bytes_are_counted_through_file_wrapper(self):
+        before = self.downloaded_bytes()
+        # The test client re-wraps streaming content, so call the view directly
+        request = APIRequestFactory().post(
+            f'/api/files/download/{self.upload.download_token}/file/', {'password': 'pass1234'}, format='json'
+        )
+        response = download_file_view(request, download_token=self.upload.download_token)
+        self.assertEqual(response.status_code, 200)
+
+        # What WSGIHandler hands the server when it offers wsgi.file_wrapper
+        response.file_to_stream.close = response.close
+        stream = _SendfileWrapper(response.file_to_stream, response.block_size)
+        body = b''.join(stream)
+        stream.filelike.close()
+
+        self.assertTrue(stream.sendfile)
+        self.assertEqual(len(body), 20000)
+        self.assertEqual(self.downloaded_bytes() - before, 20000)
@@ -0,0 +1,71 @@
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.writebehind import WriteBehindQueue
+from . import metrics
+from .models import FileUpload
+
+DownloadRecord = namedtuple('DownloadRecord', ['upload_id', 'downloaded_at'])
+
+
+def _write_downloads(records):
+    """Apply queued downloads as one counter UPDATE per upload"""
+    counts = Counter(record.upload_id for record in records)
+    latest = {}
+    for record in records:
+        latest[record.upload_id] = max(record.downloaded_at, latest.get(record.upload_id, record.downloaded_at))
+
+    now = timezone.now()
+    with transaction.atomic():
+        for upload_id, count in counts.items():
+            FileUpload.objects.filter(pk=upload_id).update(
+                download_count=F('download_count') + count,
+                last_downloaded=latest[upload_id],
+                updated_at=now
+            )
+
+
+download_queue = WriteBehindQueue('downloads', _write_downloads)
+
+
+def record_download(upload):
+    """
+    Increment download_count for ``upload`` with an atomic UPDATE. With
+    DOWNLOAD_COUNT_WRITE_BEHIND on, the increment is queued instead and
+    concurrent downloads are coalesced into a single UPDATE.
+    """
+    record = DownloadRecord(upload_id=upload.pk, downloaded_at=timezone.now())
+    if settings.DOWNLOAD_COUNT_WRITE_BEHIND:
+        download_queue.put(record)
+    else:
+        _write_downloads([record])
+
+
+class TrackedDownload:
+    """
+    Wrap a file handed to FileResponse so the download counts as active
+    until it is closed, then add its ``size`` to the pricing tier's bytes.
+    Bytes aren't counted per read(): wsgi.file_wrapper sends straight from
+    fileno() with sendfile() and never calls it.
+    """
+
+    def __init__(self, file, tier, size):
+        self._file = file
+        self._bytes = metrics.transfer_bytes.labels('download', tier)
+        self._size = size
+        self._closed = False
+        metrics.active_transfers.labels('download').inc()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._bytes.inc(self._size)
+            metrics.active_transfers.labels('download').dec()
+        self._file.close()
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
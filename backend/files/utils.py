@@ -5,9 +5,11 @@ import os
 import secrets
 import string
 import mimetypes
-from cryptography.fernet import Fernet
 from django.conf import settings
 
+from core.profiling import phase
+from . import metrics
+
 
 # ============================================================================
 # PASSWORD GENERATION
@@ -43,6 +45,8 @@ def generate_encryption_key():
     Returns:
         bytes: Fernet encryption key
     """
+    from cryptography.fernet import Fernet
+
     return Fernet.generate_key()
 
 
@@ -57,8 +61,11 @@ def encrypt_file_content(content, key):
     Returns:
         bytes: Encrypted content
     """
-    fernet = Fernet(key)
-    return fernet.encrypt(content)
+    from cryptography.fernet import Fernet
+
+    with phase('crypto'), metrics.encryption_seconds.labels('encrypt').time():
+        fernet = Fernet(key)
+        return fernet.encrypt(content)
 
 
 def decrypt_file_content(encrypted_content, key):
@@ -72,8 +79,11 @@ def decrypt_file_content(encrypted_content, key):
     Returns:
         bytes: Decrypted content
     """
-    fernet = Fernet(key)
-    return fernet.decrypt(encrypted_content)
+    from cryptography.fernet import Fernet
+
+    with phase('crypto'), metrics.encryption_seconds.labels('decrypt').time():
+        fernet = Fernet(key)
+        return fernet.decrypt(encrypted_content)
 
 
 # ============================================================================
@@ -4,7 +4,7 @@
 from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.parsers import MultiPartParser, FormParser
 from django.shortcuts import get_object_or_404
 from django.http import FileResponse, Http404
 from django.utils import timezone
@@ -12,10 +12,10 @@ from django.core.files.base import ContentFile
 from collections import defaultdict
 import os
 import uuid
-import zipfile  # 🆕 NEW IMPORT FOR ZIP
-import io  # 🆕 NEW IMPORT FOR ZIP
 
 from .models import FileUpload
+from . import metrics
+from .tracking import TrackedDownload, record_download
 from .serializers import (
     FileUploadSerializer, 
     FileUploadCreateSerializer, 
@@ -24,17 +24,23 @@ from .serializers import (
     FileShareLinkSerializer
 )
 from .utils import generate_secure_password, get_file_mime_type, get_pricing_tier
+from core.conditional import ConditionalListMixin, conditional, make_validators, queryset_validators
+from core.parsers import ORJSONParser
+from core.profiling import phase
+from core.routers import replica_reads
 
 
 # ============================================================================
 # SINGLE FILE OPERATIONS
 # ============================================================================
 
-class FileUploadListView(generics.ListAPIView):
+class FileUploadListView(ConditionalListMixin, generics.ListAPIView):
     """List user's file uploads."""
     
     serializer_class = FileUploadSerializer
     permission_classes = [permissions.IsAuthenticated]
+    validators_prefix = 'uploads'
+    validators_expires_field = 'expires_at'
     
     def get_queryset(self):
         """Return user's uploads."""
@@ -130,11 +136,13 @@ def upload_file_content_view(request, upload_id):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    upload.encrypted_file.save(
-        f"{upload.id}.enc",
-        ContentFile(uploaded_file.read()),
-        save=True
-    )
+    with phase('storage'), metrics.active_transfers.labels('upload').track_inprogress():
+        upload.encrypted_file.save(
+            f"{upload.id}.enc",
+            ContentFile(uploaded_file.read()),
+            save=False  # saved once below together with the status
+        )
+    metrics.transfer_bytes.labels('upload', upload.pricing_tier).inc(uploaded_file.size)
     
     upload.status = 'completed'
     upload.save()
@@ -154,7 +162,7 @@ class BulkFileUploadCreateView(generics.CreateAPIView):
     
     serializer_class = BulkFileUploadSerializer
     permission_classes = [permissions.IsAuthenticated]
-    parser_classes = [JSONParser]
+    parser_classes = [ORJSONParser]
     
     def create(self, request, *args, **kwargs):
         """Create single ZIP archive entry for multiple files."""
@@ -240,35 +248,45 @@ def bulk_upload_content_view(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    metrics.active_transfers.labels('upload').inc()
     try:
         # 🆕 If multiple files, create ZIP archive
         if len(uploaded_files) > 1:
+            # Imported here so workers that never bundle don't load zipfile
+            import io
+            import zipfile
+
             # Create ZIP in memory
             zip_buffer = io.BytesIO()
             
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            with phase('zip'), zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
                 for idx, uploaded_file in enumerate(uploaded_files):
                     # Add each file to ZIP
                     zip_file.writestr(uploaded_file.name, uploaded_file.read())
             
             # Save ZIP file
             zip_buffer.seek(0)
-            upload.encrypted_file.save(
-                f"{upload.id}.zip",
-                ContentFile(zip_buffer.read()),
-                save=True
-            )
+            with phase('storage'):
+                upload.encrypted_file.save(
+                    f"{upload.id}.zip",
+                    ContentFile(zip_buffer.read()),
+                    save=False
+                )
         else:
             # Single file - save directly (no ZIP needed)
             file_ext = uploaded_files[0].name.split('.')[-1] if '.' in uploaded_files[0].name else 'bin'
-            upload.encrypted_file.save(
-                f"{upload.id}.{file_ext}",
-                ContentFile(uploaded_files[0].read()),
-                save=True
-            )
+            with phase('storage'):
+                upload.encrypted_file.save(
+                    f"{upload.id}.{file_ext}",
+                    ContentFile(uploaded_files[0].read()),
+                    save=False
+                )
         
         upload.status = 'completed'
         upload.save()
+        metrics.transfer_bytes.labels('upload', upload.pricing_tier).inc(
+            sum(uploaded_file.size for uploaded_file in uploaded_files)
+        )
         
         return Response({
             'success': True,
@@ -282,21 +300,38 @@ def bulk_upload_content_view(request):
             {'error': f'Failed to create archive: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+    finally:
+        metrics.active_transfers.labels('upload').dec()
 
 
 # ============================================================================
 # TRANSFER MANAGEMENT - WITH BATCH GROUPING
 # ============================================================================
 
+def _history_validators(request):
+    """Validators for the transfer history of the requesting user."""
+    return queryset_validators(
+        request, FileUpload.objects.filter(user=request.user), 'history', expires_field='expires_at'
+    )
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@replica_reads
+@conditional(_history_validators)
 def transfer_history_view(request):
     """Get user's transfer history with batch grouping."""
     
     uploads = FileUpload.objects.filter(user=request.user)
     
-    # Calculate statistics
-    total_uploads = uploads.count()
+    return Response(build_transfer_history(uploads))
+
+
+def build_transfer_history(uploads):
+    """Build the transfer history payload from a user's uploads (newest first)."""
+    
+    # Calculate statistics (evaluates the queryset once; later passes use its cache)
+    total_uploads = len(uploads)
     total_downloads = sum(u.download_count for u in uploads)
     total_storage = sum(u.file_size for u in uploads)
     
@@ -342,7 +377,7 @@ def transfer_history_view(request):
     
     grouped_batches.sort(key=lambda x: x['created_at'], reverse=True)
     
-    return Response({
+    return {
         'statistics': {
             'total_uploads': total_uploads,
             'total_downloads': total_downloads,
@@ -353,7 +388,7 @@ def transfer_history_view(request):
         'all_uploads': FileUploadSerializer(uploads, many=True).data,
         'grouped_batches': grouped_batches,
         'total_batches': len(grouped_batches),
-    })
+    }
 
 
 @api_view(['GET'])
@@ -380,8 +415,23 @@ def get_share_link_view(request, upload_id):
 # DOWNLOAD OPERATIONS (PUBLIC)
 # ============================================================================
 
+def _download_info_validators(request, download_token):
+    """Validators for the public download info of a completed upload."""
+    state = FileUpload.objects.filter(
+        download_token=download_token,
+        status='completed'
+    ).values_list('updated_at', 'expires_at').first()
+    
+    # Missing or expired uploads fall through to the view's 404 handling
+    if state is None or timezone.now() > state[1]:
+        return None
+    
+    return make_validators(request, 'download-info', state[0], download_token)
+
+
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@conditional(_download_info_validators)
 def download_info_view(request, download_token):
     """Get download information without password."""
     
@@ -439,12 +489,11 @@ def download_file_view(request, download_token):
             status=status.HTTP_404_NOT_FOUND
         )
     
-    upload.download_count += 1
-    upload.last_downloaded = timezone.now()
-    upload.save()
+    record_download(upload)
     
+    encrypted_file = upload.encrypted_file.open('rb')
     response = FileResponse(
-        upload.encrypted_file.open('rb'),
+        TrackedDownload(encrypted_file, upload.pricing_tier, encrypted_file.size),
         as_attachment=True,
         filename=upload.original_filename,
         content_type=upload.mime_type
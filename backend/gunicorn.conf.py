@@ -0,0 +1,65 @@
+# backend/gunicorn.conf.py
+# Production server configuration: gunicorn -c gunicorn.conf.py
+#
+# The app is loaded and warmed once in the master, then shared copy-on-write
+# by the forked workers (see core.warmup). Measure the effect with
+# `python manage.py benchmark_preload`.
+
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'core.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+# One process per core, with threads for I/O-bound requests. Each process
+# hashes passwords on PASSWORD_HASH_WORKERS threads and admits at most
+# PASSWORD_HASH_QUEUE_SIZE more; keep that below ``threads`` so a login
+# burst gets 503s instead of tying up every request thread.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))  # large uploads
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')  # off unless set
+errorlog = '-'
+
+# Import Django and the whole URLconf in the master before forking.
+# Code changes then need a full restart rather than a HUP.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+if preload_app:
+    # A collection in the master frees objects all over the heap and the
+    # holes are refilled (and so copied) by each worker; collect in the
+    # workers only
+    gc.disable()
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded, before the first fork
+    if not preload_app:
+        return
+    from core.warmup import freeze, warm_up
+
+    counts = warm_up()
+    server.log.info('Warmed up before fork: %s; %d objects frozen', counts, freeze())
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        # Replacement workers also inherit whatever the master allocated since
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+
+
+def child_exit(server, worker):
+    # Drop the dead worker's live gauges from the multiprocess metrics
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
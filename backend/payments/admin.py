@@ -3,11 +3,12 @@
 
 from django.contrib import admin
 from django.utils.html import format_html
+from core.routers import ReplicaAdminMixin
 from .models import Payment, StripeWebhookEvent
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(ReplicaAdminMixin, admin.ModelAdmin):
     """Admin interface for Payment model."""
     
     list_display = [
@@ -115,10 +116,14 @@ class PaymentAdmin(admin.ModelAdmin):
             ))
         return format_html('<br>'.join(links)) if links else '-'
     stripe_links.short_description = 'Stripe Dashboard Links'
+    
+    def get_queryset(self, request):
+        """Optimize queryset with select_related."""
+        return super().get_queryset(request).select_related('user', 'file_upload')
 
 
 @admin.register(StripeWebhookEvent)
-class StripeWebhookEventAdmin(admin.ModelAdmin):
+class StripeWebhookEventAdmin(ReplicaAdminMixin, admin.ModelAdmin):
     """Admin interface for Stripe webhook events."""
     
     list_display = [
@@ -132,6 +137,7 @@ class StripeWebhookEventAdmin(admin.ModelAdmin):
     list_filter = [
         'event_type',
         'processed',
+        'is_compacted',
         'created_at',
     ]
     
@@ -149,6 +155,7 @@ class StripeWebhookEventAdmin(admin.ModelAdmin):
         'event_data',
         'processed',
         'processed_at',
+        'is_compacted',
         'created_at',
     ]
     
@@ -160,7 +167,7 @@ class StripeWebhookEventAdmin(admin.ModelAdmin):
             'fields': ('processed', 'processed_at', 'error_message')
         }),
         ('Event Data', {
-            'fields': ('event_data',),
+            'fields': ('event_data', 'is_compacted'),
             'classes': ('collapse',)
         }),
         ('Timestamps', {
@@ -192,4 +199,8 @@ class StripeWebhookEventAdmin(admin.ModelAdmin):
                 str(obj.payment.id)[:8]
             )
         return '-'
-    payment_link.short_description = 'Payment'
\ No newline at end of file
+    payment_link.short_description = 'Payment'
+    
+    def get_queryset(self, request):
+        """Optimize queryset with select_related."""
+        return super().get_queryset(request).select_related('payment')
\ No newline at end of file
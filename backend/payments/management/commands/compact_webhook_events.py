@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payments.retention import compact_events, delete_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Archive processed Stripe webhook events to gzipped JSONL, trim their '
+        'stored payloads, and delete compacted events past retention'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.WEBHOOK_COMPACT_AFTER_DAYS,
+            help='Compact processed events older than this many days'
+        )
+        parser.add_argument(
+            '--delete-after-days',
+            type=int,
+            default=settings.WEBHOOK_DELETE_AFTER_DAYS,
+            help='Delete compacted events older than this many days (0 keeps them)'
+        )
+        parser.add_argument(
+            '--archive-dir',
+            default=settings.WEBHOOK_ARCHIVE_DIR,
+            help='Directory for the gzipped JSONL archives'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows per batch'
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+
+        compacted, bytes_before, bytes_after, path = compact_events(
+            now - timedelta(days=options['days']), options['archive_dir'], options['batch_size']
+        )
+        if compacted:
+            self.stdout.write(
+                f'Compacted {compacted} events: payloads {bytes_before / 1024:.1f} KiB -> '
+                f'{bytes_after / 1024:.1f} KiB, archived to {path}'
+            )
+        else:
+            self.stdout.write('No events to compact')
+
+        if options['delete_after_days']:
+            deleted = delete_events(now - timedelta(days=options['delete_after_days']), options['batch_size'])
+            self.stdout.write(f'Deleted {deleted} compacted events')
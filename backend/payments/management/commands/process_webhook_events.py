@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.models import StripeWebhookEvent
+from payments.webhooks import process_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply stored Stripe webhook events that have not been processed yet, '
+        'e.g. ones queued by a worker that restarted before flushing'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Events per transaction (default: STRIPE_WEBHOOK_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Also retry events whose processing failed before'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running, sweeping every this many seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            if options['retry_failed']:
+                retried = StripeWebhookEvent.objects.filter(processed=False).exclude(error_message='').update(
+                    error_message=''
+                )
+                if retried:
+                    self.stdout.write(f'Retrying {retried} failed events')
+
+            total = 0
+            while taken := process_events(batch_size=options['batch_size']):
+                total += taken
+            failed = StripeWebhookEvent.objects.filter(processed=False).exclude(error_message='').count()
+            self.stdout.write(f'Handled {total} events; {failed} failed and are kept for --retry-failed')
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.stub import make_server
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve a Stripe-compatible stub of the Checkout Sessions API for offline '
+        'load tests; run the app with STRIPE_API_BASE=http://<addr>:<port>'
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--addr', default='127.0.0.1', help='Address to bind')
+        parser.add_argument('--port', type=int, default=12111, help='Port to bind')
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0.0,
+            help='Seconds added to every response'
+        )
+        parser.add_argument(
+            '--jitter',
+            type=float,
+            default=0.0,
+            help='Up to this many extra seconds, uniformly random'
+        )
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=0.0,
+            help='Fraction of requests answered with a retryable 500'
+        )
+        parser.add_argument(
+            '--webhook-url',
+            help='Send a signed checkout.session.completed here for every new session'
+        )
+        parser.add_argument(
+            '--webhook-delay',
+            type=float,
+            default=1.0,
+            help='Seconds between creating a session and sending its webhook'
+        )
+
+    def handle(self, *args, **options):
+        if options['webhook_url'] and not settings.STRIPE_WEBHOOK_SECRET:
+            raise CommandError('--webhook-url needs STRIPE_WEBHOOK_SECRET to sign events')
+        server = make_server(
+            options['addr'], options['port'], options['latency'], options['jitter'], options['error_rate'],
+            webhook_url=options['webhook_url'],
+            webhook_secret=settings.STRIPE_WEBHOOK_SECRET,
+            webhook_delay=options['webhook_delay'],
+        )
+        self.stdout.write(
+            f"Stripe stub on http://{options['addr']}:{server.server_port} "
+            f"(latency {options['latency']}s +{options['jitter']}s, error rate {options['error_rate']})"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,28 @@
+"""
+Prometheus instruments for the payments app.
+"""
+from prometheus_client import Counter, Histogram
+
+checkout_sessions = Counter(
+    'secureshare_checkout_sessions',
+    'Checkout session requests by payment tier and outcome',
+    ['tier', 'result'],
+)
+
+stripe_request_seconds = Histogram(
+    'secureshare_stripe_request_seconds',
+    'Latency of Stripe API calls',
+    ['operation'],
+)
+
+stripe_retries = Counter(
+    'secureshare_stripe_retries',
+    'Stripe API calls retried after a connection error, 5xx or 429',
+    ['operation'],
+)
+
+webhook_events = Counter(
+    'secureshare_stripe_webhook_events',
+    'Stripe webhook events by type and stage (received, processed, ignored, failed)',
+    ['type', 'result'],
+)
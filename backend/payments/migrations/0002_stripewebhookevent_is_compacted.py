@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stripewebhookevent',
+            name='is_compacted',
+            field=models.BooleanField(default=False, help_text='event_data was trimmed to the used fields; the full payload is archived'),
+        ),
+        migrations.AddIndex(
+            model_name='stripewebhookevent',
+            index=models.Index(condition=models.Q(('is_compacted', False), ('processed', True)), fields=['-created_at'], name='webhook_event_compact_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stripewebhookevent',
+            index=models.Index(condition=models.Q(('is_compacted', True)), fields=['-created_at'], name='webhook_event_compacted_idx'),
+        ),
+    ]
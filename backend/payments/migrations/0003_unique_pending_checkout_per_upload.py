@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:28
+
+from django.db import migrations, models
+
+
+def cancel_duplicate_pending(apps, schema_editor):
+    """Keep the newest pending payment per upload and price, cancel the rest"""
+    Payment = apps.get_model('payments', 'Payment')
+    seen = set()
+    duplicates = []
+    pending = Payment.objects.filter(status='pending', file_upload__isnull=False).order_by('-created_at')
+    for payment in pending.only('id', 'file_upload_id', 'payment_tier', 'amount').iterator():
+        key = (payment.file_upload_id, payment.payment_tier, payment.amount)
+        if key in seen:
+            duplicates.append(payment.id)
+        seen.add(key)
+    Payment.objects.filter(id__in=duplicates).update(status='canceled')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_stripewebhookevent_is_compacted'),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_pending, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(condition=models.Q(('file_upload__isnull', False), ('status', 'pending')), fields=('file_upload', 'payment_tier', 'amount'), name='unique_pending_checkout_per_upload'),
+        ),
+    ]
@@ -113,6 +113,14 @@ class Payment(models.Model):
             models.Index(fields=['stripe_payment_intent_id']),
             models.Index(fields=['stripe_checkout_session_id']),
         ]
+        constraints = [
+            # One open checkout per upload and price; retries reuse it
+            models.UniqueConstraint(
+                fields=['file_upload', 'payment_tier', 'amount'],
+                name='unique_pending_checkout_per_upload',
+                condition=models.Q(status='pending', file_upload__isnull=False),
+            ),
+        ]
     
     def __str__(self):
         return f"Payment {self.id} - {self.user.email} - ${self.amount_dollars} - {self.status}"
@@ -196,6 +204,12 @@ class StripeWebhookEvent(models.Model):
         help_text="Error message if processing failed"
     )
     
+    # Retention (see payments.retention)
+    is_compacted = models.BooleanField(
+        default=False,
+        help_text="event_data was trimmed to the used fields; the full payload is archived"
+    )
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -205,6 +219,17 @@ class StripeWebhookEvent(models.Model):
             models.Index(fields=['stripe_event_id']),
             models.Index(fields=['event_type', '-created_at']),
             models.Index(fields=['processed', '-created_at']),
+            # Retention batches (payments.retention) walk these by age
+            models.Index(
+                fields=['-created_at'],
+                name='webhook_event_compact_idx',
+                condition=models.Q(processed=True, is_compacted=False),
+            ),
+            models.Index(
+                fields=['-created_at'],
+                name='webhook_event_compacted_idx',
+                condition=models.Q(is_compacted=True),
+            ),
         ]
     
     def __str__(self):
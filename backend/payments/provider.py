@@ -0,0 +1,146 @@
+"""
+Stripe access for the payments app.
+
+The SDK is imported on the first payment call instead of whenever
+payments.views is imported (which is every management command and every
+worker boot). All threads in a process share one pooled HTTP session with
+strict connect/read timeouts, so a slow Stripe holds a worker thread for
+at most STRIPE_CONNECT_TIMEOUT + STRIPE_READ_TIMEOUT per attempt.
+
+Calls go through a circuit breaker (see core.circuitbreaker): while Stripe
+is failing, checkout requests get a fast 503 instead of waiting for it, and
+at most STRIPE_MAX_CONCURRENT threads per process wait on Stripe at once.
+"""
+import os
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from core.circuitbreaker import CircuitBreaker
+
+from . import metrics
+
+_stripe = None
+_breaker = None
+_pid = None
+_lock = threading.Lock()
+
+
+def _http_client(stripe):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.STRIPE_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return stripe.RequestsClient(
+        timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+        session=session,
+    )
+
+
+def _is_outage(exc):
+    """Errors that say Stripe is unreachable or failing, not that our request was bad"""
+    return isinstance(exc, (_stripe.APIConnectionError, _stripe.APIError, _stripe.RateLimitError))
+
+
+def _configure():
+    global _stripe, _breaker, _pid
+    # Pooled connections must not be shared across fork(), so build per process
+    if _pid != os.getpid():
+        with _lock:
+            if _pid != os.getpid():
+                import stripe
+
+                stripe.api_key = settings.STRIPE_SECRET_KEY
+                stripe.api_base = settings.STRIPE_API_BASE
+                # Retried here instead, so the breaker sees every attempt
+                stripe.max_network_retries = 0
+                stripe.default_http_client = _http_client(stripe)
+                _stripe = stripe
+                _breaker = CircuitBreaker(
+                    'stripe',
+                    failure_threshold=settings.STRIPE_BREAKER_FAILURES,
+                    reset_timeout=settings.STRIPE_BREAKER_RESET_SECONDS,
+                    max_concurrent=settings.STRIPE_MAX_CONCURRENT,
+                    is_failure=_is_outage,
+                )
+                _pid = os.getpid()
+
+
+def get_stripe():
+    """Return the configured ``stripe`` module, importing it on first use"""
+    _configure()
+    return _stripe
+
+
+def check_available():
+    """Raise CircuitOpen (a 503) if Stripe calls are currently failing fast"""
+    _configure()
+    _breaker.check()
+
+
+def call(operation, func, *args, **kwargs):
+    """
+    Call a Stripe API function through the circuit breaker, retrying outages
+    up to STRIPE_MAX_NETWORK_RETRIES times with full-jitter backoff. Only
+    use it for calls that are safe to repeat (reads, or writes with an
+    idempotency key).
+    """
+    _configure()
+    attempts = settings.STRIPE_MAX_NETWORK_RETRIES + 1
+    for attempt in range(attempts):
+        try:
+            with _breaker.guard(), metrics.stripe_request_seconds.labels(operation).time():
+                return func(*args, **kwargs)
+        except Exception as exc:
+            if attempt + 1 == attempts or not _is_outage(exc):
+                raise
+        metrics.stripe_retries.labels(operation).inc()
+        cap = min(settings.STRIPE_RETRY_MAX_DELAY, settings.STRIPE_RETRY_BASE_DELAY * 2 ** attempt)
+        time.sleep(random.uniform(0, cap))
+
+
+@receiver(setting_changed)
+def _reconfigure(setting, **kwargs):
+    global _pid
+    if setting.startswith('STRIPE_'):
+        _pid = None
+
+
+def create_checkout_session(payment, **params):
+    """
+    Create a Checkout Session for ``payment``. The idempotency key is derived
+    from the payment, so retries and repeated calls for the same payment
+    return the original session instead of creating another one.
+    """
+    return call(
+        'checkout.session.create',
+        get_stripe().checkout.Session.create,
+        idempotency_key=f'checkout-{payment.id}',
+        **params
+    )
+
+
+def expire_checkout_session(session_id):
+    """
+    Expire an open Checkout Session so it can no longer be paid. Returns the
+    session's final status: 'expired', or 'complete' when it was paid first.
+    """
+    stripe = get_stripe()
+    try:
+        session = call(
+            'checkout.session.expire',
+            stripe.checkout.Session.expire,
+            session_id,
+            idempotency_key=f'expire-{session_id}'
+        )
+    except stripe.InvalidRequestError:
+        # Only open sessions can be expired; report what this one became
+        session = call('checkout.session.retrieve', stripe.checkout.Session.retrieve, session_id)
+    return session.status
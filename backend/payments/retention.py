@@ -0,0 +1,111 @@
+"""
+Retention for StripeWebhookEvent.
+
+Processed events are compacted: the full payload is appended to a gzipped
+JSONL archive and event_data is trimmed to the fields payments.webhooks and
+the admin read. Compacted events past the delete horizon are removed.
+Both walk a partial created_at index in fixed-size batches with a
+created_at cursor, so every row is visited once and each transaction stays
+short.
+"""
+import gzip
+import os
+
+import orjson
+from django.db import transaction
+from django.utils import timezone
+
+from .models import StripeWebhookEvent
+
+# data.object keys still read after an event is processed
+KEPT_OBJECT_FIELDS = (
+    'id', 'object', 'client_reference_id', 'metadata', 'payment_intent', 'payment_status',
+    'status', 'refunded', 'amount', 'amount_total', 'currency',
+)
+
+
+def compact_payload(event_data):
+    """The subset of a Stripe event worth keeping in the database"""
+    obj = (event_data.get('data') or {}).get('object') or {}
+    compacted = {key: event_data[key] for key in ('id', 'type', 'created') if key in event_data}
+    compacted['data'] = {'object': {key: obj[key] for key in KEPT_OBJECT_FIELDS if key in obj}}
+    return compacted
+
+
+def _batches(queryset, batch_size):
+    """Yield lists of rows newest first, keyset-paginated on created_at"""
+    cursor = None
+    while True:
+        page = queryset if cursor is None else queryset.filter(created_at__lte=cursor)
+        rows = list(page.order_by('-created_at')[:batch_size])
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        cursor = rows[-1].created_at
+
+
+def archive_path(archive_dir, now=None):
+    now = now or timezone.now()
+    return os.path.join(archive_dir, f'webhook-events-{now:%Y%m%dT%H%M%S}.jsonl.gz')
+
+
+def compaction_candidates(before):
+    return StripeWebhookEvent.objects.filter(processed=True, is_compacted=False, created_at__lt=before)
+
+
+def deletion_candidates(before):
+    return StripeWebhookEvent.objects.filter(is_compacted=True, created_at__lt=before)
+
+
+def compact_events(before, archive_dir, batch_size=500):
+    """
+    Archive and compact processed events created before ``before``.
+    Returns ``(events, bytes_before, bytes_after, path)``; ``path`` is None
+    when there was nothing to do.
+    """
+    pending = compaction_candidates(before)
+    compacted = bytes_before = bytes_after = 0
+    path = None
+    archive = None
+    try:
+        for rows in _batches(pending.only('id', 'stripe_event_id', 'event_type', 'event_data', 'created_at'), batch_size):
+            if archive is None:
+                os.makedirs(archive_dir, exist_ok=True)
+                path = archive_path(archive_dir)
+                archive = gzip.open(path, 'ab')
+
+            lines = []
+            for row in rows:
+                lines.append(orjson.dumps({
+                    'stripe_event_id': row.stripe_event_id,
+                    'event_type': row.event_type,
+                    'created_at': row.created_at,
+                    'event_data': row.event_data,
+                }))
+                bytes_before += len(orjson.dumps(row.event_data))
+                row.event_data = compact_payload(row.event_data)
+                row.is_compacted = True
+                bytes_after += len(orjson.dumps(row.event_data))
+            # Archived (and flushed) before the rows are trimmed, never after
+            archive.write(b'\n'.join(lines) + b'\n')
+            archive.flush()
+            os.fsync(archive.fileno())
+
+            with transaction.atomic():
+                StripeWebhookEvent.objects.bulk_update(rows, ['event_data', 'is_compacted'], batch_size=batch_size)
+            compacted += len(rows)
+    finally:
+        if archive is not None:
+            archive.close()
+    return compacted, bytes_before, bytes_after, path
+
+
+def delete_events(before, batch_size=500):
+    """Delete compacted events created before ``before``; returns how many"""
+    expired = deletion_candidates(before)
+    deleted = 0
+    for rows in _batches(expired.only('id', 'created_at'), batch_size):
+        deleted += StripeWebhookEvent.objects.filter(pk__in=[row.pk for row in rows]).delete()[0]
+    return deleted
@@ -0,0 +1,236 @@
+"""
+A Stripe-compatible stub of the Checkout Sessions API, for offline load
+tests (``python manage.py stripe_stub``) and the payments tests.
+"""
+import hashlib
+import hmac
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+from urllib.request import Request, urlopen
+
+SESSION_PATH = re.compile(r'^/v1/checkout/sessions/(?P<id>cs_[A-Za-z0-9_]+)(?P<action>/expire)?$')
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """A Stripe-Signature header value for ``payload`` (bytes)"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signed = f'{timestamp}.'.encode() + payload
+    return f't={timestamp},v1={hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()}'
+
+
+def checkout_completed_event(session):
+    """The checkout.session.completed event Stripe sends once ``session`` is paid"""
+    paid = dict(session, status='complete', payment_status='paid', payment_intent=f'pi_test_{uuid.uuid4().hex}')
+    return {
+        'id': f'evt_test_{uuid.uuid4().hex}',
+        'object': 'event',
+        'type': 'checkout.session.completed',
+        'created': int(time.time()),
+        'livemode': False,
+        'data': {'object': paid},
+    }
+
+
+def payment_intent_event(event_type, intent):
+    """A payment_intent.* event of ``event_type`` for ``intent``"""
+    return {
+        'id': f'evt_test_{uuid.uuid4().hex}',
+        'object': 'event',
+        'type': event_type,
+        'created': int(time.time()),
+        'livemode': False,
+        'data': {'object': dict(intent, object='payment_intent')},
+    }
+
+
+def deliver_event(event, url, secret):
+    payload = json.dumps(event).encode()
+    request = Request(url, data=payload, method='POST', headers={
+        'Content-Type': 'application/json',
+        'Stripe-Signature': sign_payload(payload, secret),
+    })
+    with urlopen(request, timeout=10) as response:
+        return response.status
+
+
+class StubState:
+    """Sessions and idempotent responses, shared by the handler threads"""
+
+    def __init__(self, latency, jitter, error_rate, webhook_url=None, webhook_secret=None, webhook_delay=1.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # When set, every new session is "paid" after webhook_delay seconds
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.webhook_delay = webhook_delay
+        self.sessions = {}
+        # payment_intent_data[metadata] per session; Stripe copies it onto the intent
+        self.intent_metadata = {}
+        self.idempotent = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.sessions.clear()
+            self.intent_metadata.clear()
+            self.idempotent.clear()
+            self.calls = 0
+
+
+def _nested(form, prefix):
+    """Collect ``prefix[key]=value`` form fields into a dict"""
+    pattern = re.compile(re.escape(prefix) + r'\[([^\]]+)\]$')
+    return {match.group(1): value for key, value in form.items() if (match := pattern.match(key))}
+
+
+def _checkout_session(form, base_url):
+    session_id = f'cs_test_{uuid.uuid4().hex}'
+    unit_amount = int(form.get('line_items[0][price_data][unit_amount]', 0))
+    quantity = int(form.get('line_items[0][quantity]', 1))
+    return {
+        'id': session_id,
+        'object': 'checkout.session',
+        'amount_total': unit_amount * quantity,
+        'client_reference_id': form.get('client_reference_id'),
+        'currency': form.get('line_items[0][price_data][currency]', 'usd'),
+        'customer_email': form.get('customer_email'),
+        'expires_at': int(time.time()) + 24 * 3600,
+        'livemode': False,
+        'metadata': _nested(form, 'metadata'),
+        'mode': form.get('mode', 'payment'),
+        'payment_intent': None,
+        'payment_status': 'unpaid',
+        'status': 'open',
+        'success_url': form.get('success_url'),
+        'cancel_url': form.get('cancel_url'),
+        'url': f'{base_url}/pay/{session_id}',
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=()):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Request-Id', f'req_{uuid.uuid4().hex[:14]}')
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_error_json(self, status, message, error_type='invalid_request_error'):
+        self.send_json(status, {'error': {'type': error_type, 'message': message}})
+
+    def simulate_network(self):
+        """Apply configured latency; return False when this call should fail"""
+        state = self.state
+        with state.lock:
+            state.calls += 1
+        delay = state.latency + random.uniform(0, state.jitter)
+        if delay:
+            time.sleep(delay)
+        if state.error_rate and random.random() < state.error_rate:
+            self.send_json(
+                500, {'error': {'type': 'api_error', 'message': 'Simulated failure'}},
+                headers=[('Stripe-Should-Retry', 'true')]
+            )
+            return False
+        return True
+
+    def do_GET(self):
+        match = SESSION_PATH.match(self.path)
+        if not match or match.group('action'):
+            return self.send_error_json(404, f'Unrecognized request URL (GET: {self.path})')
+        if not self.simulate_network():
+            return
+        with self.state.lock:
+            session = self.state.sessions.get(match.group('id'))
+        if session is None:
+            return self.send_error_json(404, f"No such checkout.session: '{match.group('id')}'")
+        self.send_json(200, session)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        form = dict(parse_qsl(self.rfile.read(length).decode(), keep_blank_values=True))
+        if not self.simulate_network():
+            return
+
+        key = self.headers.get('Idempotency-Key')
+        if key:
+            with self.state.lock:
+                replay = self.state.idempotent.get((self.path, key))
+            if replay is not None:
+                return self.send_json(replay[0], replay[1], headers=[('Idempotent-Replayed', 'true')])
+
+        status, body = self.route(form)
+        if key and status < 500:
+            with self.state.lock:
+                self.state.idempotent[(self.path, key)] = (status, body)
+        self.send_json(status, body)
+
+    def pay(self, session):
+        try:
+            deliver_event(checkout_completed_event(session), self.state.webhook_url, self.state.webhook_secret)
+        except OSError:
+            pass
+
+    def route(self, form):
+        if self.path == '/v1/checkout/sessions':
+            session = _checkout_session(form, f'http://{self.headers.get("Host", "localhost")}')
+            with self.state.lock:
+                self.state.sessions[session['id']] = session
+                self.state.intent_metadata[session['id']] = _nested(form, 'payment_intent_data[metadata]')
+            if self.state.webhook_url:
+                timer = threading.Timer(self.state.webhook_delay, self.pay, args=[session])
+                timer.daemon = True
+                timer.start()
+            return 200, session
+
+        match = SESSION_PATH.match(self.path)
+        if match and match.group('action') == '/expire':
+            with self.state.lock:
+                session = self.state.sessions.get(match.group('id'))
+                status = session['status'] if session is not None else None
+                if status == 'open':
+                    session['status'] = 'expired'
+            if session is None:
+                return 404, {'error': {'type': 'invalid_request_error', 'message': 'No such checkout.session'}}
+            if status != 'open':
+                return 400, {'error': {
+                    'type': 'invalid_request_error',
+                    'message': f'Only Checkout Sessions with a status of open can be expired (status: {status})',
+                }}
+            return 200, session
+
+        return 404, {'error': {'type': 'invalid_request_error', 'message': f'Unrecognized request URL (POST: {self.path})'}}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-response; that's expected here
+        pass
+
+
+def make_server(addr='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0, **webhooks):
+    """Build (but don't start) a stub server; its StubState is ``server.state``"""
+    state = StubState(latency, jitter, error_rate, **webhooks)
+    server = StubServer((addr, port), type('Handler', (StubHandler,), {'state': state}))
+    server.state = state
+    return server
@@ -1,3 +1,600 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from core.circuitbreaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+from core.testing import QueryBudgetMixin, QueryPlanAssertionsMixin
+from files.models import FileUpload
+from . import provider, retention, webhooks
+from .models import Payment, StripeWebhookEvent
+from .stub import checkout_completed_event, make_server, payment_intent_event, sign_payload
+
+
+class PaymentQueryPlanTests(QueryPlanAssertionsMixin, TestCase):
+    """EXPLAIN the hot Payment queries and fail when a plan degrades"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='plans@secureshare.dev',
+            username='plans',
+            password=None
+        )
+        Payment.objects.bulk_create([
+            Payment(
+                user=cls.user,
+                amount=300,
+                payment_tier='premium',
+                status='succeeded' if i % 2 else 'pending',
+                stripe_checkout_session_id=f'cs_test_{i}',
+            )
+            for i in range(50)
+        ])
+
+    def test_history_uses_index_order(self):
+        queryset = Payment.objects.filter(user=self.user)[:20]
+        self.assertUsesIndex(queryset)
+        self.assertNoSort(queryset)
+
+    def test_checkout_session_lookup_uses_index(self):
+        queryset = Payment.objects.filter(stripe_checkout_session_id='cs_test_1')
+        self.assertUsesIndex(queryset)
+
+    def test_open_checkout_lookup_uses_constraint_index(self):
+        payment = create_payments(self.user, 1)[0]
+        queryset = Payment.objects.filter(
+            file_upload=payment.file_upload_id, payment_tier='premium', amount=300, status='pending'
+        )
+        self.assertUsesIndex(queryset, 'unique_pending_checkout_per_upload')
+
+
+def create_payments(user, count):
+    """Create ``count`` payments for ``user``, each tied to its own upload"""
+    uploads = FileUpload.objects.bulk_create([
+        FileUpload(
+            user=user,
+            original_filename=f'file_{i}.zip',
+            file_size=200 * 1024 * 1024,
+            mime_type='application/zip',
+            download_password='pass1234',
+            pricing_tier='premium',
+            expires_at=timezone.now() + timedelta(days=7),
+        )
+        for i in range(count)
+    ])
+    return Payment.objects.bulk_create([
+        Payment(
+            user=user,
+            file_upload=upload,
+            amount=300,
+            payment_tier='premium',
+            status='succeeded' if i % 2 else 'pending',
+            stripe_checkout_session_id=f'cs_test_{uuid.uuid4().hex}',
+        )
+        for i, upload in enumerate(uploads)
+    ])
+
+
+@override_settings(WRITE_BEHIND_ENABLED=False)
+class PaymentEndpointQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Per-endpoint query budgets that must hold at every table size"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='budget@secureshare.dev',
+            username='budget',
+            password=None
+        )
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+        self.payment = create_payments(self.user, 1)[0]
+
+    def create_payments(self, count):
+        create_payments(self.user, count)
+
+    def test_history(self):
+        self.assertBudgetAtEveryScale(2, self.create_payments, self.client.get, '/api/payments/history/')
+
+    def test_statistics(self):
+        self.assertBudgetAtEveryScale(2, self.create_payments, self.client.get, '/api/payments/statistics/')
+
+    def test_status(self):
+        self.assertBudgetAtEveryScale(
+            1, self.create_payments, self.client.get, f'/api/payments/{self.payment.id}/status/'
+        )
+
+
+class PaymentAdminQueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email='admin@secureshare.dev',
+            username='admin',
+            password='admin-pass-123',
+            first_name='Admin',
+            last_name='User'
+        )
+        self.client.force_login(self.admin)
+
+    def create_payments(self, count):
+        owner = User.objects.create_user(
+            email=f'owner{uuid.uuid4().hex[:8]}@secureshare.dev',
+            username=f'owner{uuid.uuid4().hex[:8]}',
+            password=None
+        )
+        return create_payments(owner, count)
+
+    def create_events(self, count):
+        StripeWebhookEvent.objects.bulk_create([
+            StripeWebhookEvent(
+                stripe_event_id=f'evt_{uuid.uuid4().hex}',
+                event_type='checkout.session.completed',
+                payment=payment,
+                event_data={},
+            )
+            for payment in self.create_payments(count)
+        ])
+
+    def test_payment_changelist(self):
+        self.assertBudgetAtEveryScale(
+            6, self.create_payments, self.client.get, '/admin/payments/payment/', SERVER_NAME='localhost'
+        )
+
+    def test_webhook_event_changelist(self):
+        self.assertBudgetAtEveryScale(
+            6, self.create_events, self.client.get, '/admin/payments/stripewebhookevent/', SERVER_NAME='localhost'
+        )
+
+
+class LazyImportTests(SimpleTestCase):
+    """Booting the URLconf must not pay for the payment and crypto SDKs"""
+
+    def test_boot_does_not_import_heavy_dependencies(self):
+        script = (
+            'import sys, django; django.setup(); '
+            'from django.urls import get_resolver; get_resolver().url_patterns; '
+            'print(",".join(m for m in ("stripe", "cryptography.fernet") if m in sys.modules))'
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='core.settings')
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, env=env, check=True)
+        self.assertEqual(result.stdout.strip(), '')
+
+
+class StripeStubTestCase(TestCase):
+    """Runs a stub Stripe API for the class and points the client at it"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = make_server()
+        threading.Thread(target=cls.stub.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.stub.server_close)
+        cls.addClassCleanup(cls.stub.shutdown)
+
+    def setUp(self):
+        self.stub.state.latency = 0.0
+        self.stub.state.error_rate = 0.0
+        self.stub.state.reset()
+        stripe_settings = override_settings(
+            STRIPE_SECRET_KEY='sk_test_stub',
+            STRIPE_API_BASE=f'http://127.0.0.1:{self.stub.server_port}',
+        )
+        stripe_settings.enable()
+        self.addCleanup(stripe_settings.disable)
+
+
+@override_settings(WRITE_BEHIND_ENABLED=False)
+class CheckoutSessionTests(QueryBudgetMixin, StripeStubTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            email='checkout@secureshare.dev',
+            username='checkout',
+            password=None
+        )
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def test_checkout_stores_session(self):
+        response = self.client.post('/api/payments/create-checkout/', {'amount': 300}, format='json')
+        self.assertEqual(response.status_code, 201)
+        payment = Payment.objects.get(id=response.data['payment_id'])
+        self.assertEqual(payment.stripe_checkout_session_id, response.data['checkout_session_id'])
+        self.assertEqual(self.stub.state.sessions[payment.stripe_checkout_session_id]['amount_total'], 300)
+        self.assertEqual(
+            self.stub.state.intent_metadata[payment.stripe_checkout_session_id], {'payment_id': str(payment.id)}
+        )
+
+    def test_checkout_query_budget(self):
+        # Insert the pending payment, then store the session on it
+        self.assertBudgetAtEveryScale(
+            4, lambda count: create_payments(self.user, count),
+            self.client.post, '/api/payments/create-checkout/', {'amount': 300}, format='json'
+        )
+
+    def test_retried_create_returns_same_session(self):
+        payment = create_payments(self.user, 1)[0]
+        params = {'mode': 'payment', 'success_url': 'https://example.com/ok', 'cancel_url': 'https://example.com/no'}
+        first = provider.create_checkout_session(payment, **params)
+        second = provider.create_checkout_session(payment, **params)
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(len(self.stub.state.sessions), 1)
+
+    @override_settings(STRIPE_READ_TIMEOUT=0.2, STRIPE_MAX_NETWORK_RETRIES=0)
+    def test_slow_provider_times_out(self):
+        self.stub.state.latency = 1.0
+        started = time.perf_counter()
+        response = self.client.post('/api/payments/create-checkout/', {'amount': 300}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertLess(time.perf_counter() - started, 0.8)
+
+    @override_settings(STRIPE_BREAKER_FAILURES=2, STRIPE_MAX_NETWORK_RETRIES=0)
+    def test_open_circuit_fails_fast(self):
+        self.stub.state.error_rate = 1.0
+        for _ in range(2):
+            response = self.client.post('/api/payments/create-checkout/', {'amount': 300}, format='json')
+            self.assertEqual(response.status_code, 400)
+        payments = Payment.objects.count()
+
+        response = self.client.post('/api/payments/create-checkout/', {'amount': 300}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(self.stub.state.calls, 2)
+        self.assertEqual(Payment.objects.count(), payments)
+
+    @override_settings(STRIPE_MAX_NETWORK_RETRIES=2, STRIPE_RETRY_BASE_DELAY=0.01)
+    def test_outages_are_retried(self):
+        self.stub.state.error_rate = 1.0
+        response = self.client.post('/api/payments/create-checkout/', {'amount': 300}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stub.state.calls, 3)
+
+    def create_upload(self):
+        return FileUpload.objects.create(
+            user=self.user,
+            original_filename='large.zip',
+            file_size=200 * 1024 * 1024,
+            mime_type='application/zip',
+            download_password='pass1234',
+            pricing_tier='premium',
+            expires_at=timezone.now() + timedelta(days=7),
+        )
+
+    def test_repeated_checkout_reuses_open_session(self):
+        data = {'amount': 300, 'upload_id': str(self.create_upload().id)}
+        first = self.client.post('/api/payments/create-checkout/', data, format='json')
+        self.assertEqual(first.status_code, 201)
+
+        with self.assertNumQueries(2):  # the upload and the pending payment
+            second = self.client.post('/api/payments/create-checkout/', data, format='json')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(self.stub.state.calls, 1)
+        self.assertEqual(Payment.objects.count(), 1)
+
+        other_price = self.client.post(
+            '/api/payments/create-checkout/', dict(data, amount=800, payment_tier='large'), format='json'
+        )
+        self.assertEqual(other_price.status_code, 201)
+        self.assertNotEqual(other_price.data['checkout_session_id'], first.data['checkout_session_id'])
+
+    def test_expiring_session_is_replaced(self):
+        data = {'amount': 300, 'upload_id': str(self.create_upload().id)}
+        first = self.client.post('/api/payments/create-checkout/', data, format='json')
+        payment = Payment.objects.get(id=first.data['payment_id'])
+        payment.metadata['checkout_expires_at'] = int(time.time()) + 60
+        payment.save()
+
+        second = self.client.post('/api/payments/create-checkout/', data, format='json')
+        self.assertEqual(second.status_code, 201)
+        self.assertNotEqual(second.data['payment_id'], first.data['payment_id'])
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'canceled')
+        # The old session can no longer be paid
+        self.assertEqual(self.stub.state.sessions[first.data['checkout_session_id']]['status'], 'expired')
+
+    def test_session_paid_before_replacement_is_kept(self):
+        data = {'amount': 300, 'upload_id': str(self.create_upload().id)}
+        first = self.client.post('/api/payments/create-checkout/', data, format='json')
+        payment = Payment.objects.get(id=first.data['payment_id'])
+        payment.metadata['checkout_expires_at'] = int(time.time()) + 60
+        payment.save()
+        self.stub.state.sessions[payment.stripe_checkout_session_id]['status'] = 'complete'
+
+        second = self.client.post('/api/payments/create-checkout/', data, format='json')
+        self.assertEqual(second.status_code, 409)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'pending')
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(len(self.stub.state.sessions), 1)
+
+    def test_concurrent_create_returns_first_session(self):
+        data = {'amount': 300, 'upload_id': str(self.create_upload().id)}
+        first = self.client.post('/api/payments/create-checkout/', data, format='json')
+
+        # The second request's lookup ran before the first committed
+        with mock.patch('payments.views._open_checkout', side_effect=[None, Payment.objects.get()]):
+            second = self.client.post(
+                '/api/payments/create-checkout/', dict(data, success_url='https://other.example.com/ok'), format='json'
+            )
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(self.stub.state.calls, 1)
+
+    def test_pending_payment_is_completed_with_its_own_urls(self):
+        data = {'amount': 300, 'upload_id': str(self.create_upload().id), 'success_url': 'https://first.example.com/ok'}
+        self.stub.state.error_rate = 1.0
+        with override_settings(STRIPE_MAX_NETWORK_RETRIES=0):
+            self.client.post('/api/payments/create-checkout/', data, format='json')
+        self.stub.state.error_rate = 0.0
+
+        # Another tab completes the payment the first one left without a session
+        response = self.client.post(
+            '/api/payments/create-checkout/', dict(data, success_url='https://second.example.com/ok'), format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        session = self.stub.state.sessions[response.data['checkout_session_id']]
+        self.assertTrue(session['success_url'].startswith('https://first.example.com/ok'))
+
+    def test_failed_checkout_is_completed_by_retry(self):
+        data = {'amount': 300, 'upload_id': str(self.create_upload().id)}
+        self.stub.state.error_rate = 1.0
+        with override_settings(STRIPE_MAX_NETWORK_RETRIES=0):
+            self.assertEqual(self.client.post('/api/payments/create-checkout/', data, format='json').status_code, 400)
+        self.stub.state.error_rate = 0.0
+
+        response = self.client.post('/api/payments/create-checkout/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        payment = Payment.objects.get()
+        self.assertEqual(str(payment.id), response.data['payment_id'])
+        self.assertEqual(payment.stripe_checkout_session_id, response.data['checkout_session_id'])
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def trip(self, breaker, exc=ConnectionError):
+        with self.assertRaises(exc):
+            with breaker.guard():
+                raise exc('down')
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=60)
+        for _ in range(2):
+            self.trip(breaker)
+        breaker.call(lambda: None)  # a success resets the count
+        for _ in range(3):
+            self.trip(breaker)
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitOpen) as raised:
+            breaker.call(lambda: None)
+        self.assertGreater(raised.exception.wait, 1)
+
+    def test_half_open_admits_one_probe(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.05)
+        self.trip(breaker)
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, HALF_OPEN)
+
+        with breaker.guard():
+            with self.assertRaises(CircuitOpen):
+                breaker.call(lambda: None)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.05)
+        self.trip(breaker)
+        time.sleep(0.06)
+        self.trip(breaker)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_client_errors_do_not_count(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, is_failure=lambda exc: isinstance(exc, ConnectionError))
+        self.trip(breaker, ValueError)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_concurrency_cap(self):
+        breaker = CircuitBreaker('test', max_concurrent=1)
+        with breaker.guard():
+            with self.assertRaises(CircuitOpen):
+                breaker.call(lambda: None)
+        breaker.call(lambda: None)
+
+
+@override_settings(WRITE_BEHIND_ENABLED=False, STRIPE_WEBHOOK_SECRET='whsec_test')
+class StripeWebhookTests(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='webhooks@secureshare.dev',
+            username='webhooks',
+            password=None
+        )
+        self.client = APIClient(SERVER_NAME='localhost')
+
+    def completed_event(self, payment):
+        return checkout_completed_event({
+            'id': payment.stripe_checkout_session_id,
+            'client_reference_id': str(payment.id),
+            'metadata': {'payment_id': str(payment.id)},
+        })
+
+    def post_event(self, event, secret='whsec_test'):
+        payload = json.dumps(event).encode()
+        return self.client.generic(
+            'POST', '/api/payments/webhook/', payload,
+            content_type='application/json', HTTP_STRIPE_SIGNATURE=sign_payload(payload, secret)
+        )
+
+    def test_completed_checkout_unlocks_upload(self):
+        payment = create_payments(self.user, 1)[0]
+        response = self.post_event(self.completed_event(payment))
+        self.assertEqual(response.status_code, 200)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'succeeded')
+        self.assertTrue(payment.stripe_payment_intent_id.startswith('pi_test_'))
+        self.assertEqual(FileUpload.objects.get(pk=payment.file_upload_id).status, 'processing')
+        self.assertTrue(StripeWebhookEvent.objects.get(payment=payment).processed)
+
+    def test_webhook_query_budget(self):
+        payments = iter(create_payments(self.user, len(self.ROW_COUNTS)))
+
+        def deliver():
+            return self.post_event(self.completed_event(next(payments)))
+
+        # Storing the event plus the batch it is applied in (inline here)
+        self.assertBudgetAtEveryScale(11, lambda count: create_payments(self.user, count), deliver)
+
+    def test_redelivery_is_ignored(self):
+        payment = create_payments(self.user, 1)[0]
+        event = self.completed_event(payment)
+        self.post_event(event)
+        processed_at = StripeWebhookEvent.objects.get().processed_at
+        self.assertEqual(self.post_event(event).status_code, 200)
+        self.assertEqual(StripeWebhookEvent.objects.get().processed_at, processed_at)
+
+    def test_bad_signature_is_rejected(self):
+        payment = create_payments(self.user, 1)[0]
+        response = self.post_event(self.completed_event(payment), secret='whsec_other')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StripeWebhookEvent.objects.exists())
+
+    def test_unmatched_event_is_kept_for_retry(self):
+        payment = create_payments(self.user, 1)[0]
+        event = self.completed_event(payment)
+        event['data']['object'].update(id='cs_test_unknown', client_reference_id=None, metadata={})
+        self.post_event(event)
+        stored = StripeWebhookEvent.objects.get()
+        self.assertFalse(stored.processed)
+        self.assertEqual(stored.error_message, 'No matching payment')
+
+    def test_intent_before_completed_checkout_matches_by_metadata(self):
+        payment = create_payments(self.user, 1)[0]
+        completed = self.completed_event(payment)
+        intent_id = completed['data']['object']['payment_intent']
+        self.post_event(payment_intent_event(
+            'payment_intent.succeeded', {'id': intent_id, 'metadata': {'payment_id': str(payment.id)}}
+        ))
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'succeeded')
+        self.assertEqual(payment.stripe_payment_intent_id, intent_id)
+        self.assertEqual(FileUpload.objects.get(pk=payment.file_upload_id).status, 'processing')
+
+        self.post_event(completed)
+        self.assertFalse(StripeWebhookEvent.objects.filter(processed=False).exists())
+        self.assertEqual(StripeWebhookEvent.objects.filter(payment=payment).count(), 2)
+
+    def test_refund_after_completion_in_one_batch(self):
+        payment = create_payments(self.user, 1)[0]
+        completed = self.completed_event(payment)
+        refunded = {
+            'id': f'evt_test_{uuid.uuid4().hex}',
+            'type': 'charge.refunded',
+            'data': {'object': {'payment_intent': completed['data']['object']['payment_intent'], 'refunded': True}},
+        }
+        StripeWebhookEvent.objects.bulk_create([
+            StripeWebhookEvent(stripe_event_id=event['id'], event_type=event['type'], event_data=event)
+            for event in (completed, refunded)
+        ])
+        StripeWebhookEvent.objects.filter(stripe_event_id=refunded['id']).update(
+            created_at=timezone.now() + timedelta(seconds=1)
+        )
+        webhooks.process_events()
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'refunded')
+        self.assertFalse(StripeWebhookEvent.objects.filter(processed=False).exists())
+
+    @override_settings(STRIPE_WEBHOOK_BATCH_SIZE=100)
+    def test_batch_query_budget(self):
+        # A batch is applied with the same handful of statements however many events are waiting
+        for rows in self.ROW_COUNTS:
+            with self.subTest(rows=rows):
+                StripeWebhookEvent.objects.bulk_create([
+                    StripeWebhookEvent(stripe_event_id=event['id'], event_type=event['type'], event_data=event)
+                    for event in map(self.completed_event, create_payments(self.user, rows))
+                ])
+                taken = self.assertQueryBudget(7, webhooks.process_events)
+                self.assertEqual(taken, min(rows, 100))
+
+
+class WebhookRetentionTests(QueryPlanAssertionsMixin, TestCase):
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.archive_dir = archive_dir.name
+        self.now = timezone.now()
+
+    def create_events(self, count, days_old, processed=True):
+        events = StripeWebhookEvent.objects.bulk_create([
+            StripeWebhookEvent(
+                stripe_event_id=f'evt_{uuid.uuid4().hex}',
+                event_type='checkout.session.completed',
+                event_data={
+                    'id': f'evt_{i}',
+                    'type': 'checkout.session.completed',
+                    'data': {'object': {'id': f'cs_test_{i}', 'payment_status': 'paid', 'line_items': ['x'] * 50}},
+                    'request': {'id': 'req_1'},
+                },
+                processed=processed,
+            )
+            for i in range(count)
+        ])
+        StripeWebhookEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+            created_at=self.now - timedelta(days=days_old)
+        )
+        return events
+
+    def test_compaction_archives_then_trims(self):
+        self.create_events(7, days_old=40)
+        recent = self.create_events(2, days_old=5)
+        unprocessed = self.create_events(1, days_old=40, processed=False)
+
+        compacted, before, after, path = retention.compact_events(
+            self.now - timedelta(days=30), self.archive_dir, batch_size=3
+        )
+        self.assertEqual(compacted, 7)
+        self.assertLess(after, before)
+
+        with gzip.open(path) as archive:
+            archived = [json.loads(line) for line in archive]
+        self.assertEqual(len(archived), 7)
+        self.assertEqual(len(archived[0]['event_data']['data']['object']['line_items']), 50)
+
+        trimmed = StripeWebhookEvent.objects.filter(is_compacted=True)
+        self.assertEqual(trimmed.count(), 7)
+        kept = trimmed[0].event_data
+        self.assertEqual(set(kept['data']['object']), {'id', 'payment_status'})
+        self.assertNotIn('request', kept)
+        for event in recent + unprocessed:
+            event.refresh_from_db()
+            self.assertFalse(event.is_compacted)
+
+    def test_delete_only_compacted_events(self):
+        self.create_events(5, days_old=400)
+        retention.compact_events(self.now - timedelta(days=30), self.archive_dir)
+        self.create_events(2, days_old=400, processed=False)
+
+        self.assertEqual(retention.delete_events(self.now - timedelta(days=365), batch_size=2), 5)
+        self.assertEqual(StripeWebhookEvent.objects.count(), 2)
+
+    def test_batches_walk_the_processed_index(self):
+        self.create_events(50, days_old=40)
+        for candidates in (retention.compaction_candidates, retention.deletion_candidates):
+            queryset = candidates(self.now).filter(created_at__lte=self.now).order_by('-created_at')[:500]
+            self.assertUsesIndex(queryset)
+            self.assertNoSort(queryset)
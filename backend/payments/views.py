@@ -6,25 +6,57 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-import stripe
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q, Sum
 import logging
+import time
 
+from . import metrics, provider, webhooks
 from .models import Payment, StripeWebhookEvent
 from .serializers import PaymentSerializer, CreateCheckoutSessionSerializer
 from files.models import FileUpload
+from core.conditional import conditional, queryset_validators
+from core.exceptions import ServiceBusy
+from core.routers import ReplicaReadMixin, replica_reads
 
 logger = logging.getLogger(__name__)
 
-# Initialize Stripe
-stripe.api_key = settings.STRIPE_SECRET_KEY
+
+def _open_checkout(file_upload, payment_tier, amount):
+    """The pending payment for this upload and price (at most one, see Payment.Meta)"""
+    return Payment.objects.filter(
+        file_upload=file_upload, payment_tier=payment_tier, amount=amount, status='pending'
+    ).first()
+
+
+def _is_reusable(payment):
+    """Whether the payment's checkout session is open long enough to hand out again"""
+    expires_at = payment.metadata.get('checkout_expires_at') or 0
+    return bool(payment.metadata.get('checkout_url')) and (
+        expires_at - time.time() > settings.STRIPE_CHECKOUT_REUSE_MARGIN
+    )
+
+
+def _checkout_response(payment, status_code):
+    return Response({
+        'checkout_session_id': payment.stripe_checkout_session_id,
+        'checkout_url': payment.metadata['checkout_url'],
+        'payment_id': str(payment.id),
+        'amount': payment.amount,
+        'currency': payment.currency,
+    }, status=status_code)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def create_checkout_session(request):
-    """Create a Stripe Checkout Session for file upload payment."""
+    """
+    Create a Stripe Checkout Session for file upload payment.
+    Repeated requests for the same upload and price return the open session.
+    """
     serializer = CreateCheckoutSessionSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
     
@@ -39,23 +71,67 @@ def create_checkout_session(request):
         file_upload = get_object_or_404(FileUpload, id=upload_id, user=request.user)
     
     try:
-        payment = Payment.objects.create(
-            user=request.user,
-            file_upload=file_upload,
-            amount=amount,
-            currency='usd',
-            payment_tier=payment_tier,
-            status='pending',
-            description=f"File upload payment - {payment_tier}",
-            metadata={
-                'user_id': str(request.user.id),
-                'user_email': request.user.email,
-                'upload_id': str(upload_id) if upload_id else None,
-                'payment_tier': payment_tier,
-            }
-        )
+        payment = None
+        if file_upload is not None:
+            # Double-clicks and retries: one local lookup, no Stripe call
+            payment = _open_checkout(file_upload, payment_tier, amount)
+            if payment is not None and payment.metadata.get('checkout_url'):
+                if _is_reusable(payment):
+                    metrics.checkout_sessions.labels(payment_tier, 'reused').inc()
+                    return _checkout_response(payment, status.HTTP_200_OK)
+                # About to expire: close it at Stripe first, so it can't be
+                # paid as well as the session that replaces it
+                if provider.expire_checkout_session(payment.stripe_checkout_session_id) == 'complete':
+                    # Paid at the last moment; the webhook marks it succeeded
+                    metrics.checkout_sessions.labels(payment_tier, 'paid').inc()
+                    return Response(
+                        {'error': 'This upload has already been paid for.'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                Payment.objects.filter(pk=payment.pk, status='pending').update(status='canceled')
+                payment = None
+        
+        # Fail fast with 503 before recording a payment Stripe can't take now
+        provider.check_available()
         
-        checkout_session = stripe.checkout.Session.create(
+        if payment is None:
+            try:
+                with transaction.atomic():
+                    payment = Payment.objects.create(
+                        user=request.user,
+                        file_upload=file_upload,
+                        amount=amount,
+                        currency='usd',
+                        payment_tier=payment_tier,
+                        status='pending',
+                        description=f"File upload payment - {payment_tier}",
+                        metadata={
+                            'user_id': str(request.user.id),
+                            'user_email': request.user.email,
+                            'upload_id': str(upload_id) if upload_id else None,
+                            'payment_tier': payment_tier,
+                            'success_url': success_url,
+                            'cancel_url': cancel_url,
+                        }
+                    )
+            except IntegrityError:
+                # A concurrent request created the pending payment first:
+                # hand out its session, or complete it below
+                payment = _open_checkout(file_upload, payment_tier, amount)
+                if payment is None:
+                    raise
+                if _is_reusable(payment):
+                    metrics.checkout_sessions.labels(payment_tier, 'reused').inc()
+                    return _checkout_response(payment, status.HTTP_200_OK)
+        
+        # A pending payment without a session (an earlier attempt failed or is
+        # still in flight) is completed here rather than orphaned. The
+        # idempotency key only returns the same session for the same
+        # parameters, so use the URLs the payment was created with.
+        success_url = payment.metadata.get('success_url', success_url)
+        cancel_url = payment.metadata.get('cancel_url', cancel_url)
+        checkout_session = provider.create_checkout_session(
+            payment,
             payment_method_types=['card'],
             line_items=[{
                 'price_data': {
@@ -77,32 +153,42 @@ def create_checkout_session(request):
                 'payment_id': str(payment.id),
                 'user_id': str(request.user.id),
                 'upload_id': str(upload_id) if upload_id else '',
-            }
+            },
+            # Lets payment_intent events find the payment before the session completes
+            payment_intent_data={'metadata': {'payment_id': str(payment.id)}},
         )
         
         payment.stripe_checkout_session_id = checkout_session.id
+        payment.metadata['checkout_url'] = checkout_session.url
+        payment.metadata['checkout_expires_at'] = checkout_session.expires_at
         payment.save()
         
         logger.info(f"Created checkout session: {checkout_session.id}")
+        metrics.checkout_sessions.labels(payment_tier, 'created').inc()
         
-        return Response({
-            'checkout_session_id': checkout_session.id,
-            'checkout_url': checkout_session.url,
-            'payment_id': str(payment.id),
-            'amount': amount,
-            'currency': 'usd',
-        }, status=status.HTTP_201_CREATED)
+        return _checkout_response(payment, status.HTTP_201_CREATED)
         
+    except ServiceBusy:
+        metrics.checkout_sessions.labels(payment_tier, 'unavailable').inc()
+        raise
     except Exception as e:
         logger.error(f"Error: {str(e)}")
+        metrics.checkout_sessions.labels(payment_tier, 'error').inc()
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 @csrf_exempt
-@api_view(['POST'])
-@permission_classes([permissions.AllowAny])
+@require_POST
 def stripe_webhook(request):
-    """Handle Stripe webhook events."""
+    """
+    Handle Stripe webhook events. A plain Django view: the event is verified,
+    stored and acknowledged, and applied later by payments.webhooks.
+    """
+    try:
+        webhooks.ingest(request.body, request.META.get('HTTP_STRIPE_SIGNATURE'))
+    except webhooks.InvalidWebhook as e:
+        logger.warning(f"Rejected webhook: {e}")
+        return HttpResponse(status=400)
     return HttpResponse(status=200)
 
 
@@ -110,28 +196,45 @@ def stripe_webhook(request):
 @permission_classes([permissions.IsAuthenticated])
 def payment_status(request, payment_id):
     """Get payment status."""
-    payment = get_object_or_404(Payment, id=payment_id, user=request.user)
+    payment = get_object_or_404(
+        Payment.objects.select_related('user', 'file_upload'),
+        id=payment_id,
+        user=request.user
+    )
     serializer = PaymentSerializer(payment)
     return Response(serializer.data)
 
 
-class PaymentHistoryView(generics.ListAPIView):
+class PaymentHistoryView(ReplicaReadMixin, generics.ListAPIView):
     """List user's payment history."""
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Payment.objects.filter(user=self.request.user)
+        # The serializer reads user.email and file_upload.original_filename per row
+        return Payment.objects.filter(user=self.request.user).select_related('user', 'file_upload')
+
+
+def _statistics_validators(request):
+    """Validators for the payment statistics of the requesting user."""
+    return queryset_validators(request, Payment.objects.filter(user=request.user), 'payment-statistics')
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@replica_reads
+@conditional(_statistics_validators)
 def payment_statistics(request):
     """Get user's payment statistics."""
-    payments = Payment.objects.filter(user=request.user)
-    total_payments = payments.count()
-    successful_payments = payments.filter(status='succeeded').count()
-    total_spent = sum(p.amount for p in payments.filter(status='succeeded'))
+    succeeded = Q(status='succeeded')
+    totals = Payment.objects.filter(user=request.user).aggregate(
+        total_payments=Count('id'),
+        successful_payments=Count('id', filter=succeeded),
+        total_spent=Sum('amount', filter=succeeded),
+    )
+    total_payments = totals['total_payments']
+    successful_payments = totals['successful_payments']
+    total_spent = totals['total_spent'] or 0
     
     return Response({
         'total_payments': total_payments,
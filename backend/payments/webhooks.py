@@ -0,0 +1,241 @@
+"""
+Stripe webhook ingestion.
+
+The view only verifies the signature and records the event: one
+``INSERT ... ON CONFLICT DO NOTHING`` keyed on the unique stripe_event_id,
+so redelivered events cost nothing and are never processed twice. The
+event ID is then queued and a background thread applies the queued events
+in batches. Events are durable once inserted: anything the queue loses
+(a worker restart, a failed batch) is picked up by
+``python manage.py process_webhook_events``.
+"""
+import logging
+import uuid
+
+import orjson
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.writebehind import WriteBehindQueue
+from files.models import FileUpload
+from . import metrics
+from .models import Payment, StripeWebhookEvent
+from .provider import get_stripe
+
+logger = logging.getLogger(__name__)
+
+SESSION_SUCCEEDED = {'checkout.session.completed', 'checkout.session.async_payment_succeeded'}
+SESSION_FAILED = {'checkout.session.async_payment_failed'}
+SESSION_EXPIRED = {'checkout.session.expired'}
+INTENT_SUCCEEDED = {'payment_intent.succeeded'}
+INTENT_FAILED = {'payment_intent.payment_failed'}
+CHARGE_REFUNDED = {'charge.refunded'}
+
+HANDLED_TYPES = SESSION_SUCCEEDED | SESSION_FAILED | SESSION_EXPIRED | INTENT_SUCCEEDED | INTENT_FAILED | CHARGE_REFUNDED
+
+
+class InvalidWebhook(Exception):
+    """The request is not a correctly signed Stripe event"""
+
+
+def ingest(payload, signature):
+    """
+    Verify and record a webhook delivery and queue it for processing.
+    Returns the Stripe event ID; raises InvalidWebhook.
+    """
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        raise InvalidWebhook('STRIPE_WEBHOOK_SECRET is not configured')
+
+    stripe = get_stripe()
+    try:
+        stripe.WebhookSignature.verify_header(
+            payload, signature, settings.STRIPE_WEBHOOK_SECRET, tolerance=settings.STRIPE_WEBHOOK_TOLERANCE
+        )
+        event = orjson.loads(payload)
+        event_id, event_type = event['id'], event['type']
+    except (stripe.SignatureVerificationError, orjson.JSONDecodeError, KeyError, TypeError) as e:
+        raise InvalidWebhook(str(e)) from e
+
+    StripeWebhookEvent.objects.bulk_create(
+        [StripeWebhookEvent(stripe_event_id=event_id, event_type=event_type, event_data=event)],
+        ignore_conflicts=True
+    )
+    metrics.webhook_events.labels(event_type, 'received').inc()
+    webhook_queue.put(event_id)
+    return event_id
+
+
+def _event_object(event):
+    return (event.event_data.get('data') or {}).get('object') or {}
+
+
+def _payment_references(obj):
+    """
+    Payment IDs a checkout session or payment intent carries: we send both
+    on the session, and metadata.payment_id on the intent it creates
+    """
+    references = []
+    for value in (obj.get('client_reference_id'), (obj.get('metadata') or {}).get('payment_id')):
+        try:
+            references.append(uuid.UUID(str(value)))
+        except ValueError:
+            pass
+    return references
+
+
+def _find_payments(events):
+    """Load every payment the events refer to with one query"""
+    session_ids, payment_ids, intent_ids = set(), set(), set()
+    for event in events:
+        obj = _event_object(event)
+        if event.event_type.startswith('checkout.session.'):
+            session_ids.add(obj.get('id'))
+            payment_ids.update(_payment_references(obj))
+        elif event.event_type.startswith('payment_intent.'):
+            # The intent may arrive before checkout.session.completed tells us its ID
+            intent_ids.add(obj.get('id'))
+            payment_ids.update(_payment_references(obj))
+        elif event.event_type.startswith('charge.'):
+            intent_ids.add(obj.get('payment_intent'))
+    session_ids.discard(None)
+    intent_ids.discard(None)
+
+    payments = Payment.objects.filter(
+        Q(stripe_checkout_session_id__in=session_ids) | Q(id__in=payment_ids) | Q(stripe_payment_intent_id__in=intent_ids)
+    ).select_related('file_upload')
+    index = {}
+    for payment in payments:
+        index[('payment', payment.id)] = payment
+        if payment.stripe_checkout_session_id:
+            index[('session', payment.stripe_checkout_session_id)] = payment
+        if payment.stripe_payment_intent_id:
+            index[('intent', payment.stripe_payment_intent_id)] = payment
+    return index
+
+
+def _payment_for(event, index):
+    obj = _event_object(event)
+    if event.event_type.startswith('checkout.session.'):
+        payment = index.get(('session', obj.get('id')))
+    elif event.event_type.startswith('payment_intent.'):
+        payment = index.get(('intent', obj.get('id')))
+    else:
+        return index.get(('intent', obj.get('payment_intent'))), obj
+    for reference in _payment_references(obj):
+        payment = payment or index.get(('payment', reference))
+    return payment, obj
+
+
+def _apply(event, payment, obj, now):
+    """Move ``payment`` to the state the event reports; returns whether the upload unlocks"""
+    event_type = event.event_type
+    if payment.status == 'refunded':
+        return False
+    if event_type in INTENT_SUCCEEDED or event_type in INTENT_FAILED:
+        payment.stripe_payment_intent_id = payment.stripe_payment_intent_id or obj.get('id')
+
+    if event_type in SESSION_SUCCEEDED or event_type in INTENT_SUCCEEDED:
+        if event_type in SESSION_SUCCEEDED:
+            payment.stripe_checkout_session_id = payment.stripe_checkout_session_id or obj.get('id')
+            payment.stripe_payment_intent_id = obj.get('payment_intent') or payment.stripe_payment_intent_id
+            if obj.get('payment_status') not in ('paid', 'no_payment_required'):
+                # Delayed payment methods confirm later with async_payment_succeeded
+                if payment.status == 'pending':
+                    payment.status = 'processing'
+                return False
+        if payment.status != 'succeeded':
+            payment.status = 'succeeded'
+            payment.paid_at = now
+        return True
+
+    if payment.status == 'succeeded' and event_type not in CHARGE_REFUNDED:
+        return False
+    if event_type in SESSION_FAILED or event_type in INTENT_FAILED:
+        payment.status = 'failed'
+    elif event_type in SESSION_EXPIRED:
+        if payment.status in ('pending', 'processing'):
+            payment.status = 'canceled'
+    elif event_type in CHARGE_REFUNDED and obj.get('refunded'):
+        payment.status = 'refunded'
+        payment.refunded_at = now
+    return False
+
+
+def process_events(event_ids=None, batch_size=None):
+    """
+    Apply up to ``batch_size`` unprocessed events (optionally only those in
+    ``event_ids``) in one transaction, oldest first. Events that fail keep
+    processed=False with an error_message and are skipped from then on.
+    Returns how many events the batch took.
+    """
+    batch_size = batch_size or settings.STRIPE_WEBHOOK_BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        pending = StripeWebhookEvent.objects.filter(processed=False)
+        if event_ids is not None:
+            pending = pending.filter(stripe_event_id__in=set(event_ids))
+        pending = pending.filter(error_message='')
+        # Concurrent processors (queue threads, the sweep command) skip each other's rows
+        events = list(
+            pending.select_for_update(skip_locked=True).order_by('created_at')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        index = _find_payments([event for event in events if event.event_type in HANDLED_TYPES])
+        payments, uploads = {}, {}
+        for event in events:
+            event.processed = True
+            event.processed_at = now
+            event.error_message = ''
+            if event.event_type not in HANDLED_TYPES:
+                metrics.webhook_events.labels(event.event_type, 'ignored').inc()
+                continue
+
+            try:
+                payment, obj = _payment_for(event, index)
+                if payment is None:
+                    raise LookupError('No matching payment')
+                unlock = _apply(event, payment, obj, now)
+                if payment.stripe_payment_intent_id:
+                    # Later charge events in this batch refer to the intent
+                    index[('intent', payment.stripe_payment_intent_id)] = payment
+            except Exception as e:
+                # Skipped until process_webhook_events --retry-failed
+                event.processed = False
+                event.processed_at = None
+                event.error_message = str(e) or type(e).__name__
+                metrics.webhook_events.labels(event.event_type, 'failed').inc()
+                continue
+
+            event.payment = payment
+            payments[payment.id] = payment
+            upload = payment.file_upload
+            if unlock and upload is not None and upload.status == 'pending':
+                # Paid: the upload continues like a free one
+                upload.status = 'processing'
+                upload.updated_at = now
+                uploads[upload.id] = upload
+            metrics.webhook_events.labels(event.event_type, 'processed').inc()
+
+        for payment in payments.values():
+            payment.updated_at = now
+        Payment.objects.bulk_update(
+            payments.values(),
+            ['status', 'paid_at', 'refunded_at', 'stripe_checkout_session_id', 'stripe_payment_intent_id', 'updated_at']
+        )
+        FileUpload.objects.bulk_update(uploads.values(), ['status', 'updated_at'])
+        StripeWebhookEvent.objects.bulk_update(events, ['processed', 'processed_at', 'error_message', 'payment'])
+    return len(events)
+
+
+def _process_queued(event_ids):
+    # Queue batches can exceed a processing batch; keep going until done
+    event_ids = set(event_ids)
+    while process_events(event_ids):
+        pass
+
+
+webhook_queue = WriteBehindQueue('stripe-webhooks', _process_queued)